@@ -4,11 +4,47 @@ from redis.asyncio import Redis as AsyncRedis
 import urllib.parse
 import logging
 import json
-from typing import Any, Optional
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
 
+class LRUCache:
+    """Small thread-safe in-process LRU used for per-worker caches."""
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(1, max_entries)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+                return self._data[key]
+            except KeyError:
+                return None
+
+    def put(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Any) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
 class RenderRedisCache:
     def __init__(self):
         """Initialize Redis cache."""
@@ -71,6 +107,24 @@ class RenderRedisCache:
             self.logger.error(f"Error initializing async Redis connection: {str(e)}")
             raise ConnectionError(f"Failed to connect to Redis: {str(e)}")
 
+    @staticmethod
+    def _version_key(key: str) -> str:
+        """Key holding the version token of a cache entry."""
+        return f"version:{key}"
+
+    @staticmethod
+    def _new_version() -> str:
+        """Version tokens are unique per write so they never repeat after expiry."""
+        return str(time.time_ns())
+
+    def health_check(self) -> bool:
+        """Ping Redis; used by the readiness probe."""
+        try:
+            return bool(self.redis_client and self.redis_client.ping())
+        except Exception as e:
+            self.logger.error(f"Redis health check failed: {str(e)}")
+            return False
+
     def put(self, key: str, value: Any, expiry: Optional[int] = None) -> bool:
         """Store data in Redis synchronously."""
         if not self.redis_client:
@@ -82,11 +136,11 @@ class RenderRedisCache:
             
         try:
             serialized_data = json.dumps(value)
-            return bool(self.redis_client.set(
-                key, 
-                serialized_data,
-                ex=expiry or self.default_expiry
-            ))
+            ttl = expiry or self.default_expiry
+            pipe = self.redis_client.pipeline()
+            pipe.set(key, serialized_data, ex=ttl)
+            pipe.set(self._version_key(key), self._new_version(), ex=ttl)
+            return bool(pipe.execute()[0])
         except json.JSONEncodeError as e:
             self.logger.error(f"JSON serialization error in PUT: {str(e)}")
             return False
@@ -115,6 +169,21 @@ class RenderRedisCache:
             self.logger.error(f"Error in sync GET: {str(e)}")
             return None
 
+    def delete_many(self, keys: List[str]) -> int:
+        """Delete several entries (and their version tokens) in one round trip."""
+        if not self.redis_client:
+            raise ConnectionError("Redis client not initialized")
+
+        if not keys:
+            return 0
+
+        try:
+            all_keys = list(keys) + [self._version_key(key) for key in keys]
+            return int(self.redis_client.delete(*all_keys))
+        except Exception as e:
+            self.logger.error(f"Error in sync DELETE: {str(e)}")
+            return 0
+
     async def async_put(self, key: str, value: Any, expiry: Optional[int] = None) -> bool:
         """Store data in Redis asynchronously."""
         if not self.async_client:
@@ -126,11 +195,11 @@ class RenderRedisCache:
             
         try:
             serialized_data = json.dumps(value)
-            return bool(await self.async_client.set(
-                key, 
-                serialized_data,
-                ex=expiry or self.default_expiry
-            ))
+            ttl = expiry or self.default_expiry
+            pipe = self.async_client.pipeline()
+            pipe.set(key, serialized_data, ex=ttl)
+            pipe.set(self._version_key(key), self._new_version(), ex=ttl)
+            return bool((await pipe.execute())[0])
         except json.JSONEncodeError as e:
             self.logger.error(f"JSON serialization error in async PUT: {str(e)}")
             return False
@@ -159,6 +228,27 @@ class RenderRedisCache:
             self.logger.error(f"Error in async GET: {str(e)}")
             return None
 
+    async def async_get_with_version(self, key: str) -> Tuple[Optional[Any], Optional[str]]:
+        """Retrieve an entry and its version token in a single round trip."""
+        if not self.async_client:
+            raise ConnectionError("Async Redis client not initialized")
+
+        if key is None:
+            self.logger.error("Key cannot be None")
+            return None, None
+
+        try:
+            data, version = await self.async_client.mget(key, self._version_key(key))
+            if data is None:
+                return None, None
+            return json.loads(data), version or "0"
+        except json.JSONDecodeError as e:
+            self.logger.error(f"JSON deserialization error in async GET: {str(e)}")
+            return None, None
+        except Exception as e:
+            self.logger.error(f"Error in async GET: {str(e)}")
+            return None, None
+
     async def async_delete(self, key: str) -> bool:
         """Delete a key from Redis asynchronously."""
         if not self.async_client:
@@ -169,7 +259,8 @@ class RenderRedisCache:
             return False
             
         try:
-            return bool(await self.async_client.delete(key))
+            # Dropping the version token invalidates any rendered fragments
+            return bool(await self.async_client.delete(key, self._version_key(key)))
         except Exception as e:
             self.logger.error(f"Error in async DELETE: {str(e)}")
             return False
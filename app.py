@@ -1,43 +1,160 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
+import sys
 import asyncio
-from flask import Flask, request, jsonify, render_template, redirect, url_for
+import hashlib
+import logging
+from flask import Flask, request, jsonify, render_template, redirect, url_for, g, make_response
 from flask_cors import CORS
 from dotenv import load_dotenv
 import traceback
-import pandas as pd
 
 # Load environment variables
 load_dotenv()
 
-# Import optimized modules
-from logging_config import setup_logging, get_module_logger
-from search import OptimizedSearch
-from storage import OptimizedDBStorage
-from filter import OptimizedFilter
-from ml_ranking import SimplifiedMLRanker
-from adaptive_cache import RenderRedisCache
-from semantic_search import SemanticSearch
+# Heavy modules (pandas, scikit-learn, supabase, ...) are imported on first use
+from logging_config import setup_logging, get_module_logger, set_request_id, get_request_id
+from components import ComponentRegistry, lazy_import
+from lifecycle import get_lifecycle, STAGE_FLUSH, STAGE_CLIENTS, STAGE_POOLS
+from write_behind import ClickBuffer, ResultPersister
+from functools import partial
+from typing import Any, Dict, Optional, Tuple
+from fragment_cache import ResultFragmentCache
+from query_normalization import query_key
+from rate_limit import TokenBucketLimiter, AdmissionController, retry_after_header
+from settings import (
+    FRAGMENT_CACHE_ENABLED,
+    WARM_UP_ON_START,
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_PER_MINUTE,
+    RATE_LIMIT_BURST,
+    RATE_LIMITED_ENDPOINTS,
+    MAX_IN_FLIGHT_REQUESTS,
+    MAX_IN_FLIGHT_COLD_SEARCHES,
+    TRUSTED_PROXY_HOPS,
+    CACHE_TIME_FILTERS,
+    ENRICHMENT_MODES,
+    ENRICHMENT_DEFAULT,
+    CLICK_BUFFER_ENABLED,
+    MAX_CLICK_BATCH_EVENTS,
+    RESULT_PERSIST_ENABLED,
+    STORED_RESULTS_MIN_ROWS,
+    SEMANTIC_TOP_K,
+    SEMANTIC_MAX_TOP_K,
+    SEMANTIC_MAX_BATCH_QUERIES,
+    SEMANTIC_MAX_DOCUMENTS,
+    SEMANTIC_MAX_DOCUMENT_CHARS
+)
+
+COLD_SEARCH_RETRY_AFTER = 2  # Seconds suggested to clients shed under load
+
+pd = lazy_import('pandas')
+dedup = lazy_import('dedup')
 
 # Configure logging
 logger = setup_logging()
 search_logger = get_module_logger('search')
 ml_logger = get_module_logger('ml_ranking')
 
+def _create_db_storage():
+    from storage import create_storage
+    return create_storage()
+
+def _create_cache():
+    from adaptive_cache import RenderRedisCache
+    return RenderRedisCache()
+
+def _create_ml_ranker():
+    from ml_ranking import get_ranker
+    return get_ranker()
+
+def _create_ranking_model():
+    from ltr import get_ranking_model
+    return get_ranking_model()
+
+def _create_semantic_search():
+    from semantic_search import SemanticSearch
+    return SemanticSearch()
+
+def _create_search_engine():
+    from search import OptimizedSearch
+    return OptimizedSearch()
+
+def _semantic_limits(data: Dict[str, Any]) -> Tuple[int, Optional[int]]:
+    """top_k and IVF probes from a semantic search request; raises ValueError/TypeError on bad input."""
+    top_k = min(max(int(data.get('top_k', SEMANTIC_TOP_K)), 1), SEMANTIC_MAX_TOP_K)
+    probes = max(int(data['probes']), 1) if data.get('probes') is not None else None
+    return top_k, probes
+
+def _documents_error(documents: list) -> Optional[Tuple[str, int]]:
+    """Error message and status for uploaded documents over the per-request caps, or None."""
+    if len(documents) > SEMANTIC_MAX_DOCUMENTS:
+        return f"At most {SEMANTIC_MAX_DOCUMENTS} documents per request", 400
+    if sum(len(str(document)) for document in documents) > SEMANTIC_MAX_DOCUMENT_CHARS:
+        return f"Uploaded documents exceed {SEMANTIC_MAX_DOCUMENT_CHARS} characters", 413
+    return None
+
+def _close_if_loaded(module: str, close: str):
+    """Run a module-level close hook only if the module was ever imported."""
+    loaded = sys.modules.get(module)
+    if loaded is not None:
+        getattr(loaded, close)()
+
 class OptimizedSearchApp:
     def __init__(self):
     # Initialize Flask App
          self.app = Flask(__name__)
          CORS(self.app)
 
-    # Initialize components with error handling
+    # Register components; each one is created on first use (or by warm-up)
          try:
-             self.db_storage = OptimizedDBStorage()
-             self.adaptive_cache = RenderRedisCache()
-             self.ml_ranker = SimplifiedMLRanker()
-             self.semantic_search = SemanticSearch()
-             self.search_engine = OptimizedSearch()
+             self.components = ComponentRegistry()
+             self.components.register('db_storage', _create_db_storage,
+                                      lambda c: c.health_check(), close=lambda c: c.close())
+             self.components.register('adaptive_cache', _create_cache,
+                                      lambda c: c.health_check(), close=lambda c: c.close())
+             self.components.register('ml_ranker', _create_ml_ranker)
+             self.components.register('ranking_model', _create_ranking_model)
+             self.components.register('semantic_search', _create_semantic_search, close=lambda c: c.close())
+             self.components.register('search_engine', _create_search_engine,
+                                      close=lambda c: c._close_session())
+
+    # Shutdown order within a stage is the reverse of registration:
+    # HTTP client, then Redis, then the database client
+             self.lifecycle = get_lifecycle()
+             for name in ('db_storage', 'adaptive_cache', 'search_engine'):
+                 self.lifecycle.register(name, partial(self.components.close, name), STAGE_CLIENTS)
+
+    # Clicks and fetched results are written behind and flushed before the clients above are closed
+             self.click_buffer = ClickBuffer(self._flush_clicks) if CLICK_BUFFER_ENABLED else None
+             if self.click_buffer is not None:
+                 self.lifecycle.register('click_buffer', self.click_buffer.close, STAGE_FLUSH)
+             self.result_persister = ResultPersister(
+                 lambda rows: self.db_storage.bulk_upsert_results(rows)
+             ) if RESULT_PERSIST_ENABLED else None
+             if self.result_persister is not None:
+                 self.lifecycle.register('result_persister', self.result_persister.close, STAGE_FLUSH)
+             self.lifecycle.register('local_index', partial(_close_if_loaded, 'local_index', 'close_local_index'),
+                                     STAGE_FLUSH)
+             self.lifecycle.register('ml_ranker', partial(_close_if_loaded, 'ml_ranking', 'close_ranker'),
+                                     STAGE_FLUSH)
+             self.lifecycle.register('document_analysis',
+                                     partial(_close_if_loaded, 'document_analysis', 'close_document_analyzer'),
+                                     STAGE_POOLS)
+             self.lifecycle.register('semantic_search', partial(self.components.close, 'semantic_search'),
+                                     STAGE_POOLS)
+             self.fragment_cache = ResultFragmentCache() if FRAGMENT_CACHE_ENABLED else None
+             self.rate_limiter = TokenBucketLimiter(
+                 RATE_LIMIT_PER_MINUTE,
+                 RATE_LIMIT_BURST,
+                 redis_provider=lambda: self.adaptive_cache.redis_client
+             ) if RATE_LIMIT_ENABLED else None
+             self.admission = AdmissionController(MAX_IN_FLIGHT_REQUESTS, MAX_IN_FLIGHT_COLD_SEARCHES)
+             self._first_request_seen = False
      
-             # Setup routes AFTER initializing components
+             # Setup routes AFTER registering components
              self.setup_routes()
      
              logger.info("OptimizedSearchApp initialized successfully")
@@ -45,17 +162,118 @@ class OptimizedSearchApp:
              logger.error(f"Initialization error: {e}")
              logger.error(traceback.format_exc())
              raise
+
+    @property
+    def db_storage(self):
+        return self.components.get('db_storage')
+
+    @property
+    def adaptive_cache(self):
+        return self.components.get('adaptive_cache')
+
+    @property
+    def ml_ranker(self):
+        return self.components.get('ml_ranker')
+
+    @property
+    def ranking_model(self):
+        return self.components.get('ranking_model')
+
+    @property
+    def semantic_search(self):
+        return self.components.get('semantic_search')
+
+    @property
+    def search_engine(self):
+        return self.components.get('search_engine')
      
     def setup_routes(self):
-        
+         self.app.before_request(self._bind_request_id)
+         self.app.before_request(self._track_request)
+         self.app.before_request(self._admit_request)
+         self.app.after_request(self._add_request_id_header)
+         self.app.teardown_request(self._release_admission)
+         self.app.teardown_request(self._untrack_request)
+
          self.app.route('/', methods=['GET', 'POST'])(self.index)
          self.app.route('/search', methods=['GET'])(self.search_results)
          self.app.route('/mark-relevant', methods=['POST'])(self.mark_relevant)
+         self.app.route('/mark-relevant/batch', methods=['POST'])(self.mark_relevant_batch)
+         self.app.route('/enrich', methods=['POST'])(self.enrich_result)
          self.app.route('/semantic-search', methods=['POST'])(self.perform_semantic_search)
+         self.app.route('/semantic-search/batch', methods=['POST'])(self.perform_batch_semantic_search)
+         self.app.route('/ready', methods=['GET'])(self.readiness)
      
          self.app.errorhandler(404)(self.not_found)
          self.app.errorhandler(500)(self.server_error)
 
+    def _bind_request_id(self):
+        """Tag all log records for this request with a request id."""
+        set_request_id(request.headers.get('X-Request-ID', '')[:64] or None)
+        if not self._first_request_seen:
+            self._first_request_seen = True
+            logger.info(f"Time to first request: {(time.perf_counter() - _IMPORT_STARTED) * 1000:.1f} ms")
+
+    def _track_request(self):
+        """Count in-flight requests so shutdown can drain them; refuse new ones while draining."""
+        if not self.lifecycle.request_started():
+            response = jsonify({'status': 'error', 'message': 'Server is shutting down'})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        g.lifecycle_tracked = True
+
+    def _untrack_request(self, exc=None):
+        if g.pop('lifecycle_tracked', False):
+            self.lifecycle.request_finished()
+
+    @staticmethod
+    def _client_key() -> str:
+        """
+        Rate-limit key: the API key if one is sent, otherwise the client IP.
+
+        Clients can prepend anything to X-Forwarded-For, so the IP is the hop
+        added by our own proxies (TRUSTED_PROXY_HOPS from the end), or the
+        socket address when there are no trusted proxies or too few hops.
+        """
+        api_key = request.headers.get('X-API-Key')
+        if api_key:
+            return f"key:{hashlib.sha1(api_key.encode('utf-8')).hexdigest()[:16]}"
+        hops = [hop.strip() for hop in request.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+        if 0 < TRUSTED_PROXY_HOPS <= len(hops):
+            return f"ip:{hops[-TRUSTED_PROXY_HOPS]}"
+        return f"ip:{request.remote_addr}"
+
+    def _reject(self, status: int, message: str, retry_after: float):
+        """Shed a request with 429/503 and a Retry-After hint."""
+        if request.endpoint == 'search_results':
+            response = make_response(render_template('error.html', error=message), status)
+        else:
+            response = make_response(jsonify({'status': 'error', 'message': message}), status)
+        response.headers['Retry-After'] = retry_after_header(retry_after)
+        return response
+
+    def _admit_request(self):
+        """Per-client token bucket plus a global in-flight cap for expensive endpoints."""
+        if request.endpoint not in RATE_LIMITED_ENDPOINTS:
+            return None
+
+        if self.rate_limiter:
+            allowed, retry_after = self.rate_limiter.allow(self._client_key())
+            if not allowed:
+                return self._reject(429, "Too many requests", retry_after)
+
+        if not self.admission.try_acquire():
+            return self._reject(503, "Server is busy, please retry shortly", COLD_SEARCH_RETRY_AFTER)
+        g.admitted = True
+
+    def _release_admission(self, exc=None):
+        if g.pop('admitted', False):
+            self.admission.release()
+
+    def _add_request_id_header(self, response):
+        response.headers['X-Request-ID'] = get_request_id()
+        return response
+
     def _format_results(self, raw_results, query):
         """Format raw search results into template-compatible structure"""
         formatted_results = []
@@ -75,43 +293,51 @@ class OptimizedSearchApp:
                     'ml_rank': result.get('score', result.get('ml_rank', 0.0)),
                     'rag_summary': result.get('summary', result.get('rag_summary', None)),
                     'click_count': result.get('click_count', 0),
-                    'relevance': result.get('relevance', False)
+                    'relevance': result.get('relevance', False),
+                    'simhash': result.get('simhash')
                 }
                 formatted_results.append(formatted_result)
 
-            search_logger.info(f"Formatted {len(formatted_results)} results successfully")
-            if formatted_results:
-                search_logger.info(f"Sample formatted result: {formatted_results[0]}")
+            search_logger.info(f"Formatted {len(formatted_results)} results successfully", extra={'category': 'search.request'})
+            if formatted_results and search_logger.isEnabledFor(logging.DEBUG):
+                sample = {k: formatted_results[0][k] for k in ('rank', 'title', 'link', 'ml_rank')}
+                search_logger.debug(f"Sample formatted result: {sample}", extra={'category': 'search.payload'})
 
         except Exception as e:
             search_logger.error(f"Error formatting results: {e}")
-            search_logger.error(f"Raw results: {raw_results}")
+            search_logger.error(f"Raw results: {len(raw_results)} records of type {type(raw_results).__name__}")
             search_logger.error(traceback.format_exc())
 
         return formatted_results
 
     # app.py - Update the _optimized_search_pipeline method
 
-    async def _optimized_search_pipeline(self, query):
+    async def _optimized_search_pipeline(self, query, enrichment=ENRICHMENT_DEFAULT):
         """Async optimized search pipeline with error handling"""
         try:
-        # Check cache first
-            cached_results = await self.adaptive_cache.async_get(query)
+        # Check cache first; the key is normalized, but the search engine gets the query as typed
+            cache_key = self._search_cache_key(query_key(query), None, enrichment)
+            cached_results = await self.adaptive_cache.async_get(cache_key)
             if cached_results:
-                search_logger.info(f"Cache hit for query: {query}")
+                search_logger.info(f"Cache hit for query: {cache_key}", extra={'category': 'search.cache'})
                 return cached_results
 
         # Perform search
-            search_logger.info(f"Performing search for query: {query}")
-            raw_results = await self.search_engine.search(query)
-
-        # Debug log the raw results
-            search_logger.info(f"Raw results type: {type(raw_results)}")
-            search_logger.info(f"Raw results: {raw_results}")
+            search_logger.info(f"Performing search for query: {query}", extra={'category': 'search.request'})
+            raw_results = await self.search_engine.search(query, enrichment)
+
+        # Debug log a bounded summary of the raw results (never the page HTML)
+            if search_logger.isEnabledFor(logging.DEBUG):
+                columns = list(raw_results.columns) if isinstance(raw_results, pd.DataFrame) else []
+                search_logger.debug(
+                    f"Raw results: {len(raw_results)} rows, columns={columns}",
+                    extra={'category': 'search.payload'}
+                )
 
         # Check if raw_results is a DataFrame and handle appropriately
             if isinstance(raw_results, pd.DataFrame):
                 if not raw_results.empty:
+                    raw_results = dedup.collapse_duplicates(raw_results)
                     formatted_results = self._format_results(raw_results, query)
                 else:
                     formatted_results = []
@@ -121,9 +347,9 @@ class OptimizedSearchApp:
 
         # Cache formatted results if they exist
             if formatted_results:
-                await self.adaptive_cache.async_put(query, formatted_results)
+                await self.adaptive_cache.async_put(cache_key, formatted_results)
 
-            search_logger.info(f"Search pipeline completed with {len(formatted_results)} results")
+            search_logger.info(f"Search pipeline completed with {len(formatted_results)} results", extra={'category': 'search.request'})
             return formatted_results
 
         except Exception as e:
@@ -136,55 +362,86 @@ class OptimizedSearchApp:
         """Async search results route with time filtering"""
         query = request.args.get('query', '').strip()
         time_filter = request.args.get('time_filter')
+        enrichment = request.args.get('enrichment', ENRICHMENT_DEFAULT)
+        if enrichment not in ENRICHMENT_MODES:
+            enrichment = ENRICHMENT_DEFAULT
     
         if not query:
             return redirect(url_for('index'))
 
         try:
         # Log the start of the search
-            search_logger.info(f"Starting search for query: {query} with time filter: {time_filter}")
+            search_logger.info(f"Starting search for query: {query} with time filter: {time_filter}", extra={'category': 'search.request'})
         
-        # First check cached results with time filter
-            cache_key = f"{query}:{time_filter}" if time_filter else query
-            cached_results = await self.adaptive_cache.async_get(cache_key)
+        # Variants of a query ("Dr. Strange", "dr  strange") share cache entries and stored rows;
+        # the query is shown as typed
+            key_query = query_key(query)
+
+        # First check cached results with time filter and enrichment mode
+            cache_key = self._search_cache_key(key_query, time_filter, enrichment)
+            cached_results, version = await self.adaptive_cache.async_get_with_version(cache_key)
         
             if cached_results:
-                search_logger.info(f"Cache hit for query: {cache_key}")
+                search_logger.info(f"Cache hit for query: {cache_key}", extra={'category': 'search.cache'})
+                results_html = None
+                if self.fragment_cache:
+                    results_html = self.fragment_cache.render_results(
+                        cache_key, version, time_filter, cached_results
+                    )
                 return render_template(
                     'results.html',
                     query=query,
                     results=cached_results,
+                    results_html=results_html,
                     time_filter=time_filter
                 )
 
-        # Check database for previous relevant results
-            db_results = self.db_storage.query_results(query, time_filter)
-        
-        # If we have relevant results, combine them with new search results
-            if isinstance(db_results, pd.DataFrame) and not db_results.empty:
-                search_logger.info(f"Found {len(db_results)} existing relevant results")
-            
-            # Get new search results
-                new_results = await self._optimized_search_pipeline(query)
-            
-            # Convert new_results to DataFrame if it's a list
-                if isinstance(new_results, list):
-                    new_results = pd.DataFrame(new_results)
-            
-            # Combine and deduplicate results
-                all_results = self._merge_results(db_results, new_results)
-            else:
-            # If no existing results, just get new search results
-                all_results = await self._optimized_search_pipeline(query)
+        # Every completed search is persisted, so the stored result set can stand in for the live one
+            db_results = await self.db_storage.async_query_results(key_query, time_filter)
+            has_stored = isinstance(db_results, pd.DataFrame) and not db_results.empty
 
-        # Format results for template
-            formatted_results = self._format_results(all_results, query)
-        
-        # Cache the results if we have any
-            if formatted_results:
-                await self.adaptive_cache.async_put(cache_key, formatted_results)
-
-            search_logger.info(f"Search completed with {len(formatted_results)} results")
+            if has_stored and len(db_results) >= STORED_RESULTS_MIN_ROWS:
+                search_logger.info(f"Serving {len(db_results)} stored results", extra={'category': 'search.request'})
+                formatted_results = self._format_results(self._merge_results(db_results, pd.DataFrame(), key_query), query)
+                if formatted_results:
+                    await self.adaptive_cache.async_put(cache_key, formatted_results)
+            else:
+            # Cold searches cost Google quota and page fetches; shed them first when saturated
+                if not self.admission.try_acquire_expensive():
+                    return self._reject(503, "Search capacity is exhausted, please retry shortly", COLD_SEARCH_RETRY_AFTER)
+
+                try:
+                # If we have relevant results, combine them with new search results
+                    if has_stored:
+                        search_logger.info(f"Found {len(db_results)} existing relevant results", extra={'category': 'search.request'})
+
+                    # Get new search results
+                        new_results = await self._optimized_search_pipeline(query, enrichment)
+
+                    # Convert new_results to DataFrame if it's a list
+                        if isinstance(new_results, list):
+                            new_results = pd.DataFrame(new_results)
+
+                    # Combine and deduplicate results
+                        all_results = self._merge_results(db_results, new_results, key_query)
+                    else:
+                    # If no existing results, just get new search results
+                        all_results = await self._optimized_search_pipeline(query, enrichment)
+
+                # Format results for template
+                    formatted_results = self._format_results(all_results, query)
+
+                # Cache the results if we have any
+                    if formatted_results:
+                        await self.adaptive_cache.async_put(cache_key, formatted_results)
+
+                # Store the result set off the request path so the DB serves the next cold search
+                    if formatted_results and self.result_persister is not None:
+                        self.result_persister.submit(key_query, formatted_results)
+                finally:
+                    self.admission.release_expensive()
+
+            search_logger.info(f"Search completed with {len(formatted_results)} results", extra={'category': 'search.request'})
             return render_template(
                 'results.html',
                 query=query,
@@ -198,15 +455,15 @@ class OptimizedSearchApp:
             return render_template('error.html', error=str(e)), 500
 
 # Update the _merge_results method to handle different input types
-    def _merge_results(self, db_results: pd.DataFrame, new_results: pd.DataFrame) -> pd.DataFrame:
+    def _merge_results(self, db_results: 'pd.DataFrame', new_results: 'pd.DataFrame', query: str = '') -> 'pd.DataFrame':
         """Merge and deduplicate database and new search results."""
         try:
         # Handle empty DataFrames
             if isinstance(new_results, pd.DataFrame) and new_results.empty:
-                return db_results
+                return dedup.collapse_duplicates(db_results)
         
             if isinstance(db_results, pd.DataFrame) and db_results.empty:
-                return new_results if isinstance(new_results, pd.DataFrame) else pd.DataFrame(new_results)
+                return dedup.collapse_duplicates(new_results if isinstance(new_results, pd.DataFrame) else pd.DataFrame(new_results))
 
         # Convert new_results to DataFrame if it's a list
             if isinstance(new_results, list):
@@ -223,21 +480,17 @@ class OptimizedSearchApp:
             db_results['source'] = 'db'
             new_results['source'] = 'new'
 
-        # Combine results and drop duplicates
+        # Combine results, collapsing URL variants and near-duplicate pages
             combined = pd.concat([db_results, new_results], ignore_index=True)
-            combined = combined.drop_duplicates(subset=['link'], keep='first')
+            combined = dedup.collapse_duplicates(combined).copy()
 
         # Ensure numeric columns exist and are properly typed
             combined['click_count'] = combined.get('click_count', 0).fillna(0).astype(float)
             combined['relevance'] = combined.get('relevance', False).fillna(False)
             combined['ml_rank'] = combined.get('ml_rank', 0.0).fillna(0.0).astype(float)
 
-        # Calculate final rank score
-            combined['rank_score'] = (
-                (combined['relevance'].astype(int) * 2) +
-                (combined['click_count'] / combined['click_count'].max() if combined['click_count'].max() > 0 else 0) +
-                (combined['ml_rank'] / combined['ml_rank'].max() if combined['ml_rank'].max() > 0 else 0)
-            )
+        # Score with the learned ranking model (or the settings-based default)
+            combined['rank_score'] = self.ranking_model.score(combined, query)
 
         # Sort by rank score
             combined = combined.sort_values('rank_score', ascending=False)
@@ -256,6 +509,56 @@ class OptimizedSearchApp:
                 return pd.DataFrame(new_results)
             else:
                 return pd.DataFrame()
+    @staticmethod
+    def _search_cache_key(query: str, time_filter=None, enrichment=ENRICHMENT_DEFAULT):
+        """Cache key of a result list; full enrichment keeps the original unsuffixed key."""
+        key = f"{query}:{time_filter}" if time_filter else query
+        return key if enrichment == 'full' else f"{key}|{enrichment}"
+
+    @classmethod
+    def _relevance_cache_keys(cls, query: str):
+        """Cache entries that show click data for a query."""
+        return [
+            cls._search_cache_key(query, time_filter, enrichment)
+            for time_filter in [None] + list(CACHE_TIME_FILTERS)
+            for enrichment in ENRICHMENT_MODES
+        ]
+
+    @staticmethod
+    def _parse_click(data):
+        """Validate one click payload; returns (query, link, result_data) or None."""
+        required_fields = ['query', 'link', 'title']
+        if not isinstance(data, dict) or not all(data.get(field) for field in required_fields):
+            return None
+
+        # Prepare result data with all fields
+        result_data = {
+            'title': data['title'],
+            'snippet': data.get('snippet', ''),
+            'ml_rank': float(data.get('ml_rank') or 0.0),
+            'rag_summary': data.get('rag_summary', ''),
+            'rank': int(data.get('rank') or 1)  # Add rank field
+        }
+        return query_key(data['query']), data['link'], result_data
+
+    def _flush_clicks(self, events):
+        """
+        Write-behind flush: one bulk upsert, then one cache invalidation.
+
+        Only a failed database write raises, so the buffer retries it. The
+        clicks are already stored when invalidation fails (e.g. Redis is
+        down); retrying would count them again, and stale entries expire
+        with the cache TTL.
+        """
+        self.db_storage.bulk_mark_relevant(events)
+        keys = set()
+        for query in {event['query'] for event in events}:
+            keys.update(self._relevance_cache_keys(query))
+        try:
+            self.adaptive_cache.delete_many(sorted(keys))
+        except Exception as e:
+            logger.error(f"Cache invalidation after click flush failed: {e}")
+
     async def mark_relevant(self):
         """Enhanced relevance marking with result data storage"""
         try:
@@ -266,26 +569,35 @@ class OptimizedSearchApp:
                     'message': 'No data provided'
                 }), 400
 
-            required_fields = ['query', 'link', 'title']
-            if not all(field in data for field in required_fields):
+            try:
+                click = self._parse_click(data)
+            except (TypeError, ValueError):
+                click = None
+            if click is None:
                 return jsonify({
                     'status': 'error',
                     'message': 'Missing required fields'
                }), 400
+            query, link, result_data = click
 
-        # Prepare result data with all fields
-            result_data = {
-                'title': data['title'],
-                'snippet': data.get('snippet', ''),
-                'ml_rank': float(data.get('ml_rank', 0.0)),
-                'rag_summary': data.get('rag_summary', ''),
-                'rank': int(data.get('rank', 1))  # Add rank field
-            }
+        # Buffered clicks are written in bulk by the background flusher
+            if self.click_buffer is not None:
+                self.click_buffer.add(query, link, result_data)
+                return jsonify({
+                    'status': 'success',
+                    'data': {
+                        'query': query,
+                        'link': link,
+                        'title': result_data['title'],
+                        'relevance': True,
+                        'queued': True
+                    }
+                })
 
         # Update result in database with proper await
             result = await self.db_storage.update_relevance(
-                query=data['query'],
-                link=data['link'],
+                query=query,
+                link=link,
                 result_data=result_data
             )
 
@@ -293,21 +605,14 @@ class OptimizedSearchApp:
                 raise ValueError("Failed to update relevance")
 
         # Invalidate related caches
-            cache_keys = [
-                data['query'],
-                f"{data['query']}:day",
-                f"{data['query']}:month",
-                f"{data['query']}:year"
-            ]
-        
-            for key in cache_keys:
+            for key in self._relevance_cache_keys(query):
                 await self.adaptive_cache.async_delete(key)
 
             return jsonify({
                 'status': 'success',
                 'data': {
-                    'query': data['query'],
-                    'link': data['link'],
+                    'query': query,
+                    'link': link,
                     'title': result_data['title'],
                     'click_count': result.get('click_count', 1) if result else 1,
                     'relevance': True
@@ -321,6 +626,136 @@ class OptimizedSearchApp:
                 'status': 'error',
                 'message': str(e)
             }), 500    
+
+    def mark_relevant_batch(self):
+        """Accept many click events at once; they are coalesced and written behind."""
+        try:
+            data = request.get_json(silent=True) or {}
+            events = data.get('events') if isinstance(data, dict) else None
+            if not isinstance(events, list) or not events:
+                return jsonify({'status': 'error', 'message': 'No events provided'}), 400
+            if len(events) > MAX_CLICK_BATCH_EVENTS:
+                return jsonify({
+                    'status': 'error',
+                    'message': f'At most {MAX_CLICK_BATCH_EVENTS} events per batch'
+                }), 413
+
+            accepted, rejected = 0, 0
+            unbuffered: Dict[Tuple[str, str], Dict[str, Any]] = {}
+            for event in events:
+                try:
+                    click = self._parse_click(event)
+                except (TypeError, ValueError):
+                    click = None
+                if click is None:
+                    rejected += 1
+                    continue
+                if self.click_buffer is not None:
+                    self.click_buffer.add(*click)
+                else:
+                    # Coalesce per (query, link) and write the whole batch at once
+                    query, link, result_data = click
+                    clicks = unbuffered.get((query, link), {}).get('clicks', 0) + 1
+                    unbuffered[(query, link)] = dict(result_data, query=query, link=link, clicks=clicks)
+                accepted += 1
+            if unbuffered:
+                self._flush_clicks(list(unbuffered.values()))
+
+            return jsonify({
+                'status': 'success',
+                'data': {'accepted': accepted, 'rejected': rejected}
+            })
+
+        except Exception as e:
+            logger.error(f"Batch mark relevant error: {e}")
+            logger.error(traceback.format_exc())
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 500
+
+    async def _issued_result(self, key_query: str, link: str, time_filter: Optional[str], enrichment: str):
+        """
+        The result for `link` in the cached or stored result set of a query.
+
+        Returns (result, cache key, cached list); the cache key and list are
+        None when the result came from the database, and the result is None
+        when this server never returned the link for the query.
+        """
+        cache_key = self._search_cache_key(key_query, time_filter, enrichment)
+        cached = await self.adaptive_cache.async_get(cache_key)
+        for result in cached or []:
+            if result.get('link') == link:
+                return result, cache_key, cached
+
+        stored = await self.db_storage.async_query_results(key_query, time_filter)
+        if isinstance(stored, pd.DataFrame) and not stored.empty:
+            for result in stored.to_dict('records'):
+                if result.get('link') == link:
+                    return result, None, None
+        return None, None, None
+
+    async def _save_summary(self, key_query: str, result: Dict[str, Any], summary: str,
+                            cache_key: Optional[str], cached: Optional[list]):
+        """Keep an on-demand summary so the next expansion does not fetch the page again."""
+        if cached is not None:
+            for cached_result in cached:
+                if cached_result.get('link') == result['link']:
+                    cached_result['rag_summary'] = summary
+            await self.adaptive_cache.async_put(cache_key, cached)
+
+        simhash = result.get('simhash')
+        row = {
+            'link': result['link'],
+            'title': str(result.get('title') or ''),
+            'snippet': str(result.get('snippet') or ''),
+            'rag_summary': summary,
+            'rank': int(result.get('rank') or 1),
+            'ml_rank': float(result.get('ml_rank') or 0.0),
+            'simhash': simhash if isinstance(simhash, str) else None
+        }
+        if self.result_persister is not None:
+            self.result_persister.submit(key_query, [row])
+        else:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.db_storage.bulk_upsert_results, [dict(row, query=key_query)])
+
+    async def enrich_result(self):
+        """Fetch and summarize one result on demand (lazy and snippet enrichment)"""
+        try:
+            data = request.get_json(silent=True) or {}
+            query, link = data.get('query'), data.get('link')
+            if not all(isinstance(value, str) and value for value in (query, link)):
+                return jsonify({'status': 'error', 'message': 'query and link are required'}), 400
+            time_filter = data.get('time_filter') or None
+            enrichment = data.get('enrichment') or ENRICHMENT_DEFAULT
+            if enrichment not in ENRICHMENT_MODES:
+                enrichment = ENRICHMENT_DEFAULT
+
+            # Only links this server returned for the query are fetched, never client-supplied URLs
+            key_query = query_key(query)
+            result, cache_key, cached = await self._issued_result(key_query, link, time_filter, enrichment)
+            if result is None:
+                return jsonify({'status': 'error', 'message': 'Unknown result for this query'}), 404
+            if result.get('rag_summary'):
+                return jsonify({'status': 'success', 'data': {'link': link, 'rag_summary': result['rag_summary']}})
+
+            enriched = await self.search_engine.enrich(
+                {'link': link, 'title': str(result.get('title') or ''), 'snippet': str(result.get('snippet') or '')},
+                query
+            )
+            if enriched is None or not enriched.get('rag_summary'):
+                return jsonify({'status': 'error', 'message': 'Result cannot be enriched'}), 404
+
+            try:
+                await self._save_summary(key_query, result, enriched['rag_summary'], cache_key, cached)
+            except Exception as e:
+                logger.error(f"Saving enriched summary failed: {e}")
+            return jsonify({'status': 'success', 'data': {'link': link, 'rag_summary': enriched['rag_summary']}})
+        except Exception as e:
+            logger.error(f"Enrich error: {e}")
+            return jsonify({'status': 'error', 'message': str(e)}), 500
+
     def index(self):
         """Home page route"""
         try:
@@ -336,19 +771,80 @@ class OptimizedSearchApp:
     async def perform_semantic_search(self):
         """Optimized semantic search endpoint"""
         try:
-            data = request.json
+            data = request.get_json(silent=True) or {}
             query = data.get('query', '')
-            documents = data.get('documents', [])
+            documents = data.get('documents')
 
-            if not query or not documents:
+            if not query or not isinstance(query, str) or (documents is not None and not isinstance(documents, list)):
                 return jsonify({"error": "Invalid request"}), 400
 
-            similarities = await self.semantic_search.async_semantic_search(query, documents)
-            return jsonify({"similarities": similarities.tolist()})
+            # Uploaded documents are scored in the order given
+            if documents:
+                error = _documents_error(documents)
+                if error:
+                    return jsonify({"error": error[0]}), error[1]
+                similarities = await self.semantic_search.async_semantic_search(query, documents)
+                return jsonify({"similarities": similarities.tolist()})
+
+            # Otherwise answer from the server-side index of stored documents
+            try:
+                top_k, probes = _semantic_limits(data)
+            except (TypeError, ValueError):
+                return jsonify({"error": "top_k and probes must be integers"}), 400
+            if not self.semantic_search.index_ready:
+                return jsonify({"error": "Semantic index is not built"}), 503
+            results = await self.semantic_search.async_search_index(query, top_k, probes)
+            return jsonify({"results": results})
         except Exception as e:
             logger.error(f"Semantic search error: {e}")
             return jsonify({"error": str(e)}), 500
 
+    async def perform_batch_semantic_search(self):
+        """Top-k semantic matches for many queries in one request"""
+        try:
+            data = request.get_json(silent=True) or {}
+            queries = data.get('queries')
+            documents = data.get('documents')
+
+            if (not isinstance(queries, list) or not queries
+                    or not all(isinstance(query, str) and query for query in queries)
+                    or (documents is not None and not isinstance(documents, list))):
+                return jsonify({"error": "Invalid request"}), 400
+            if len(queries) > SEMANTIC_MAX_BATCH_QUERIES:
+                return jsonify({"error": f"At most {SEMANTIC_MAX_BATCH_QUERIES} queries per request"}), 400
+            try:
+                top_k, probes = _semantic_limits(data)
+            except (TypeError, ValueError):
+                return jsonify({"error": "top_k and probes must be integers"}), 400
+
+            # Uploaded documents are referred to by position
+            if documents:
+                error = _documents_error(documents)
+                if error:
+                    return jsonify({"error": error[0]}), error[1]
+                results = await self.semantic_search.async_multi_semantic_search(
+                    queries, [str(document) for document in documents], top_k
+                )
+                return jsonify({"results": results})
+
+            if not self.semantic_search.index_ready:
+                return jsonify({"error": "Semantic index is not built"}), 503
+            results = await self.semantic_search.async_search_index_many(queries, top_k, probes)
+            return jsonify({"results": results})
+        except Exception as e:
+            logger.error(f"Batch semantic search error: {e}")
+            return jsonify({"error": str(e)}), 500
+
+    def readiness(self):
+        """Readiness probe: creates missing components and health-checks all of them."""
+        if self.lifecycle.draining:
+            return jsonify({'status': 'draining'}), 503
+        ready, report = self.components.readiness(initialize=True)
+        return jsonify({
+            'status': 'ready' if ready else 'unavailable',
+            'components': report
+        }), 200 if ready else 503
+
     def not_found(self, error):
         return render_template('error.html', error="Page not found"), 404
 
@@ -361,39 +857,27 @@ class OptimizedSearchApp:
         """Return the Flask application instance."""
         return self.app
 
-    async def _cleanup(self):
-        """Cleanup resources before shutdown."""
-        try:
-            if hasattr(self, 'adaptive_cache'):
-                await self.adaptive_cache.close()
-            if hasattr(self, 'search_engine'):
-                await self.search_engine._close_session()
-        except Exception as e:
-            logger.error(f"Cleanup error: {e}")
+# Create application instance
 
-    def __del__(self):
-        """Destructor to ensure cleanup of resources."""
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                loop.create_task(self._cleanup())
-            else:
-                loop.run_until_complete(self._cleanup())
-        except Exception as e:
-            logger.error(f"Destructor cleanup error: {e}")
 
-# Create application instance
+# Document-analysis worker processes re-import the main script as __mp_main__
+# when it is run directly (python app.py); they must not build a second app.
+if __name__ != '__mp_main__':
+    # Create application instance with async support
+    search_app = OptimizedSearchApp()
+    app = search_app.get_app()
+    logger.info(f"App module imported in {(time.perf_counter() - _IMPORT_STARTED) * 1000:.1f} ms")
 
+    search_app.lifecycle.install_signal_handlers()
 
-# Create application instance with async support
-search_app = OptimizedSearchApp()
-app = search_app.get_app()
+    if WARM_UP_ON_START:
+        search_app.components.warm_up()
 
-# Add this for better async support
-app.config['ASGI_APPLICATION'] = True
+    # Add this for better async support
+    app.config['ASGI_APPLICATION'] = True
 
-# Keep your main assignment
-main = app
+    # Keep your main assignment
+    main = app
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
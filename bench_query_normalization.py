@@ -0,0 +1,72 @@
+"""
+Result-cache hit rate with raw query keys versus normalized keys.
+
+Replays a query log, one query per line (or a synthetic log where users
+type popular queries with different case, spacing, punctuation and
+full-width characters), through an LRU cache keyed each way.
+
+    python bench_query_normalization.py [--log queries.txt] [--requests 20000] [--cache-size 1000]
+"""
+import random
+import argparse
+from adaptive_cache import LRUCache
+from query_normalization import normalize_query, query_key
+
+def variant(query: str, rng: random.Random) -> str:
+    words = query.split()
+    roll = rng.random()
+    if roll < 0.4:
+        return query
+    if roll < 0.55:
+        return ' '.join(word.capitalize() for word in words)
+    if roll < 0.7:
+        return '  '.join(words) + ' '
+    if roll < 0.8:
+        return query + rng.choice(['?', '!', '.'])
+    if roll < 0.9:
+        return rng.choice(['the ', 'a ']) + query
+    # Full-width forms, as typed with some CJK input methods
+    return ''.join(chr(ord(c) + 0xFEE0) if '!' <= c <= '~' else c for c in query)
+
+def synthetic_log(n_requests: int, n_queries: int = 2000, seed: int = 0):
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(5000)]
+    queries = [' '.join(rng.sample(vocabulary, rng.randint(1, 4))) for _ in range(n_queries)]
+    weights = [1 / (rank + 1) for rank in range(n_queries)]  # Zipf-like popularity
+    return [variant(query, rng) for query in rng.choices(queries, weights, k=n_requests)]
+
+def hit_rate(log, key, cache_size: int):
+    cache, hits = LRUCache(cache_size), 0
+    for query in log:
+        k = key(query)
+        if cache.get(k) is not None:
+            hits += 1
+        else:
+            cache.put(k, True)
+    return hits / max(len(log), 1), len({key(query) for query in log})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--log', help="query log, one query per line")
+    parser.add_argument('--requests', type=int, default=20000, help="synthetic log length")
+    parser.add_argument('--cache-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.log:
+        with open(args.log, encoding='utf-8') as f:
+            log = [line.strip() for line in f if line.strip()]
+    else:
+        log = synthetic_log(args.requests)
+
+    print(f"{len(log)} requests, cache of {args.cache_size} entries")
+    print(f"{'keys':<28} {'hit rate':>8} {'distinct':>9}")
+    for name, key in (
+        ('raw (before)', lambda query: query.strip()),
+        ('normalized (after)', normalize_query),
+        ('normalized, no stopwords', lambda query: query_key(query, ignore_stopwords=True)),
+    ):
+        rate, distinct = hit_rate(log, key, args.cache_size)
+        print(f"{name:<28} {rate:8.1%} {distinct:9d}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Throughput of SimplifiedMLRanker: one predict_ranking call per query
+versus a single rank_batch call over every query.
+
+    python bench_ranking.py [--queries 300] [--candidates 10] [--words 200]
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import pandas as pd
+from ml_ranking import SimplifiedMLRanker
+
+def make_groups(n_queries: int, n_candidates: int, n_words: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(20000)]
+    groups = []
+    for q in range(n_queries):
+        query = ' '.join(rng.sample(vocabulary[:2000], 3))
+        groups.append((query, [
+            {
+                'link': f"https://example.com/{q}/{c}",
+                'title': ' '.join(rng.choices(vocabulary, k=8)),
+                'snippet': ' '.join(rng.choices(vocabulary, k=30)),
+                'text': ' '.join(rng.choices(vocabulary, k=n_words))
+            }
+            for c in range(n_candidates)
+        ]))
+    return groups
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--candidates', type=int, default=10)
+    parser.add_argument('--words', type=int, default=200, help="page text words per candidate")
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    groups = make_groups(args.queries, args.candidates, args.words)
+    frames = [(query, pd.DataFrame(candidates)) for query, candidates in groups]
+    ranker = SimplifiedMLRanker(os.path.join(tempfile.mkdtemp(), 'stats.npz'), save_every=10 ** 9)
+    # Count the corpus up front so neither path pays for first-time counting
+    ranker.update([row for _, candidates in groups for row in candidates])
+    n_docs = args.queries * args.candidates
+
+    started = time.perf_counter()
+    for query, frame in frames:
+        ranker.predict_ranking(frame, query).nlargest(args.k, 'ml_rank')
+    per_query = time.perf_counter() - started
+
+    started = time.perf_counter()
+    ranker.rank_batch(groups, k=args.k)
+    batch = time.perf_counter() - started
+
+    print(f"{args.queries} queries x {args.candidates} candidates, {args.words} words of page text each")
+    print(f"per-query predict_ranking: {per_query * 1000:8.1f} ms  {n_docs / per_query:10.0f} docs/s")
+    print(f"rank_batch:                {batch * 1000:8.1f} ms  {n_docs / batch:10.0f} docs/s")
+    print(f"speedup: {per_query / batch:.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Recall and latency of SemanticIndex search against exact TF-IDF cosine.
+
+Builds an index over a synthetic topic-mixture corpus and takes the exact
+top-k by cosine over the full-precision sparse TF-IDF vectors as ground
+truth. Recall therefore includes what LSA projection and float16 storage
+lose as well as what IVF probing skips. It is reported with mean latency
+for an exhaustive scan and for each probe count.
+
+    python bench_semantic_index.py [--docs 50000] [--queries 200] [--mode lsa] [--k 10]
+"""
+import time
+import random
+import argparse
+import tempfile
+import numpy as np
+from semantic_index import SemanticIndex, document_text, _vectorizer
+
+def make_corpus(n_docs: int, n_topics: int = 200, seed: int = 0):
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(20000)]
+    topics = [rng.sample(vocabulary, 60) for _ in range(n_topics)]
+    documents = []
+    for i in range(n_docs):
+        words = rng.choices(rng.choice(topics), k=20) + rng.choices(vocabulary, k=10)
+        documents.append({'link': f"https://example.com/{i}", 'title': ' '.join(words[:6]), 'snippet': ' '.join(words[6:])})
+    return documents, topics
+
+def exact_tfidf_top_k(documents, queries, max_features: int, k: int):
+    """Links of the exact top-k documents per query by cosine over sparse TF-IDF, vectorized as the index does."""
+    vectorizer = _vectorizer(max_features)
+    matrix = vectorizer.fit_transform([document_text(doc) for doc in documents])
+    scores = (matrix @ vectorizer.transform(queries).T).toarray()
+    truth = []
+    for column in scores.T:
+        top = np.argpartition(-column, k - 1)[:k]
+        truth.append({documents[i]['link'] for i in top if column[i] > 0})
+    return truth
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--docs', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--mode', choices=('tfidf', 'lsa'), default='lsa')
+    parser.add_argument('--features', type=int, default=5000, help="TF-IDF vocabulary size")
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    documents, topics = make_corpus(args.docs)
+    rng = random.Random(1)
+    queries = [' '.join(rng.choices(rng.choice(topics), k=4)) for _ in range(args.queries)]
+
+    path = tempfile.mkdtemp()
+    started = time.perf_counter()
+    SemanticIndex.build(documents, path, max_features=args.features, mode=args.mode, ivf_min_docs=0)
+    index = SemanticIndex(path)
+    print(f"{args.docs} documents, {args.mode}, {index._state['vectors'].shape[1]} dimensions "
+          f"({index._state['vectors'].dtype}), {index.n_lists} IVF lists, built in {time.perf_counter() - started:.1f} s")
+
+    def run(probes):
+        started = time.perf_counter()
+        hits = [{hit['link'] for hit in index.search(query, args.k, probes)} for query in queries]
+        return hits, (time.perf_counter() - started) / len(queries)
+
+    def recall(hits):
+        return sum(len(h & t) for h, t in zip(hits, truth)) / max(sum(len(t) for t in truth), 1)
+
+    truth = exact_tfidf_top_k(documents, queries, args.features, args.k)
+    full_hits, full_latency = run(max(index.n_lists, 1))
+    print(f"{'probes':>7} {'recall@' + str(args.k):>10} {'ms/query':>9} {'speedup':>8}   (vs exact TF-IDF cosine)")
+    print(f"{'all':>7} {recall(full_hits):10.3f} {full_latency * 1000:9.2f} {1.0:8.1f}")
+    probes = 1
+    while probes < index.n_lists:
+        hits, latency = run(probes)
+        print(f"{probes:>7} {recall(hits):10.3f} {latency * 1000:9.2f} {full_latency / latency:8.1f}")
+        probes *= 2
+
+if __name__ == '__main__':
+    main()
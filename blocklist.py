@@ -0,0 +1,113 @@
+import os
+import time
+import threading
+from urllib.parse import urlsplit
+from typing import Dict, FrozenSet, Optional, Tuple
+from logging_config import get_module_logger
+from settings import BLOCKLIST_PATH, BLOCKLIST_RELOAD_INTERVAL
+
+class Blocklist:
+    """
+    Compiled matcher for blocklist entries, one per line.
+
+    ``example.com`` blocks that domain and every subdomain of it.
+    ``example.com/tr`` blocks that path and everything below it, on the
+    domain and its subdomains, but not ``example.com/travel``. Lines that
+    start with ``#`` are comments. The file is re-read when its mtime
+    changes, checked at most every ``reload_interval`` seconds. The compiled
+    tables are swapped in one assignment, so lookups never take a lock.
+    """
+    def __init__(self, path: str = BLOCKLIST_PATH, reload_interval: float = BLOCKLIST_RELOAD_INTERVAL):
+        self.logger = get_module_logger('blocklist')
+        self.path = path
+        self.reload_interval = reload_interval
+
+        self._tables: Tuple[FrozenSet[str], Dict[str, Tuple[str, ...]]] = (frozenset(), {})
+        self._mtime: Optional[float] = None
+        self._checked = 0.0
+        self._reload_lock = threading.Lock()
+        self._maybe_reload(force=True)
+
+    @staticmethod
+    def compile(lines) -> Tuple[FrozenSet[str], Dict[str, Tuple[str, ...]]]:
+        """Build (blocked domains, {domain: blocked path prefixes}) from raw entries."""
+        domains, prefixes = set(), {}
+        for line in lines:
+            entry = line.strip().lower()
+            if not entry or entry.startswith('#'):
+                continue
+            if '://' in entry:
+                entry = entry.split('://', 1)[1]
+            host, _, path = entry.partition('/')
+            host = host.split(':', 1)[0].strip('.')
+            if host.startswith('*.'):
+                host = host[2:]
+            if not host:
+                continue
+            path = path.rstrip('/')
+            if path:
+                prefixes.setdefault(host, set()).add('/' + path)
+            else:
+                domains.add(host)
+        return frozenset(domains), {host: tuple(sorted(paths)) for host, paths in prefixes.items()}
+
+    def _maybe_reload(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked < self.reload_interval:
+            return
+        if not self._reload_lock.acquire(blocking=force):
+            return  # another thread is already checking
+        try:
+            self._checked = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError as e:
+                if force:
+                    self.logger.error(f"Blocklist loading error: {e}")
+                return
+            if mtime == self._mtime:
+                return
+            with open(self.path) as f:
+                self._tables = self.compile(f)
+            self._mtime = mtime
+            domains, prefixes = self._tables
+            self.logger.info(f"Loaded blocklist with {len(domains)} domain(s) and "
+                             f"{sum(len(paths) for paths in prefixes.values())} URL prefix(es)")
+        except Exception as e:
+            self.logger.error(f"Blocklist loading error: {e}")
+        finally:
+            self._reload_lock.release()
+
+    def is_blocked(self, url: str) -> bool:
+        """True if the URL's host or host-and-path prefix is blocked."""
+        self._maybe_reload()
+        domains, prefixes = self._tables
+        try:
+            parts = urlsplit(url if '://' in url else f"//{url}")
+            host = (parts.hostname or '').rstrip('.')
+        except ValueError:
+            return False
+        if not host:
+            return False
+
+        path = parts.path.lower().rstrip('/')
+        labels = host.split('.')
+        for i in range(len(labels)):
+            suffix = '.'.join(labels[i:])
+            if suffix in domains:
+                return True
+            for prefix in prefixes.get(suffix, ()):
+                if path == prefix or path.startswith(prefix + '/'):
+                    return True
+        return False
+
+_blocklist: Optional[Blocklist] = None
+_blocklist_lock = threading.Lock()
+
+def get_blocklist() -> Blocklist:
+    """Process-wide blocklist, compiled on first use."""
+    global _blocklist
+    with _blocklist_lock:
+        if _blocklist is None:
+            _blocklist = Blocklist()
+        return _blocklist
@@ -0,0 +1,139 @@
+import time
+import importlib
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+from logging_config import get_module_logger
+
+class LazyModule:
+    """Module proxy that performs the import on first attribute access."""
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str) -> Any:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+class ComponentUnavailable(RuntimeError):
+    """Raised when a component could not be created."""
+
+class LazyComponent:
+    """Create a component on first use and report on its health."""
+    def __init__(self, name: str, factory: Callable[[], Any],
+                 health_check: Optional[Callable[[Any], bool]] = None,
+                 retry_after: float = 5.0):
+        self.name = name
+        self.factory = factory
+        self.health_check = health_check
+        self.retry_after = retry_after
+        self.logger = get_module_logger('components')
+
+        self._instance = None
+        self._lock = threading.Lock()
+        self._last_error: Optional[str] = None
+        self._last_attempt = 0.0
+        self.init_ms: Optional[float] = None
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    @property
+    def instance(self) -> Optional[Any]:
+        """The component if it has been created, without creating it."""
+        return self._instance
+
+    def get(self) -> Any:
+        if self._instance is not None:
+            return self._instance
+
+        with self._lock:
+            if self._instance is not None:
+                return self._instance
+
+            # Don't hammer a failing dependency on every request
+            if self._last_error and time.monotonic() - self._last_attempt < self.retry_after:
+                raise ComponentUnavailable(f"{self.name} unavailable: {self._last_error}")
+
+            self._last_attempt = time.monotonic()
+            started = time.perf_counter()
+            try:
+                self._instance = self.factory()
+            except Exception as e:
+                self._last_error = str(e)
+                self.logger.error(f"Failed to initialize {self.name}: {e}")
+                raise ComponentUnavailable(f"{self.name} unavailable: {e}") from e
+
+            self.init_ms = (time.perf_counter() - started) * 1000
+            self._last_error = None
+            self.logger.info(f"Initialized {self.name} in {self.init_ms:.1f} ms")
+            return self._instance
+
+    def check(self, initialize: bool = False) -> Dict[str, Any]:
+        """Health report; optionally creates the component first."""
+        status = {'initialized': self.initialized, 'healthy': False}
+        try:
+            instance = self.get() if initialize else self._instance
+            if instance is not None:
+                status['initialized'] = True
+                status['healthy'] = bool(self.health_check(instance)) if self.health_check else True
+        except Exception as e:
+            status['error'] = str(e)
+        if self.init_ms is not None:
+            status['init_ms'] = round(self.init_ms, 1)
+        return status
+
+class ComponentRegistry:
+    """Named lazy components, created on first use or by an explicit warm-up."""
+    def __init__(self):
+        self.logger = get_module_logger('components')
+        self._components: Dict[str, LazyComponent] = {}
+        self._closers: Dict[str, Callable[[Any], Any]] = {}
+
+    def register(self, name: str, factory: Callable[[], Any],
+                 health_check: Optional[Callable[[Any], bool]] = None,
+                 close: Optional[Callable[[Any], Any]] = None) -> LazyComponent:
+        component = LazyComponent(name, factory, health_check)
+        self._components[name] = component
+        if close:
+            self._closers[name] = close
+        return component
+
+    def close(self, name: str) -> Any:
+        """Close a component if it was ever created; may return an awaitable."""
+        instance = self.peek(name)
+        closer = self._closers.get(name)
+        if instance is None or closer is None:
+            return None
+        return closer(instance)
+
+    def get(self, name: str) -> Any:
+        return self._components[name].get()
+
+    def peek(self, name: str) -> Optional[Any]:
+        """Return the component only if it has already been created."""
+        component = self._components.get(name)
+        return component.instance if component else None
+
+    def readiness(self, initialize: bool = True) -> Tuple[bool, Dict[str, Dict[str, Any]]]:
+        report = {name: c.check(initialize) for name, c in self._components.items()}
+        return all(status['healthy'] for status in report.values()), report
+
+    def warm_up(self) -> threading.Thread:
+        """Create every component on a background thread."""
+        def _run():
+            started = time.perf_counter()
+            for name, component in self._components.items():
+                try:
+                    component.get()
+                except Exception as e:
+                    self.logger.warning(f"Warm-up of {name} failed: {e}")
+            self.logger.info(f"Component warm-up finished in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        thread = threading.Thread(target=_run, name='component-warm-up', daemon=True)
+        thread.start()
+        return thread
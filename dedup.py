@@ -0,0 +1,135 @@
+import re
+import hashlib
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from typing import Any, Dict, Hashable, List, Optional
+import numpy as np
+from settings import DEDUP_SIMHASH_MAX_DISTANCE, DEDUP_MIN_WORDS
+
+TRACKING_PARAMS = frozenset({
+    'gclid', 'dclid', 'fbclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    '_ga', '_gl', 'ref', 'ref_src', 'referrer', 'source', 'spm', 'cmpid'
+})
+TRACKING_PREFIXES = ('utm_', 'pk_', 'hsa_')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+INDEX_PAGE_RE = re.compile(r'/(index|default)\.(html?|php|aspx?)$')
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+SHINGLE_WORDS = 3
+FINGERPRINT_BITS = 64
+
+def canonicalize_url(url: str) -> str:
+    """
+    Key under which URL variants of the same page collide.
+
+    Drops the scheme, ``www.``, default ports, fragments, tracking
+    parameters, index pages and trailing slashes, and sorts the remaining
+    query parameters.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        host = (parts.hostname or '').rstrip('.')
+        port = parts.port
+    except ValueError:
+        return url
+    if not host:
+        return url
+    if host.startswith('www.'):
+        host = host[4:]
+    if port and port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{port}"
+
+    path = INDEX_PAGE_RE.sub('/', parts.path or '/').rstrip('/')
+    params = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    query = f"?{urlencode(params)}" if params else ''
+    return f"{host}{path}{query}"
+
+def simhash(text: str, min_words: int = DEDUP_MIN_WORDS) -> Optional[str]:
+    """
+    64-bit SimHash of a text's word 3-gram shingles, as 16 hex digits.
+
+    Near-identical texts get fingerprints a few bits apart. Texts shorter
+    than ``min_words`` get None, because their fingerprints collide too
+    easily to be trusted.
+    """
+    words = WORD_RE.findall(text.lower())
+    if len(words) < max(min_words, SHINGLE_WORDS):
+        return None
+
+    shingles = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = np.frombuffer(
+        b''.join(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest() for shingle in shingles),
+        dtype=np.uint8
+    ).reshape(-1, 8)
+    bits = np.unpackbits(hashes, axis=1, bitorder='little')
+    majority = bits.sum(axis=0, dtype=np.int64) * 2 > len(shingles)
+    return np.packbits(majority, bitorder='little').tobytes()[::-1].hex()
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+class SimHashIndex:
+    """
+    Banded LSH index over 64-bit SimHash fingerprints.
+
+    Each fingerprint is split into ``max_distance + 1`` bands. Two
+    fingerprints within ``max_distance`` bits must agree exactly on at
+    least one band (pigeonhole), so a lookup only compares against the
+    fingerprints sharing a band bucket instead of every stored one.
+    """
+    def __init__(self, max_distance: int = DEDUP_SIMHASH_MAX_DISTANCE):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        width = FINGERPRINT_BITS // bands
+        self._bands = [(i * width, width if i < bands - 1 else FINGERPRINT_BITS - i * width) for i in range(bands)]
+        self._buckets: Dict[tuple, List[tuple]] = {}
+
+    def _keys(self, fingerprint: int):
+        for band, (shift, width) in enumerate(self._bands):
+            yield band, (fingerprint >> shift) & ((1 << width) - 1)
+
+    def find(self, fingerprint: int) -> Optional[Hashable]:
+        """Key of an indexed near-duplicate of `fingerprint`, or None."""
+        for bucket_key in self._keys(fingerprint):
+            for other, key in self._buckets.get(bucket_key, ()):
+                if hamming_distance(fingerprint, other) <= self.max_distance:
+                    return key
+        return None
+
+    def add(self, fingerprint: int, key: Hashable):
+        for bucket_key in self._keys(fingerprint):
+            self._buckets.setdefault(bucket_key, []).append((fingerprint, key))
+
+def duplicate_positions(rows: List[Dict[str, Any]], max_distance: int = DEDUP_SIMHASH_MAX_DISTANCE) -> List[int]:
+    """
+    Positions of rows to keep: the first row per canonical URL and per
+    near-duplicate content fingerprint, in input order.
+
+    The band index covers only the rows given. Stored results are checked
+    against fresh ones because the merge passes both in one call; there is
+    no corpus-wide index of stored fingerprints.
+    """
+    seen_urls, index, keep = set(), SimHashIndex(max_distance), []
+    for position, row in enumerate(rows):
+        url_key = canonicalize_url(str(row.get('link') or ''))
+        if url_key in seen_urls:
+            continue
+
+        fingerprint = row.get('simhash')
+        if isinstance(fingerprint, str) and fingerprint:
+            value = int(fingerprint, 16)
+            if index.find(value) is not None:
+                continue
+            index.add(value, position)
+
+        seen_urls.add(url_key)
+        keep.append(position)
+    return keep
+
+def collapse_duplicates(results):
+    """Drop URL variants and near-duplicate pages from a results DataFrame, keeping the first of each."""
+    if results is None or results.empty or 'link' not in results.columns:
+        return results
+    keep = duplicate_positions(results.to_dict('records'))
+    return results.iloc[keep] if len(keep) < len(results) else results
@@ -0,0 +1,144 @@
+import re
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+import lxml.html
+from logging_config import get_module_logger
+from dedup import simhash
+from settings import (
+    DOCUMENT_ANALYSIS_WORKERS,
+    DOCUMENT_MAX_HTML_CHARS,
+    DOCUMENT_MAX_TEXT_CHARS,
+    DOCUMENT_MAX_SENTENCES
+)
+
+HIDDEN_ELEMENTS_XPATH = '//script|//style|//noscript|//template|//svg|//head'
+PUBLISHED_PROPERTIES = ('article:published_time', 'og:published_time')
+PUBLISHED_NAMES = ('date', 'publish-date', 'article.published')
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+MIN_SENTENCE_WORDS = 3
+
+def empty_features() -> Dict[str, Any]:
+    return {
+        'text': '',
+        'word_count': 0,
+        'link_count': 0,
+        'published_date': None,
+        'has_date': False,
+        'sentences': [],
+        'simhash': None
+    }
+
+def analyze_html(html: str) -> Dict[str, Any]:
+    """
+    Parse a page once and extract every feature the pipeline uses.
+
+    Returns clean visible text, word and link counts, the published date
+    from the usual meta tags, the text split into sentences and its SimHash
+    content fingerprint. Runs in worker processes, so it must stay a plain
+    top-level function.
+    """
+    if not html or not html.strip():
+        return empty_features()
+
+    # Bytes with an explicit encoding, so pages with an XML declaration parse
+    parser = lxml.html.HTMLParser(encoding='utf-8')
+    doc = lxml.html.fromstring(html[:DOCUMENT_MAX_HTML_CHARS].encode('utf-8', 'replace'), parser=parser)
+
+    published_date = None
+    for meta in doc.iter('meta'):
+        if meta.get('property') in PUBLISHED_PROPERTIES or meta.get('name') in PUBLISHED_NAMES:
+            published_date = meta.get('content')
+            break
+
+    link_count = len(doc.xpath('//a[@href]'))
+    for element in doc.xpath(HIDDEN_ELEMENTS_XPATH):
+        element.drop_tree()
+
+    text = ' '.join(' '.join(doc.itertext()).split())[:DOCUMENT_MAX_TEXT_CHARS]
+    sentences = [
+        sentence for sentence in SENTENCE_RE.split(text)
+        if len(sentence.split()) >= MIN_SENTENCE_WORDS
+    ][:DOCUMENT_MAX_SENTENCES]
+
+    return {
+        'text': text,
+        'word_count': len(text.split()),
+        'link_count': link_count,
+        'published_date': published_date,
+        'has_date': bool(published_date),
+        'sentences': sentences,
+        'simhash': simhash(text)
+    }
+
+class DocumentAnalyzer:
+    """
+    Shared document-analysis stage backed by a persistent process pool.
+
+    lxml parsing is CPU-bound, so it runs in worker processes instead of
+    threads contending for the GIL. Workers are spawned (not forked) on
+    first use, because the parent runs event-loop and database threads. With
+    ``max_workers=0``, or after the pool breaks, pages are analyzed on the
+    default thread executor instead.
+    """
+    def __init__(self, max_workers: int = DOCUMENT_ANALYSIS_WORKERS):
+        self.logger = get_module_logger('document_analysis')
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.max_workers <= 0:
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    async def analyze(self, html: str) -> Dict[str, Any]:
+        """Feature record for one page; an empty record if parsing fails."""
+        if not html:
+            return empty_features()
+        loop = asyncio.get_running_loop()
+        try:
+            try:
+                return await loop.run_in_executor(self._pool(), analyze_html, html)
+            except BrokenProcessPool:
+                self.logger.error("Document analysis pool broke, analyzing in-process")
+                self.max_workers = 0
+                return await loop.run_in_executor(None, analyze_html, html)
+        except Exception as e:
+            self.logger.error(f"Document analysis error: {e}")
+            return empty_features()
+
+    async def analyze_many(self, pages: List[str]) -> List[Dict[str, Any]]:
+        """Feature records for several pages, analyzed in parallel."""
+        return list(await asyncio.gather(*[self.analyze(html) for html in pages]))
+
+    def close(self):
+        """Stop the worker processes."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+_analyzer: Optional[DocumentAnalyzer] = None
+_analyzer_lock = threading.Lock()
+
+def get_document_analyzer() -> DocumentAnalyzer:
+    """Process-wide analyzer; the pool starts on the first page analyzed."""
+    global _analyzer
+    with _analyzer_lock:
+        if _analyzer is None:
+            _analyzer = DocumentAnalyzer()
+        return _analyzer
+
+def close_document_analyzer():
+    if _analyzer is not None:
+        _analyzer.close()
@@ -1,65 +1,23 @@
-import asyncio
 import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse
-from typing import Set, Dict, Any
-from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
 from logging_config import get_module_logger
+from blocklist import get_blocklist
+from document_analysis import get_document_analyzer
 from datetime import datetime, timedelta
 
 class OptimizedFilter:
     def __init__(self, results: pd.DataFrame):
         self.filtered = results.copy()
         self.logger = get_module_logger("filter")
-        self.blacklist_domains = self._load_blacklist()
+        self.blocklist = get_blocklist()
+        self.analyzer = get_document_analyzer()
 
-    def _load_blacklist(self, blacklist_path="blacklist.txt") -> Set[str]:
-        """Load blacklist with error handling."""
-        try:
-            with open(blacklist_path, "r") as f:
-                return {domain.strip() for domain in f if domain.strip()}
-        except Exception as e:
-            self.logger.error(f"Blacklist loading error: {e}")
-            return set()
-
-    def _extract_domain(self, url: str) -> str:
-        """Extract domain from URL."""
-        try:
-            return urlparse(url).netloc
-        except Exception as e:
-            self.logger.error(f"Error extracting domain from URL {url}: {e}")
-            return ""
-
-    def _basic_content_analysis(self, html: str) -> Dict[str, Any]:
-        """Simplified content analysis with metadata extraction."""
-        try:
-            soup = BeautifulSoup(html, "html.parser")
-            text = soup.get_text(separator=" ", strip=True)
-            
-            # Extract metadata
-            meta_date = None
-            meta_tags = soup.find_all('meta')
-            for tag in meta_tags:
-                if tag.get('property') in ['article:published_time', 'og:published_time'] or \
-                   tag.get('name') in ['date', 'publish-date', 'article.published']:
-                    meta_date = tag.get('content')
-                    break
-            
-            return {
-                "word_count": len(text.split()),
-                "link_count": len(soup.find_all("a", href=True)),
-                "published_date": meta_date,
-                "has_date": bool(meta_date)
-            }
-        except Exception as e:
-            self.logger.error(f"Content analysis error: {e}")
-            return {
-                "word_count": 0,
-                "link_count": 0,
-                "published_date": None,
-                "has_date": False
-            }
+    async def _content_features(self) -> List[Dict[str, Any]]:
+        """Document-analysis features per row, reusing those computed during search."""
+        if {"word_count", "link_count"}.issubset(self.filtered.columns):
+            return self.filtered[["word_count", "link_count"]].to_dict("records")
+        return await self.analyzer.analyze_many(list(self.filtered["html"]))
 
     def _calculate_time_relevance(self, date_str: str) -> float:
         """Calculate time-based relevance score."""
@@ -90,9 +48,9 @@ class OptimizedFilter:
     async def filter(self, min_words: int = 50, time_filter: str = None) -> pd.DataFrame:
     
         try:
-        # Filter blacklisted domains
-            domains = self.filtered["link"].apply(self._extract_domain)
-            self.filtered = self.filtered[~domains.isin(self.blacklist_domains)].copy()
+        # Filter blocked domains and URL prefixes
+            blocked = self.filtered["link"].apply(self.blocklist.is_blocked).astype(bool)
+            self.filtered = self.filtered[~blocked].copy()
 
         # Apply time filter if specified
             if time_filter:
@@ -108,15 +66,8 @@ class OptimizedFilter:
                     pd.to_datetime(self.filtered['created']) >= cutoff
                 ].copy()
 
-        # Parallel content analysis
-            async def process_html(html):
-                return self._basic_content_analysis(html)
-
-            with ThreadPoolExecutor() as executor:
-                loop = asyncio.get_event_loop()
-                content_scores = await asyncio.gather(
-                       *[loop.run_in_executor(executor, process_html, html) for html in self.filtered["html"]]
-                )
+        # Content features, parsed once per page by the shared analysis stage
+            content_scores = await self._content_features()
 
         # Assign content scores
             self.filtered["content_score"] = [
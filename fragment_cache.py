@@ -0,0 +1,61 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+from flask import render_template
+from markupsafe import Markup
+from adaptive_cache import LRUCache
+from logging_config import get_module_logger
+from settings import FRAGMENT_CACHE_MAX_PAGES, FRAGMENT_CACHE_MAX_RESULTS
+
+class ResultFragmentCache:
+    """Per-worker cache of rendered result cards.
+
+    Whole result lists are keyed by (cache key, entry version, time filter), so
+    any write or delete of the underlying cache entry makes them unreachable.
+    Individual cards are keyed by a digest of the fields they render and are
+    shared by every page and query that shows the same document.
+    """
+    def __init__(self, max_pages: int = FRAGMENT_CACHE_MAX_PAGES,
+                 max_results: int = FRAGMENT_CACHE_MAX_RESULTS):
+        self.logger = get_module_logger('fragment_cache')
+        self.pages = LRUCache(max_pages)
+        self.cards = LRUCache(max_results)
+
+    # Fields _result_card.html renders; rank and query come from the enclosing page
+    CARD_FIELDS = ('link', 'title', 'snippet', 'rag_summary')
+
+    @classmethod
+    def _card_key(cls, result: Dict[str, Any]) -> str:
+        fields = [result.get(field) for field in cls.CARD_FIELDS]
+        fields.append('%.2f' % result.get('ml_rank', 0.0))
+        payload = json.dumps(fields, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def _render_card(self, result: Dict[str, Any]) -> str:
+        key = self._card_key(result)
+        card = self.cards.get(key)
+        if card is None:
+            card = render_template('_result_card.html', result=result)
+            self.cards.put(key, card)
+        return card
+
+    def render_results(self, cache_key: str, version: Optional[str], time_filter: Optional[str],
+                       results: List[Dict[str, Any]]) -> Optional[Markup]:
+        """Return the rendered result list, or None when rendering should fall back to the template."""
+        if version is None:
+            return None
+
+        try:
+            page_key = (cache_key, version, time_filter or '')
+            html = self.pages.get(page_key)
+            if html is None:
+                html = Markup('\n'.join(self._render_card(result) for result in results))
+                self.pages.put(page_key, html)
+            return html
+        except Exception as e:
+            self.logger.error(f"Fragment render error: {e}")
+            return None
+
+    def clear(self):
+        self.pages.clear()
+        self.cards.clear()
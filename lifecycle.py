@@ -0,0 +1,136 @@
+import signal
+import asyncio
+import inspect
+import threading
+import time
+import atexit
+from typing import Any, Callable, List, Optional, Tuple
+from logging_config import get_module_logger
+from settings import SHUTDOWN_DRAIN_TIMEOUT
+
+# Shutdown stages, run in ascending order. Within a stage, resources are
+# closed in reverse order of registration.
+STAGE_FLUSH = 10    # write-behind buffers and background queues
+STAGE_CLIENTS = 20  # HTTP, Redis and database clients
+STAGE_POOLS = 30    # thread and process pools
+
+class LifecycleManager:
+    """
+    Owns every long-lived resource of the process.
+
+    On SIGTERM/SIGINT (or interpreter exit) it stops admitting requests, waits
+    for in-flight requests to finish, then closes registered resources stage
+    by stage so buffers are flushed before the clients they write through.
+    """
+    def __init__(self, drain_timeout: float = SHUTDOWN_DRAIN_TIMEOUT):
+        self.logger = get_module_logger('lifecycle')
+        self.drain_timeout = drain_timeout
+
+        self._resources: List[Tuple[int, int, str, Callable[[], Any]]] = []
+        self._in_flight = 0
+        self._idle = threading.Condition()
+        self._shutdown_lock = threading.Lock()
+        self._draining = False
+        self._closed = False
+        self._previous_handlers = {}
+
+    @property
+    def draining(self) -> bool:
+        return self._draining
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def register(self, name: str, close: Callable[[], Any], stage: int = STAGE_CLIENTS):
+        """Register a close callable; it may return an awaitable."""
+        self._resources.append((stage, -len(self._resources), name, close))
+
+    def request_started(self) -> bool:
+        """Track a new request; returns False when the process is draining."""
+        with self._idle:
+            if self._draining:
+                return False
+            self._in_flight += 1
+            return True
+
+    def request_finished(self):
+        with self._idle:
+            self._in_flight = max(0, self._in_flight - 1)
+            if self._in_flight == 0:
+                self._idle.notify_all()
+
+    def _wait_for_drain(self) -> bool:
+        deadline = time.monotonic() + self.drain_timeout
+        with self._idle:
+            while self._in_flight > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    @staticmethod
+    def _run_close(close: Callable[[], Any]):
+        result = close()
+        if inspect.isawaitable(result):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                asyncio.run(result)
+                return
+            # Never block a running loop; finish the coroutine on its own loop
+            worker = threading.Thread(target=asyncio.run, args=(result,), daemon=True)
+            worker.start()
+            worker.join()
+
+    def shutdown(self):
+        """Drain in-flight requests and close every resource exactly once."""
+        with self._shutdown_lock:
+            if self._closed:
+                return
+            with self._idle:
+                self._draining = True
+
+            self.logger.info(f"Shutting down; waiting for {self._in_flight} in-flight request(s)")
+            if not self._wait_for_drain():
+                self.logger.warning(f"Drain timed out with {self._in_flight} request(s) still running")
+
+            for stage, _, name, close in sorted(self._resources):
+                try:
+                    self._run_close(close)
+                    self.logger.info(f"Closed {name}")
+                except Exception as e:
+                    self.logger.error(f"Error closing {name}: {e}")
+
+            self._closed = True
+            self.logger.info("Shutdown complete")
+
+    def _handle_signal(self, signum, frame):
+        self.shutdown()
+        previous = self._previous_handlers.get(signum)
+        if callable(previous):
+            previous(signum, frame)
+        elif previous == signal.SIG_DFL:
+            signal.signal(signum, signal.SIG_DFL)
+            signal.raise_signal(signum)
+
+    def install_signal_handlers(self):
+        """
+        Chain our shutdown in front of any existing handler (e.g. gunicorn's
+        worker handler), and fall back to an atexit hook.
+        """
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                self._previous_handlers[signum] = signal.getsignal(signum)
+                signal.signal(signum, self._handle_signal)
+        atexit.register(self.shutdown)
+
+_lifecycle: Optional[LifecycleManager] = None
+
+def get_lifecycle() -> LifecycleManager:
+    """Process-wide lifecycle manager."""
+    global _lifecycle
+    if _lifecycle is None:
+        _lifecycle = LifecycleManager()
+    return _lifecycle
@@ -0,0 +1,414 @@
+import os
+import re
+import json
+import math
+import time
+import shutil
+import hashlib
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+from logging_config import get_module_logger
+from document_analysis import analyze_html
+from settings import (
+    LOCAL_INDEX_PATH,
+    LOCAL_INDEX_MERGE_DOCS,
+    LOCAL_INDEX_MAX_TEXT_CHARS,
+    BM25_K1,
+    BM25_B
+)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TOKEN_CHARS = 40
+MAX_TF = np.iinfo(np.uint16).max
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; single characters and very long tokens are dropped."""
+    return [token for token in TOKEN_RE.findall(text.lower()) if 1 < len(token) <= MAX_TOKEN_CHARS]
+
+def extract_text(html: str, max_chars: int = LOCAL_INDEX_MAX_TEXT_CHARS) -> str:
+    """Visible text of a page, truncated to bound index growth."""
+    if not html:
+        return ''
+    return analyze_html(html)['text'][:max_chars]
+
+class LocalIndex:
+    """
+    BM25 inverted index over every document the search engine has seen.
+
+    The index has two segments. The base segment lives on disk as numpy
+    arrays and is memory-mapped: for each term, its doc ids are stored as
+    uint32 gaps (delta-encoded against the previous id) next to uint16 term
+    frequencies. New documents go into a small in-memory delta segment. Once
+    ``merge_docs`` documents are pending, both segments are merged into a new
+    generation directory and the ``CURRENT`` pointer is swapped atomically.
+    Re-indexing a link whose content changed tombstones the old doc; the
+    merge drops tombstoned docs and renumbers the rest.
+
+    Writes come from one background thread (``submit``) and merges never
+    hold the lock queries take, except to swap in the new generation. Each
+    worker process keeps its own delta; merges are serialized across
+    processes with a file lock and rebased onto the latest generation on
+    disk, so one worker's merge does not drop another's documents.
+    """
+    def __init__(self, path: str = LOCAL_INDEX_PATH, merge_docs: int = LOCAL_INDEX_MERGE_DOCS,
+                 k1: float = BM25_K1, b: float = BM25_B):
+        self.logger = get_module_logger('local_index')
+        self.path = path
+        self.merge_docs = max(1, merge_docs)
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.RLock()  # Guards the segments that queries read
+        self._write_lock = threading.RLock()  # One writer (add or merge) at a time
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='local-index')
+        self._closed = False
+
+        # Base segment (memory-mapped)
+        self._generation: Optional[str] = None
+        self._terms: Dict[str, Tuple[int, int]] = {}
+        self._gaps = np.zeros(0, dtype=np.uint32)
+        self._tfs = np.zeros(0, dtype=np.uint16)
+
+        # Per-document data for both segments, indexed by doc id
+        self._docs: List[Dict[str, str]] = []
+        self._lengths = np.zeros(0, dtype=np.uint32)
+        self._doc_ids: Dict[str, int] = {}
+        self._deleted: set = set()
+        self._total_length = 0
+
+        # Delta segment: term -> {doc id: tf}
+        self._delta: Dict[str, Dict[int, int]] = {}
+        self._base_docs = 0
+
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._docs) - len(self._deleted)
+
+    # Persistence
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """Serialize generation writes across worker processes; readers take it shared."""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, 'LOCK'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _current_generation(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path, 'CURRENT')) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _read_generation(self, generation: str) -> Dict[str, Any]:
+        target = os.path.join(self.path, generation)
+        with open(os.path.join(target, 'meta.json')) as f:
+            meta = json.load(f)
+        return {
+            'generation': generation,
+            'terms': {term: (offset, count) for term, (offset, count) in meta['terms'].items()},
+            'gaps': np.load(os.path.join(target, 'postings.npy'), mmap_mode='r'),
+            'tfs': np.load(os.path.join(target, 'tfs.npy'), mmap_mode='r'),
+            'docs': [dict(zip(('link', 'title', 'snippet', 'digest'), doc)) for doc in meta['docs']],
+            'lengths': np.asarray(np.load(os.path.join(target, 'lengths.npy')), dtype=np.uint32),
+        }
+
+    def _install(self, base: Dict[str, Any]):
+        """Swap in a loaded generation as the base segment, with an empty delta."""
+        doc_ids = {doc['link']: doc_id for doc_id, doc in enumerate(base['docs'])}
+        with self._lock:
+            self._generation = base['generation']
+            self._terms, self._gaps, self._tfs = base['terms'], base['gaps'], base['tfs']
+            self._docs = base['docs']
+            self._lengths = base['lengths']
+            self._doc_ids = doc_ids
+            self._deleted = set()
+            self._total_length = int(self._lengths.sum())
+            self._delta = {}
+            self._base_docs = len(self._docs)
+
+    def _load(self):
+        try:
+            with self._file_lock(exclusive=False):
+                generation = self._current_generation()
+                if generation is None:
+                    return
+                base = self._read_generation(generation)
+        except Exception as e:
+            self.logger.error(f"Local index load error, starting empty: {e}")
+            return
+
+        self._install(base)
+        self.logger.info(f"Loaded local index with {len(self._docs)} documents and {len(self._terms)} terms")
+
+    @staticmethod
+    def _segment_postings(terms, gaps, tfs, delta, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Doc ids and term frequencies for a term across a base segment and a delta."""
+        entry = terms.get(term)
+        if entry is None:
+            ids, term_tfs = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint16)
+        else:
+            offset, count = entry
+            ids, term_tfs = np.cumsum(gaps[offset:offset + count], dtype=np.int64), tfs[offset:offset + count]
+        postings = delta.get(term)
+        if postings:
+            ids = np.concatenate([ids, np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))])
+            term_tfs = np.concatenate([term_tfs, np.fromiter(postings.values(), dtype=np.uint16, count=len(postings))])
+        return ids, term_tfs
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        return self._segment_postings(self._terms, self._gaps, self._tfs, self._delta, term)
+
+    def _rebase(self, base: Dict[str, Any]):
+        """This process's new documents on top of a generation another process persisted."""
+        new_ids = [doc_id for doc_id in range(self._base_docs, len(self._docs)) if doc_id not in self._deleted]
+        links = {self._docs[doc_id]['link'] for doc_id in new_ids}
+        remap = {doc_id: len(base['docs']) + i for i, doc_id in enumerate(new_ids)}
+
+        docs = base['docs'] + [self._docs[doc_id] for doc_id in new_ids]
+        lengths = np.concatenate([base['lengths'], self._lengths[new_ids]])
+        delta = {}
+        for term, postings in self._delta.items():
+            moved = {remap[doc_id]: tf for doc_id, tf in postings.items() if doc_id in remap}
+            if moved:
+                delta[term] = moved
+        # Links re-indexed here replace the other process's copy
+        deleted = {doc_id for doc_id, doc in enumerate(base['docs']) if doc['link'] in links}
+        return docs, lengths, delta, deleted
+
+    def _write_generation(self, terms, gaps, tfs, docs, lengths, delta, deleted) -> Tuple[str, int]:
+        """Write base + delta minus tombstones as a new generation directory."""
+        live = np.ones(len(docs), dtype=bool)
+        if deleted:
+            live[list(deleted)] = False
+        remap = np.cumsum(live, dtype=np.int64) - 1
+
+        merged_terms, merged_gaps, merged_tfs, offset = {}, [], [], 0
+        for term in sorted(set(terms) | set(delta)):
+            ids, term_tfs = self._segment_postings(terms, gaps, tfs, delta, term)
+            keep = live[ids]
+            if not keep.any():
+                continue
+            ids = remap[ids[keep]]
+            merged_gaps.append(np.diff(ids, prepend=0).astype(np.uint32))
+            merged_tfs.append(np.asarray(term_tfs[keep], dtype=np.uint16))
+            merged_terms[term] = (offset, len(ids))
+            offset += len(ids)
+
+        live_docs = [[doc['link'], doc['title'], doc['snippet'], doc['digest']]
+                     for doc_id, doc in enumerate(docs) if live[doc_id]]
+
+        generation = f"gen-{time.time_ns()}"
+        target = os.path.join(self.path, generation)
+        os.makedirs(target, exist_ok=True)
+        np.save(os.path.join(target, 'postings.npy'),
+                np.concatenate(merged_gaps) if merged_gaps else np.zeros(0, dtype=np.uint32))
+        np.save(os.path.join(target, 'tfs.npy'),
+                np.concatenate(merged_tfs) if merged_tfs else np.zeros(0, dtype=np.uint16))
+        np.save(os.path.join(target, 'lengths.npy'), np.asarray(lengths)[live])
+        with open(os.path.join(target, 'meta.json'), 'w') as f:
+            json.dump({'terms': merged_terms, 'docs': live_docs}, f)
+        return generation, len(live_docs)
+
+    def _merge_and_save(self):
+        """
+        Fold the delta segment and tombstones into a new on-disk generation.
+
+        The generation is built without the query lock (searches keep using the
+        current segments and only wait for the final swap) while holding the
+        index file lock. If another worker persisted a generation since this one
+        was loaded, the new documents are rebased onto it rather than replacing it.
+        """
+        with self._write_lock, self._file_lock(exclusive=True):
+            current = self._current_generation()
+            if current is not None and current != self._generation:
+                base = self._read_generation(current)
+                terms, gaps, tfs = base['terms'], base['gaps'], base['tfs']
+                docs, lengths, delta, deleted = self._rebase(base)
+            else:
+                terms, gaps, tfs = self._terms, self._gaps, self._tfs
+                docs, lengths, delta, deleted = self._docs, self._lengths, self._delta, self._deleted
+
+            generation, n_docs = self._write_generation(terms, gaps, tfs, docs, lengths, delta, deleted)
+            pointer = os.path.join(self.path, 'CURRENT.tmp')
+            with open(pointer, 'w') as f:
+                f.write(generation)
+            os.replace(pointer, os.path.join(self.path, 'CURRENT'))
+            self._install(self._read_generation(generation))
+
+            for name in os.listdir(self.path):
+                if name.startswith('gen-') and name != generation:
+                    shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+        self.logger.info(f"Persisted local index generation {generation} ({n_docs} documents)")
+
+    # Updates
+
+    def add_documents(self, docs: List[Dict[str, Any]]) -> int:
+        """
+        Index documents with link, title, snippet and optional html or text.
+
+        Documents without page text are indexed on their title, snippet and
+        rag_summary; they add links not yet indexed but never replace an
+        indexed version, which may have been built from the full page.
+        Unchanged documents are skipped; returns the number indexed.
+        """
+        prepared = {}
+        for doc in docs:
+            link = doc.get('link')
+            if not link:
+                continue
+            text = doc.get('text') or extract_text(doc.get('html') or '')
+            body = text or doc.get('rag_summary') or ''
+            tokens = tokenize(' '.join([doc.get('title') or '', doc.get('snippet') or '', body]))
+            if tokens:
+                digest = hashlib.sha1(' '.join(tokens).encode('utf-8')).hexdigest()
+                prepared[link] = (doc.get('title') or '', doc.get('snippet') or '', digest, tokens, not text)
+
+        added, lengths = 0, []
+        with self._write_lock:
+            with self._lock:
+                for link, (title, snippet, digest, tokens, partial) in prepared.items():
+                    old_id = self._doc_ids.get(link)
+                    if old_id is not None:
+                        if partial or self._docs[old_id]['digest'] == digest:
+                            continue
+                        self._deleted.add(old_id)
+                        self._total_length -= int(self._lengths[old_id])
+
+                    doc_id = len(self._docs)
+                    self._docs.append({'link': link, 'title': title, 'snippet': snippet, 'digest': digest})
+                    self._doc_ids[link] = doc_id
+                    for term, tf in Counter(tokens).items():
+                        self._delta.setdefault(term, {})[doc_id] = min(tf, MAX_TF)
+                    lengths.append(len(tokens))
+                    self._total_length += len(tokens)
+                    added += 1
+
+                if lengths:
+                    self._lengths = np.concatenate([self._lengths, np.asarray(lengths, dtype=np.uint32)])
+                pending = len(self._docs) - self._base_docs + len(self._deleted)
+
+            if pending >= self.merge_docs:
+                self._merge_and_save()
+        return added
+
+    def submit(self, docs: List[Dict[str, Any]]):
+        """Index documents on the background thread, off the request path."""
+        if self._closed or not docs:
+            return
+        future = self._executor.submit(self.add_documents, docs)
+        future.add_done_callback(self._log_failure)
+
+    def _log_failure(self, future):
+        if future.exception() is not None:
+            self.logger.error(f"Local indexing error: {future.exception()}")
+
+    # Queries
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Top documents by BM25 score.
+
+        Each hit carries ``score`` and ``coverage``, the fraction of distinct
+        query terms the document contains.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            n_docs, n_live = len(self._docs), len(self)
+            if n_live == 0:
+                return []
+            avg_length = self._total_length / n_live
+            norm = self.k1 * (1 - self.b + self.b * self._lengths.astype(np.float32) / avg_length)
+
+            scores = np.zeros(n_docs, dtype=np.float32)
+            matched = np.zeros(n_docs, dtype=np.uint16)
+            for term in terms:
+                ids, tfs = self._postings(term)
+                if ids.size == 0:
+                    continue
+                idf = math.log(1 + (n_live - ids.size + 0.5) / (ids.size + 0.5))
+                tf = tfs.astype(np.float32)
+                # Doc ids are unique within a term, so fancy-index += is safe
+                scores[ids] += idf * tf * (self.k1 + 1) / (tf + norm[ids])
+                matched[ids] += 1
+            if self._deleted:
+                scores[list(self._deleted)] = 0
+
+            candidates = np.flatnonzero(scores > 0)
+            if candidates.size > limit:
+                candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+            candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+            return [
+                {
+                    'link': self._docs[doc_id]['link'],
+                    'title': self._docs[doc_id]['title'],
+                    'snippet': self._docs[doc_id]['snippet'],
+                    'score': float(scores[doc_id]),
+                    'coverage': float(matched[doc_id]) / len(terms)
+                }
+                for doc_id in candidates
+            ]
+
+    def close(self):
+        """Finish queued indexing and persist anything not yet on disk."""
+        self._closed = True
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            dirty = len(self._docs) > self._base_docs or self._deleted
+        if dirty:
+            try:
+                self._merge_and_save()
+            except Exception as e:
+                self.logger.error(f"Local index persist error: {e}")
+
+_local_index: Optional[LocalIndex] = None
+_local_index_lock = threading.Lock()
+
+def get_local_index() -> LocalIndex:
+    """Process-wide local index, loaded on first use."""
+    global _local_index
+    with _local_index_lock:
+        if _local_index is None:
+            _local_index = LocalIndex()
+        return _local_index
+
+def close_local_index():
+    """Persist the process-wide index if it was ever loaded."""
+    if _local_index is not None:
+        _local_index.close()
+
+if __name__ == '__main__':
+    import sys
+    import asyncio
+    from storage import create_storage
+
+    if sys.argv[1:] != ['backfill']:
+        sys.exit("usage: python local_index.py backfill")
+    index = LocalIndex()
+    db = create_storage()
+    try:
+        added = sum(index.add_documents(batch) for batch in db.iter_documents())
+    finally:
+        asyncio.run(db.close())
+    index.close()
+    print(f"Indexed {added} stored document(s) into {LOCAL_INDEX_PATH} ({len(index)} in total)")
@@ -1,38 +1,161 @@
-
 import os
+import json
+import uuid
+import queue
+import atexit
+import random
 import logging
-from logging.handlers import RotatingFileHandler
-from datetime import datetime
+import contextvars
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from settings import LOG_JSON, LOG_QUEUE_SIZE, LOG_MAX_MESSAGE_CHARS, LOG_SAMPLE_RATES
+
+# Request id of the request being served in the current context
+request_id_var: contextvars.ContextVar = contextvars.ContextVar('request_id', default='-')
+
+_listener: Optional[QueueListener] = None
+
+def set_request_id(request_id: Optional[str] = None) -> str:
+    """Bind a request id (generated if not given) to the current context."""
+    request_id = request_id or uuid.uuid4().hex[:16]
+    request_id_var.set(request_id)
+    return request_id
+
+def get_request_id() -> str:
+    return request_id_var.get()
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request id to every record."""
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of INFO/DEBUG records per category.
+
+    The category is taken from ``extra={'category': ...}`` or falls back to the
+    logger name. Warnings and errors are never sampled out.
+    """
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = dict(rates)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        category = getattr(record, 'category', record.name)
+        rate = self.rates.get(category, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+class PayloadCapFilter(logging.Filter):
+    """Render the message once and truncate it to a fixed size."""
+    def __init__(self, max_chars: int):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        if len(message) > self.max_chars:
+            message = f"{message[:self.max_chars]}... [truncated {len(message) - self.max_chars} chars]"
+        record.msg = message
+        record.args = None
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage(),
+        }
+        category = getattr(record, 'category', None)
+        if category:
+            entry['category'] = category
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full."""
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
 def setup_logging(log_dir='logs', log_level=logging.INFO):
     """
-    Setup centralized logging with rotating file handler
+    Setup centralized, non-blocking logging.
+
+    Records are sampled, capped and enqueued on the calling thread; a background
+    listener formats them and writes to the console and a rotating file.
     """
+    global _listener
+
+    if _listener is not None:
+        return logging.getLogger(__name__)
+
     # Create logs directory if it doesn't exist
     os.makedirs(log_dir, exist_ok=True)
-    
+
     # Generate log filename with timestamp
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     log_file = os.path.join(log_dir, f'horizon_search_{timestamp}.log')
-    
+
+    if LOG_JSON:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] - %(message)s'
+        )
+
+    output_handlers = [
+        # Console handler
+        logging.StreamHandler(),
+        # Rotating file handler
+        RotatingFileHandler(
+            log_file,
+            maxBytes=10*1024*1024,  # 10 MB
+            backupCount=5
+        )
+    ]
+    for handler in output_handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATES))
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(PayloadCapFilter(LOG_MAX_MESSAGE_CHARS))
+
     # Configure root logger
-    logging.basicConfig(
-        level=log_level,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            # Console handler
-            logging.StreamHandler(),
-            # Rotating file handler
-            RotatingFileHandler(
-                log_file, 
-                maxBytes=10*1024*1024,  # 10 MB
-                backupCount=5
-            )
-        ]
-    )
-    
+    root = logging.getLogger()
+    root.setLevel(log_level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(queue_handler.queue, *output_handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
     return logging.getLogger(__name__)
 
+def shutdown_logging():
+    """Flush queued records and stop the background listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 # Configure loggers for specific modules
 def get_module_logger(module_name):
     """
@@ -0,0 +1,213 @@
+import os
+import json
+import zlib
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+import numpy as np
+import pandas as pd
+from logging_config import get_module_logger
+from local_index import tokenize
+from settings import (
+    LTR_MODEL_DIR,
+    LTR_TRAINING_EPOCHS,
+    LTR_L2,
+    LTR_VALIDATION_FRACTION,
+    RELEVANCE_BOOST_FACTOR,
+    CLICK_COUNT_WEIGHT,
+    ML_RANK_WEIGHT
+)
+
+FEATURES = ('ml_rank', 'reciprocal_rank', 'title_coverage', 'snippet_coverage')
+MODEL_FORMAT = 1
+LEARNING_RATE = 0.5
+
+logger = get_module_logger('ltr')
+
+def _column(results: pd.DataFrame, name: str, default) -> pd.Series:
+    if name not in results.columns:
+        return pd.Series(default, index=results.index)
+    return results[name].fillna(default)
+
+def _coverage(terms: set, values: pd.Series) -> np.ndarray:
+    if not terms:
+        return np.zeros(len(values), dtype=np.float32)
+    return np.array([len(terms.intersection(tokenize(str(value)))) / len(terms) for value in values], dtype=np.float32)
+
+def ranking_features(results: pd.DataFrame, query: str) -> np.ndarray:
+    """Feature matrix (results x FEATURES) for one query's results; every feature is in [0, 1]."""
+    ml_rank = _column(results, 'ml_rank', 0.0).to_numpy(dtype=np.float32)
+    top = ml_rank.max() if len(ml_rank) else 0.0
+    rank = _column(results, 'rank', len(results)).to_numpy(dtype=np.float32)
+    terms = set(tokenize(query))
+    return np.column_stack([
+        ml_rank / top if top > 0 else np.zeros_like(ml_rank),
+        1.0 / np.maximum(rank, 1.0),
+        _coverage(terms, _column(results, 'title', '')),
+        _coverage(terms, _column(results, 'snippet', ''))
+    ]).astype(np.float32)
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(x, -30, 30)))
+
+def _auc(labels: np.ndarray, scores: np.ndarray) -> Optional[float]:
+    """Probability that a clicked result outscores an unclicked one."""
+    positives = int(labels.sum())
+    negatives = len(labels) - positives
+    if positives == 0 or negatives == 0:
+        return None
+    ranks = pd.Series(scores).rank().to_numpy()
+    return float((ranks[labels == 1].sum() - positives * (positives + 1) / 2) / (positives * negatives))
+
+class RankingModel:
+    """
+    Linear ranking model over FEATURES, scored with one dot product.
+
+    A trained model predicts the probability that a result gets clicked,
+    ``sigmoid(X @ weights + bias)``. The default model, used until one is
+    trained, is ``ML_RANK_WEIGHT * ml_rank``. Clicks already recorded are
+    the training label, not features; ``score`` adds them on top with
+    RELEVANCE_BOOST_FACTOR and CLICK_COUNT_WEIGHT.
+    """
+    def __init__(self, weights, bias: float = 0.0, logistic: bool = False,
+                 version: str = 'default', metrics: Optional[Dict[str, Any]] = None):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.logistic = logistic
+        self.version = version
+        self.metrics = metrics or {}
+
+    @classmethod
+    def default(cls) -> 'RankingModel':
+        return cls([ML_RANK_WEIGHT, 0.0, 0.0, 0.0])
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        raw = features @ self.weights + self.bias
+        return _sigmoid(raw) if self.logistic else raw
+
+    def score(self, results: pd.DataFrame, query: str) -> np.ndarray:
+        """Final rank score of one query's merged results."""
+        clicks = _column(results, 'click_count', 0).to_numpy(dtype=np.float32)
+        relevance = _column(results, 'relevance', False).astype(bool).to_numpy(dtype=np.float32)
+        top_clicks = clicks.max() if len(clicks) else 0.0
+        click_share = clicks / top_clicks if top_clicks > 0 else np.zeros_like(clicks)
+        return (RELEVANCE_BOOST_FACTOR * relevance + CLICK_COUNT_WEIGHT * click_share
+                + self.predict(ranking_features(results, query)))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'format': MODEL_FORMAT,
+            'version': self.version,
+            'features': list(FEATURES),
+            'weights': self.weights.tolist(),
+            'bias': self.bias,
+            'logistic': self.logistic,
+            'metrics': self.metrics
+        }
+
+    def save(self, directory: str = LTR_MODEL_DIR) -> str:
+        """Write ``ltr-<version>.json`` and point ``CURRENT`` at it; returns the artifact path."""
+        os.makedirs(directory, exist_ok=True)
+        name = f"ltr-{self.version}.json"
+        path = os.path.join(directory, name)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        pointer = os.path.join(directory, 'CURRENT.tmp')
+        with open(pointer, 'w') as f:
+            f.write(name)
+        os.replace(pointer, os.path.join(directory, 'CURRENT'))
+        return path
+
+    @classmethod
+    def load(cls, directory: str = LTR_MODEL_DIR) -> 'RankingModel':
+        """Model named by ``CURRENT``; raises if it is missing or was trained on other features."""
+        with open(os.path.join(directory, 'CURRENT')) as f:
+            path = os.path.join(directory, f.read().strip())
+        with open(path) as f:
+            artifact = json.load(f)
+        if artifact.get('format') != MODEL_FORMAT or tuple(artifact.get('features', ())) != FEATURES:
+            raise ValueError(f"{path} was trained on different features")
+        return cls(artifact['weights'], artifact['bias'], artifact['logistic'], artifact['version'], artifact['metrics'])
+
+def _validation_mask(queries: pd.Series, fraction: float) -> np.ndarray:
+    """Hold out whole queries, chosen by a stable hash."""
+    buckets = queries.map(lambda query: zlib.crc32(query.encode('utf-8')) % 1000)
+    return (buckets < fraction * 1000).to_numpy()
+
+def train(results: pd.DataFrame, epochs: int = LTR_TRAINING_EPOCHS, l2: float = LTR_L2,
+          validation_fraction: float = LTR_VALIDATION_FRACTION) -> RankingModel:
+    """
+    Fit a logistic click model on stored results.
+
+    A result is positive if it was ever clicked or marked relevant. Classes
+    are weighted to balance, and whole queries are held out to report
+    validation AUC next to the default model's.
+    """
+    results = results.reset_index(drop=True)
+    features = np.zeros((len(results), len(FEATURES)), dtype=np.float32)
+    for query, group in results.groupby('query', sort=False):
+        features[group.index.to_numpy()] = ranking_features(group, str(query))
+    labels = ((_column(results, 'click_count', 0) > 0) | _column(results, 'relevance', False).astype(bool))
+    labels = labels.to_numpy(dtype=np.float32)
+    if labels.min() == labels.max():
+        raise ValueError("Training needs both clicked and unclicked results")
+
+    held_out = _validation_mask(results['query'].astype(str), validation_fraction)
+    if held_out.all() or labels[~held_out].min() == labels[~held_out].max():
+        held_out[:] = False
+    x, y = features[~held_out], labels[~held_out]
+
+    positive_share = y.mean()
+    sample_weights = np.where(y == 1, 0.5 / positive_share, 0.5 / (1 - positive_share)) / len(y)
+    weights, bias = np.zeros(len(FEATURES), dtype=np.float64), 0.0
+    for _ in range(epochs):
+        error = (_sigmoid(x @ weights + bias) - y) * sample_weights
+        weights -= LEARNING_RATE * (x.T @ error + l2 * weights)
+        bias -= LEARNING_RATE * error.sum()
+
+    version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    model = RankingModel(weights, bias, logistic=True, version=version)
+    model.metrics = {
+        'training_rows': int(len(y)),
+        'positives': int(y.sum()),
+        'validation_rows': int(held_out.sum()),
+        'validation_auc': _auc(labels[held_out], model.predict(features[held_out])),
+        'default_validation_auc': _auc(labels[held_out], RankingModel.default().predict(features[held_out]))
+    }
+    return model
+
+_model: Optional[RankingModel] = None
+_model_lock = threading.Lock()
+
+def get_ranking_model() -> RankingModel:
+    """Process-wide ranking model: the current artifact, or the default if there is none."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            try:
+                _model = RankingModel.load()
+                logger.info(f"Loaded ranking model {_model.version}")
+            except FileNotFoundError:
+                _model = RankingModel.default()
+            except Exception as e:
+                logger.error(f"Ranking model load error, using the default: {e}")
+                _model = RankingModel.default()
+        return _model
+
+if __name__ == '__main__':
+    import sys
+    import asyncio
+    from settings import LTR_MAX_TRAINING_ROWS
+    from storage import create_storage
+
+    if sys.argv[1:] != ['train']:
+        sys.exit("usage: python ltr.py train")
+    db = create_storage()
+    try:
+        rows = db.training_results(LTR_MAX_TRAINING_ROWS)
+    finally:
+        asyncio.run(db.close())
+    if rows.empty:
+        sys.exit("No clicked results to train on yet")
+    model = train(rows)
+    print(f"Saved ranking model {model.version} to {model.save()}: {model.metrics}")
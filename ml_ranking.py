@@ -1,44 +1,235 @@
+import os
+import zlib
+import hashlib
+import threading
+from itertools import chain
 import numpy as np
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.preprocessing import MinMaxScaler
-from typing import Dict, List, Optional
+from scipy.sparse import csr_matrix
+from typing import Any, Dict, List, Optional, Tuple
 from logging_config import get_module_logger
+from local_index import TOKEN_RE, MAX_TOKEN_CHARS, tokenize
+from settings import (
+    RANKER_STATS_PATH,
+    RANKER_HASH_BITS,
+    RANKER_SAVE_EVERY_DOCS,
+    BM25_K1,
+    BM25_B
+)
+
+def _link_key(link: str) -> int:
+    """64-bit key under which a document is counted once."""
+    return int.from_bytes(hashlib.blake2b(link.encode('utf-8'), digest_size=8).digest(), 'little')
 
 class SimplifiedMLRanker:
-    def __init__(self):
+    """
+    Query-aware BM25 ranker backed by corpus-wide document frequencies.
+
+    Terms are hashed into ``2 ** hash_bits`` buckets, so the statistics are
+    a fixed-size array of per-bucket document frequencies plus the document
+    count and total length, and counting new documents only increments them.
+    Each link is counted once. The statistics are saved to ``stats_path``
+    every ``save_every`` new documents and on close, and loaded on startup.
+    """
+    def __init__(self, stats_path: str = RANKER_STATS_PATH, hash_bits: int = RANKER_HASH_BITS,
+                 save_every: int = RANKER_SAVE_EVERY_DOCS, k1: float = BM25_K1, b: float = BM25_B):
         self.logger = get_module_logger('ml_ranking')
-        self.vectorizer = TfidfVectorizer(
-            max_features=500,
-            stop_words='english',
-            dtype=np.float32,
-            norm='l2',
-            smooth_idf=True
-        )
-        self.scaler = MinMaxScaler()
-        
-    def _preprocess_text(self, text: str) -> str:
-        """Preprocess text for ranking."""
+        self.stats_path = stats_path
+        self.n_buckets = 1 << hash_bits
+        self.save_every = max(1, save_every)
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.Lock()
+        self._df = np.zeros(self.n_buckets, dtype=np.uint32)
+        self._n_docs = 0
+        self._total_length = 0
+        self._seen: set = set()
+        self._unsaved = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.stats_path):
+            return
         try:
-            return str(text).lower().strip()
+            with np.load(self.stats_path) as stats:
+                df, seen, totals = stats['df'], stats['seen'], stats['totals']
         except Exception as e:
-            self.logger.error(f"Text preprocessing error: {e}")
-            return ""
+            self.logger.error(f"Ranker statistics load error, starting empty: {e}")
+            return
+        if df.size != self.n_buckets:
+            self.logger.warning(f"Ranker statistics have {df.size} buckets, expected {self.n_buckets}; starting empty")
+            return
+        with self._lock:
+            self._df = df.astype(np.uint32)
+            self._seen = set(seen.tolist())
+            self._n_docs, self._total_length = int(totals[0]), int(totals[1])
+        self.logger.info(f"Loaded ranker statistics for {self._n_docs} documents")
+
+    def save(self):
+        """Write the statistics atomically."""
+        with self._lock:
+            df = self._df.copy()
+            seen = np.fromiter(self._seen, dtype=np.uint64, count=len(self._seen))
+            totals = np.array([self._n_docs, self._total_length], dtype=np.int64)
+            self._unsaved = 0
+        directory = os.path.dirname(self.stats_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.stats_path}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, df=df, seen=seen, totals=totals)
+        os.replace(tmp, self.stats_path)
+
+    def _buckets(self, tokens: List[str]) -> np.ndarray:
+        """
+        Bucket of each token, or -1 for tokens ``tokenize`` would drop.
+
+        Tokens repeat heavily within and across pages, so each distinct
+        token is length-checked and hashed once.
+        """
+        codes, vocabulary = pd.factorize(np.array(tokens, dtype=object))
+        mask = self.n_buckets - 1
+        table = np.fromiter(
+            (zlib.crc32(token.encode('utf-8')) & mask if 1 < len(token) <= MAX_TOKEN_CHARS else -1
+             for token in vocabulary),
+            dtype=np.int64, count=len(vocabulary)
+        )
+        return table[codes]
+
+    @staticmethod
+    def _document_text(row: Dict[str, Any]) -> str:
+        """Title, snippet and page text from document analysis."""
+        return ' '.join(str(row.get(key) or '') for key in ('title', 'snippet', 'text'))
+
+    def _featurize(self, rows: List[Dict[str, Any]]) -> csr_matrix:
+        """Hashed term-frequency matrix (rows x buckets) of every document in one pass."""
+        token_lists = [TOKEN_RE.findall(self._document_text(row).lower()) for row in rows]
+        lengths = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+        buckets = self._buckets(list(chain.from_iterable(token_lists)))
+        doc_ids = np.repeat(np.arange(len(rows)), lengths)
+        kept = buckets >= 0
+        # Duplicate (doc, bucket) entries are summed into term frequencies
+        return csr_matrix((np.ones(int(kept.sum()), dtype=np.float32), (doc_ids[kept], buckets[kept])),
+                          shape=(len(rows), self.n_buckets))
+
+    def _count(self, links: List[str], matrix: csr_matrix) -> int:
+        """Add unseen documents to the statistics; returns how many were new."""
+        with self._lock:
+            new_rows = []
+            for row, link in enumerate(links):
+                key = _link_key(link)
+                if not link or matrix.indptr[row] == matrix.indptr[row + 1] or key in self._seen:
+                    continue
+                self._seen.add(key)
+                new_rows.append(row)
+            if new_rows:
+                counted = matrix[new_rows]
+                buckets, counts = np.unique(counted.indices, return_counts=True)
+                self._df[buckets] += counts.astype(np.uint32)
+                self._n_docs += len(new_rows)
+                self._total_length += int(counted.sum())
+            self._unsaved += len(new_rows)
+            due = self._unsaved >= self.save_every
+        if due:
+            try:
+                self.save()
+            except Exception as e:
+                self.logger.error(f"Ranker statistics save error: {e}")
+        return len(new_rows)
+
+    def update(self, rows: List[Dict[str, Any]]) -> int:
+        """Count documents (dicts with link, title, snippet, text) into the corpus statistics."""
+        return self._count([str(row.get('link') or '') for row in rows], self._featurize(rows))
+
+    def _idf(self, buckets: np.ndarray) -> np.ndarray:
+        with self._lock:
+            df = self._df[buckets].astype(np.float32)
+            n_docs = self._n_docs
+        return np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+    def _score(self, queries: List[str], matrix: csr_matrix, group_ids: np.ndarray) -> np.ndarray:
+        """BM25 score of each document row for the query of its group."""
+        if self._n_docs == 0:
+            return np.zeros(matrix.shape[0], dtype=np.float32)
+
+        # One row per query holding the IDF of its distinct terms
+        terms = [np.unique(self._buckets(list(dict.fromkeys(tokenize(query))))) for query in queries]
+        query_rows = np.repeat(np.arange(len(queries)), [t.size for t in terms])
+        query_cols = np.concatenate(terms) if query_rows.size else np.zeros(0, dtype=np.uint32)
+        query_weights = csr_matrix((self._idf(query_cols), (query_rows, query_cols)),
+                                   shape=(len(queries), self.n_buckets))
+
+        # Saturate every stored term frequency against its document's length
+        lengths = np.asarray(matrix.sum(axis=1), dtype=np.float32).ravel()
+        norm = self.k1 * (1 - self.b + self.b * lengths / (self._total_length / self._n_docs))
+        saturated = matrix.copy()
+        entry_rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+        saturated.data = saturated.data * (self.k1 + 1) / (saturated.data + norm[entry_rows])
+
+        return np.asarray(saturated.multiply(query_weights[group_ids]).sum(axis=1), dtype=np.float32).ravel()
 
-    def _combine_features(self, df: pd.DataFrame) -> List[str]:
-        """Combine text features for ranking."""
+    @staticmethod
+    def _top_k(scores: np.ndarray, offsets: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        """Per-group top-k of a flat score array split at `offsets`, via one segmented argpartition."""
+        sizes = np.diff(offsets)
+        padded = np.full((sizes.size, max(int(sizes.max()), 1)), -np.inf, dtype=np.float32)
+        group_ids = np.repeat(np.arange(sizes.size), sizes)
+        positions = np.arange(scores.size) - offsets[group_ids]
+        padded[group_ids, positions] = scores
+
+        k = min(k, padded.shape[1])
+        top = np.argpartition(-padded, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(padded, top, axis=1)
+        # Best first; ties keep the original order
+        order = np.lexsort((top, -top_scores))
+        top, top_scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+        ranked = []
+        for group_top, group_scores in zip(top, top_scores):
+            best = group_scores[0] if group_scores.size and group_scores[0] > 0 else 1.0
+            ranked.append([
+                (int(position), float(score / best))
+                for position, score in zip(group_top, group_scores) if np.isfinite(score)
+            ])
+        return ranked
+
+    def rank_batch(self, groups: List[Tuple[str, List[Dict[str, Any]]]], k: int = 10) -> List[List[Tuple[int, float]]]:
+        """
+        Rank many (query, candidates) groups in one call.
+
+        Every candidate across all groups is featurized into one sparse
+        matrix and scored together. Returns, per group, up to ``k``
+        (candidate position, score) pairs, best first, with scores scaled so
+        the group's best is 1. Candidates are counted into the corpus
+        statistics, as in ``predict_ranking``.
+        """
+        if not groups:
+            return []
         try:
-            features = []
-            for _, row in df.iterrows():
-                text = f"{row.get('title', '')} {row.get('snippet', '')}"
-                features.append(self._preprocess_text(text))
-            return features
+            rows = [row for _, candidates in groups for row in candidates]
+            offsets = np.cumsum([0] + [len(candidates) for _, candidates in groups])
+            if not rows or k <= 0:
+                return [[] for _ in groups]
+
+            matrix = self._featurize(rows)
+            self._count([str(row.get('link') or '') for row in rows], matrix)
+            group_ids = np.repeat(np.arange(len(groups)), np.diff(offsets))
+            scores = self._score([query for query, _ in groups], matrix, group_ids)
+            return self._top_k(scores, offsets, k)
+
         except Exception as e:
-            self.logger.error(f"Feature combination error: {e}")
-            return [""] * len(df)
+            self.logger.error(f"Batch ranking error: {e}")
+            # Fallback to the candidates' own order
+            return [[(i, 1.0) for i in range(min(k, len(candidates)))] for _, candidates in groups]
+
+    def predict_ranking(self, results: pd.DataFrame, query: str = '') -> pd.DataFrame:
+        """
+        BM25 score of each result for the query, scaled so the best is 1.
 
-    def predict_ranking(self, results: pd.DataFrame) -> pd.DataFrame:
-        """Predict ranking scores with error handling and validation."""
+        The results are counted into the corpus statistics first. Without
+        query terms every result scores 1.
+        """
         try:
             if results.empty:
                 return results
@@ -50,26 +241,19 @@ class SimplifiedMLRanker:
                 results['ml_rank'] = 1.0
                 return results
 
-            # Combine and process features
-            text_features = self._combine_features(results)
-            
-            # Calculate TF-IDF scores
-            tfidf_matrix = self.vectorizer.fit_transform(text_features)
-            
-            # Calculate document importance scores
-            importance_scores = np.asarray(tfidf_matrix.sum(axis=1)).flatten()
-            
-            # Scale scores to [0, 1] range
-            if len(importance_scores) > 1:
-                importance_scores = self.scaler.fit_transform(
-                    importance_scores.reshape(-1, 1)
-                ).flatten()
-            
-            # Add scores to results
-            results['ml_rank'] = importance_scores
-            
+            rows = results.to_dict('records')
+            matrix = self._featurize(rows)
+            self._count([str(row.get('link') or '') for row in rows], matrix)
+
+            if not tokenize(query) or self._n_docs == 0:
+                results['ml_rank'] = 1.0
+                return results
+
+            scores = self._score([query], matrix, np.zeros(len(rows), dtype=np.int64))
+            top = scores.max()
+            results['ml_rank'] = scores / top if top > 0 else 0.0
             return results
-            
+
         except Exception as e:
             self.logger.error(f"Ranking error: {e}")
             # Fallback to default ranking
@@ -77,25 +261,43 @@ class SimplifiedMLRanker:
             return results
 
     def get_feature_importance(self, results: pd.DataFrame) -> Optional[Dict[str, float]]:
-        """Get feature importance scores for debugging."""
+        """Corpus IDF of the rarest terms in the results, for debugging."""
         try:
             if results.empty:
                 return None
 
-            text_features = self._combine_features(results)
-            self.vectorizer.fit_transform(text_features)
-            
-            feature_scores = dict(zip(
-                self.vectorizer.get_feature_names_out(),
-                self.vectorizer.idf_
-            ))
-            
-            return {k: v for k, v in sorted(
-                feature_scores.items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:10]}
-            
+            terms = sorted({
+                token for row in results.to_dict('records') for token in tokenize(self._document_text(row))
+            })
+            if not terms:
+                return None
+            idf = self._idf(self._buckets(terms))
+            return {terms[i]: float(idf[i]) for i in np.argsort(-idf, kind='stable')[:10]}
+
         except Exception as e:
             self.logger.error(f"Feature importance calculation error: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def close(self):
+        """Save statistics not yet on disk."""
+        if self._unsaved:
+            try:
+                self.save()
+            except Exception as e:
+                self.logger.error(f"Ranker statistics save error: {e}")
+
+_ranker: Optional[SimplifiedMLRanker] = None
+_ranker_lock = threading.Lock()
+
+def get_ranker() -> SimplifiedMLRanker:
+    """Process-wide ranker, loading saved statistics on first use."""
+    global _ranker
+    with _ranker_lock:
+        if _ranker is None:
+            _ranker = SimplifiedMLRanker()
+        return _ranker
+
+def close_ranker():
+    """Save the process-wide ranker's statistics if it was ever loaded."""
+    if _ranker is not None:
+        _ranker.close()
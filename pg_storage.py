@@ -0,0 +1,277 @@
+# pg_storage.py
+
+import json
+import asyncio
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple, Iterator
+import asyncpg
+import pandas as pd
+from settings import (
+    DATABASE_URL,
+    PG_POOL_MIN_SIZE,
+    PG_POOL_MAX_SIZE,
+    PG_STATEMENT_CACHE_SIZE,
+    PG_COMMAND_TIMEOUT,
+    DB_RESULT_LIMIT,
+    MIGRATION_BATCH_SIZE,
+    LTR_MAX_TRAINING_ROWS
+)
+from storage import (
+    SCHEMA_SQL,
+    STORAGE_FUNCTIONS_SQL,
+    MIGRATE_RESULTS_FUNCTION_SQL,
+    RESULT_COLUMNS,
+    DOCUMENT_COLUMNS,
+    TRAINING_COLUMNS,
+    PERSISTED_RESULT_FIELDS,
+    time_filter_cutoff
+)
+from logging_config import get_module_logger
+
+QUERY_RESULTS_SQL = f"""
+SELECT {", ".join(RESULT_COLUMNS)} FROM query_document_view
+WHERE query = $1 AND ($2::timestamptz IS NULL OR created >= $2)
+  AND ($3::boolean IS NULL
+       OR relevance < $3
+       OR (relevance = $3 AND (click_count < $4
+           OR (click_count = $4 AND (rank > $5
+               OR (rank = $5 AND link > $6))))))
+ORDER BY relevance DESC, click_count DESC, rank, link
+LIMIT $7
+"""
+
+DOCUMENTS_BATCH_SQL = f"""
+SELECT url_hash, {", ".join(DOCUMENT_COLUMNS)} FROM documents
+WHERE url_hash > $1
+ORDER BY url_hash
+LIMIT $2
+"""
+
+TRAINING_RESULTS_SQL = f"""
+SELECT {", ".join(TRAINING_COLUMNS)} FROM query_document_view
+WHERE query IN (SELECT query FROM query_document_view WHERE click_count > 0 OR relevance)
+ORDER BY created DESC
+LIMIT $1
+"""
+
+# Writes go through the functions shared with the Supabase backend
+MARK_RELEVANT_SQL = "SELECT * FROM mark_result_relevant($1, $2, $3, $4, $5, $6, $7)"
+MARK_RELEVANT_BULK_SQL = "SELECT mark_results_relevant_bulk($1::jsonb)"
+UPSERT_RESULTS_BULK_SQL = "SELECT upsert_results_bulk($1::jsonb)"
+UPSERT_RESULT_SQL = "SELECT * FROM upsert_result($1::jsonb)"
+MIGRATE_RESULTS_BATCH_SQL = "SELECT migrate_results_batch($1, $2)"
+
+# Serializes schema installation across workers starting at the same time
+SCHEMA_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('horizon_search_schema'))"
+
+class AsyncPGStorage:
+    """
+    Direct Postgres backend with the same interface as OptimizedDBStorage.
+
+    The asyncpg pool lives on a private event loop thread, because Flask runs
+    every async view on a fresh loop and a pool is bound to the loop that
+    created it. Coroutines are handed to that loop and awaited from the
+    caller's loop, so callers never block on the network. asyncpg prepares
+    each statement once per connection and reuses it from its statement cache.
+    """
+    def __init__(self, dsn: Optional[str] = None):
+        self.logger = get_module_logger("storage")
+        self.dsn = dsn or DATABASE_URL
+        if not self.dsn:
+            raise ValueError("Missing required Postgres configuration (DATABASE_URL)")
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='pg-storage', daemon=True)
+        self._thread.start()
+
+        try:
+            self.pool = self._run(self._create_pool())
+        except Exception:
+            self._stop_loop()
+            raise
+        self.logger.info("Connected to Postgres")
+
+    async def _create_pool(self):
+        pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=PG_POOL_MIN_SIZE,
+            max_size=PG_POOL_MAX_SIZE,
+            statement_cache_size=PG_STATEMENT_CACHE_SIZE,
+            command_timeout=PG_COMMAND_TIMEOUT
+        )
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(SCHEMA_LOCK_SQL)
+                await conn.execute(SCHEMA_SQL)
+                for sql in STORAGE_FUNCTIONS_SQL:
+                    await conn.execute(sql)
+        return pool
+
+    def _run(self, coro):
+        """Run a coroutine on the storage loop and wait for it (sync callers)."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _call(self, coro):
+        """Run a coroutine on the storage loop and await it from another loop."""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    def _stop_loop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    def health_check(self) -> bool:
+        """Cheap round trip used by the readiness probe."""
+        try:
+            return self._run(self.pool.fetchval("SELECT 1")) == 1
+        except Exception as e:
+            self.logger.error(f"Health check error: {e}")
+            return False
+
+    async def update_relevance(self, query: str, link: str, result_data: Dict[str, Any]) -> Optional[Dict]:
+        """Mark a result relevant and increment its click count in one atomic round trip."""
+        try:
+            row = await self._call(self.pool.fetchrow(
+                MARK_RELEVANT_SQL,
+                query,
+                link,
+                result_data.get("title", ""),
+                result_data.get("snippet", ""),
+                result_data.get("ml_rank", 0.0),
+                result_data.get("rag_summary", ""),
+                result_data.get("rank", 1)
+            ))
+            return dict(row) if row else None
+        except Exception as e:
+            self.logger.error(f"Update relevance error: {e}")
+            return None
+
+    def bulk_mark_relevant(self, events: List[Dict[str, Any]]) -> int:
+        """Apply coalesced click events in one round trip; raises on failure."""
+        if not events:
+            return 0
+
+        fields = ("query", "link", "title", "snippet", "ml_rank", "rag_summary", "rank", "clicks")
+        payload = json.dumps([{field: event.get(field) for field in fields} for event in events])
+        try:
+            return self._run(self.pool.fetchval(MARK_RELEVANT_BULK_SQL, payload))
+        except Exception as e:
+            self.logger.error(f"Bulk relevance update error: {e}")
+            raise
+
+    def bulk_upsert_results(self, rows: List[Dict[str, Any]]) -> int:
+        """Upsert one fetched result set in one round trip, keeping click data; raises on failure."""
+        if not rows:
+            return 0
+
+        payload = json.dumps([{field: row.get(field) for field in PERSISTED_RESULT_FIELDS} for row in rows])
+        try:
+            return self._run(self.pool.fetchval(UPSERT_RESULTS_BULK_SQL, payload))
+        except Exception as e:
+            self.logger.error(f"Bulk result upsert error: {e}")
+            raise
+
+    async def _query_results(self, query: str, time_filter: Optional[str], limit: int,
+                             after: Optional[Tuple]) -> pd.DataFrame:
+        relevance, clicks, rank, link = after if after else (None, None, None, None)
+        rows = await self.pool.fetch(
+            QUERY_RESULTS_SQL, query, time_filter_cutoff(time_filter),
+            relevance, clicks, rank, link, limit
+        )
+        return pd.DataFrame([dict(row) for row in rows]) if rows else pd.DataFrame()
+
+    def query_results(self, query: str, time_filter: str = None, limit: int = DB_RESULT_LIMIT,
+                      after: Optional[Tuple] = None) -> pd.DataFrame:
+        """Top `limit` results for a query, optionally after a keyset cursor."""
+        try:
+            return self._run(self._query_results(query, time_filter, limit, after))
+        except Exception as e:
+            self.logger.error(f"Query error: {e}")
+            return pd.DataFrame()
+
+    async def async_query_results(self, query: str, time_filter: str = None, limit: int = DB_RESULT_LIMIT,
+                                  after: Optional[Tuple] = None) -> pd.DataFrame:
+        """Query results without blocking the caller's event loop."""
+        try:
+            return await self._call(self._query_results(query, time_filter, limit, after))
+        except Exception as e:
+            self.logger.error(f"Query error: {e}")
+            return pd.DataFrame()
+
+    def iter_documents(self, batch_size: int = MIGRATION_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+        """Every stored document (DOCUMENT_COLUMNS), in url_hash-ordered batches of `batch_size`."""
+        after = ''
+        while True:
+            try:
+                rows = self._run(self.pool.fetch(DOCUMENTS_BATCH_SQL, after, batch_size))
+            except Exception as e:
+                self.logger.error(f"Document scan error: {e}")
+                raise
+            if not rows:
+                return
+            after = rows[-1]['url_hash']
+            yield [{column: row[column] for column in DOCUMENT_COLUMNS} for row in rows]
+
+    def training_results(self, limit: int = LTR_MAX_TRAINING_ROWS) -> pd.DataFrame:
+        """Most recent `limit` stored results of queries with at least one click, for `python ltr.py train`."""
+        try:
+            rows = self._run(self.pool.fetch(TRAINING_RESULTS_SQL, limit))
+            return pd.DataFrame([dict(row) for row in rows]) if rows else pd.DataFrame()
+        except Exception as e:
+            self.logger.error(f"Training results error: {e}")
+            return pd.DataFrame()
+
+    def insert_or_update_result(self, values: Dict[str, Any]) -> Optional[Dict]:
+        """Insert or update a result."""
+        try:
+            required_fields = ["query", "rank", "link", "title"]
+            if not all(field in values for field in required_fields):
+                raise ValueError("Missing required fields")
+
+            last_clicked = values.get("last_clicked")
+            if isinstance(last_clicked, datetime):
+                last_clicked = last_clicked.isoformat()
+
+            row = self._run(self.pool.fetchrow(UPSERT_RESULT_SQL, json.dumps({
+                "query": values["query"],
+                "rank": values["rank"],
+                "link": values["link"],
+                "title": values["title"],
+                "snippet": values.get("snippet", ""),
+                "relevance": values.get("relevance", False),
+                "ml_rank": values.get("ml_rank", 0.0),
+                "rag_summary": values.get("rag_summary", ""),
+                "click_count": values.get("click_count", 0),
+                "last_clicked": last_clicked
+            })))
+            return dict(row) if row else None
+
+        except Exception as e:
+            self.logger.error(f"Insert/Update error: {e}")
+            return None
+
+    async def _migrate_legacy_results(self, batch_size: int) -> int:
+        if await self.pool.fetchval("SELECT to_regclass('results')") is None:
+            self.logger.info("No legacy results table to migrate")
+            return 0
+        await self.pool.execute(MIGRATE_RESULTS_FUNCTION_SQL)
+        last_id, batches = 0, 0
+        while True:
+            last = await self.pool.fetchval(MIGRATE_RESULTS_BATCH_SQL, last_id, batch_size)
+            if last is None:
+                return batches
+            last_id, batches = last, batches + 1
+            self.logger.info(f"Migrated legacy results up to id {last_id}")
+
+    def migrate_legacy_results(self, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+        """Copy the pre-normalization `results` table in id-ordered batches; returns the batch count."""
+        return self._run(self._migrate_legacy_results(batch_size))
+
+    async def close(self):
+        """Close the pool and stop the storage loop."""
+        try:
+            await self._call(self.pool.close())
+        except Exception as e:
+            self.logger.error(f"Close error: {e}")
+        finally:
+            self._stop_loop()
@@ -0,0 +1,30 @@
+import re
+import unicodedata
+from settings import QUERY_KEY_IGNORE_STOPWORDS
+
+# Punctuation becomes a space, except '+' and '#' (c++, c#) and '.', '-', "'"
+# inside a word (node.js, e-mail, o'reilly)
+PUNCTUATION_RE = re.compile(r"[^\w\s.\-'+#]|(?<!\w)[.\-']|[.\-'](?!\w)")
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form of a query for cache keys and stored rows.
+
+    Applies Unicode NFKC (full-width and compatibility characters), case
+    folding, and punctuation and whitespace collapsing, so "Dr. Strange",
+    "dr  strange" and "ＤＲ ＳＴＲＡＮＧＥ " all become "dr strange". A query
+    made only of punctuation keeps it rather than becoming empty.
+    """
+    text = unicodedata.normalize('NFKC', query or '').casefold()
+    normalized = ' '.join(PUNCTUATION_RE.sub(' ', text).split())
+    return normalized or ' '.join(text.split())
+
+def query_key(query: str, ignore_stopwords: bool = QUERY_KEY_IGNORE_STOPWORDS) -> str:
+    """normalize_query, optionally without English stopwords ("the matrix" -> "matrix")."""
+    normalized = normalize_query(query)
+    if not ignore_stopwords:
+        return normalized
+    # Imported here: sklearn is heavy and app startup must not pay for it when the option is off
+    from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+    words = [word for word in normalized.split() if word not in ENGLISH_STOP_WORDS]
+    return ' '.join(words) or normalized
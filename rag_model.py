@@ -1,25 +1,97 @@
 import re
-from typing import Optional
+import asyncio
+import hashlib
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from adaptive_cache import LRUCache
 from logging_config import get_module_logger
+from local_index import TOKEN_RE, tokenize
+from settings import RAG_SUMMARY_SENTENCES, RAG_SUMMARY_MAX_CHARS, RAG_SUMMARY_CACHE_SIZE
+
+SPLIT_RE = re.compile(r'[.!?]+')
+POSITION_WEIGHT = 0.1  # Prior for earlier sentences, below one matched term
+
+def query_terms(query: str) -> Tuple[str, ...]:
+    """Distinct non-stopword query tokens, sorted so word order does not matter."""
+    terms = set(tokenize(query))
+    return tuple(sorted(terms - ENGLISH_STOP_WORDS or terms))
+
+def score_sentences(sentences: List[str], terms: Tuple[str, ...]) -> np.ndarray:
+    """
+    Relevance of each sentence to the query terms.
+
+    A sentence scores the summed page-level IDF of the distinct terms it
+    contains, so a rare query term outweighs one that is in every sentence.
+    Ties go to earlier sentences.
+    """
+    if not sentences or not terms:
+        return np.zeros(len(sentences))
+    token_lists = [TOKEN_RE.findall(sentence.lower()) for sentence in sentences]
+    sentence_ids = np.repeat(np.arange(len(sentences)), [len(tokens) for tokens in token_lists])
+    term_ids = pd.Series([token for tokens in token_lists for token in tokens], dtype=object).map(
+        {term: i for i, term in enumerate(terms)}
+    ).to_numpy(dtype=np.float64)
+    matched = ~np.isnan(term_ids)
+
+    contains = np.zeros((len(sentences), len(terms)), dtype=bool)
+    contains[sentence_ids[matched], term_ids[matched].astype(np.intp)] = True
+    idf = np.log1p(len(sentences) / np.maximum(contains.sum(axis=0), 1))
+    position = POSITION_WEIGHT * (1.0 - np.arange(len(sentences)) / len(sentences))
+    return np.where(contains.any(axis=1), contains @ idf + position, 0.0)
+
+def summarize(query: str, sentences: List[str], max_sentences: int = RAG_SUMMARY_SENTENCES,
+              max_chars: int = RAG_SUMMARY_MAX_CHARS) -> str:
+    """The sentences most relevant to the query, in page order; empty if none match."""
+    scores = score_sentences(sentences, query_terms(query))
+    best = np.flatnonzero(scores > 0)
+    best = best[np.argsort(-scores[best], kind='stable')][:max_sentences]
+    summary = ' '.join(sentences[i].strip() for i in np.sort(best))
+    return summary[:max_chars].rstrip() + '...' if len(summary) > max_chars else summary
 
 class SimplifiedRAG:
-    def __init__(self):
+    """
+    Extractive summaries of fetched pages against the user's query.
+
+    Scoring runs on the default thread executor, away from the event loop.
+    Summaries are cached per worker by (URL, page content hash, query
+    terms), so a popular page is summarized once per distinct query and not
+    on every request.
+    """
+    def __init__(self, cache_size: int = RAG_SUMMARY_CACHE_SIZE):
         self.logger = get_module_logger('rag')
-        
-    async def async_generate_response(self, query: str, context: str) -> str:
+        self.cache = LRUCache(cache_size)
+
+    async def async_generate_response(self, query: str, context: str,
+                                      sentences: Optional[List[str]] = None,
+                                      url: Optional[str] = None) -> str:
         """
-        Simplified response generation using basic text extraction
+        Summary of a page for the query, or the truncated context if nothing matches.
+
+        `sentences` are the page's sentences from document analysis; without
+        them the context is split instead.
         """
         try:
-            # Basic text summarization using sentence extraction
-            sentences = re.split(r'[.!?]+', context)
-            relevant_sentences = [s.strip() for s in sentences if any(q.lower() in s.lower() for q in query.split())]
-            
-            if relevant_sentences:
-                summary = ' '.join(relevant_sentences[:2])  # Take first two relevant sentences
-                return summary if len(summary) > 20 else context[:200] + "..."
-            return context[:200] + "..."  # Fallback to simple truncation
-            
+            if not sentences:
+                sentences = [s for s in SPLIT_RE.split(context) if s.strip()]
+
+            key = None
+            if url:
+                digest = hashlib.blake2b('\n'.join(sentences).encode('utf-8'), digest_size=16).hexdigest()
+                key = (url, digest, query_terms(query))
+                summary = self.cache.get(key)
+                if summary is not None:
+                    return summary
+
+            loop = asyncio.get_running_loop()
+            summary = await loop.run_in_executor(None, summarize, query, sentences)
+            if len(summary) <= 20:
+                summary = context[:200] + "..."  # Fallback to simple truncation
+            if key is not None:
+                self.cache.put(key, summary)
+            return summary
+
         except Exception as e:
             self.logger.error(f"Response generation error: {e}")
-            return "Unable to generate summary."
\ No newline at end of file
+            return "Unable to generate summary."
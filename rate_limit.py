@@ -0,0 +1,126 @@
+import math
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+from logging_config import get_module_logger
+
+# KEYS[1] = bucket key; ARGV = rate (tokens/s), burst
+# Returns {allowed, retry_after_ms}
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+local allowed = 0
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return {allowed, retry}
+"""
+
+class TokenBucketLimiter:
+    """
+    Per-client token bucket.
+
+    Buckets live in Redis (one atomic script call per check) so every worker
+    shares them; if Redis is unavailable the limiter falls back to buckets
+    kept in this process.
+    """
+    def __init__(self, rate_per_minute: float, burst: int,
+                 redis_provider: Optional[Callable[[], Any]] = None,
+                 prefix: str = 'ratelimit', max_local_buckets: int = 10000):
+        self.logger = get_module_logger('rate_limit')
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.redis_provider = redis_provider
+        self.prefix = prefix
+        self.max_local_buckets = max_local_buckets
+
+        self._script = None
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _redis_script(self):
+        if self._script is None and self.redis_provider:
+            self._script = self.redis_provider().register_script(_TOKEN_BUCKET_LUA)
+        return self._script
+
+    def _allow_local(self, key: str) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._local.pop(key, (float(self.burst), now))
+            tokens = min(self.burst, tokens + (now - ts) * self.rate)
+            if tokens >= 1:
+                allowed, retry_after = True, 0.0
+                tokens -= 1
+            else:
+                allowed, retry_after = False, (1 - tokens) / self.rate
+            self._local[key] = (tokens, now)
+            while len(self._local) > self.max_local_buckets:
+                self._local.popitem(last=False)
+        return allowed, retry_after
+
+    def allow(self, client_key: str) -> Tuple[bool, float]:
+        """Take one token for the client; returns (allowed, retry_after_seconds)."""
+        key = f"{self.prefix}:{client_key}"
+        try:
+            script = self._redis_script()
+            if script is not None:
+                allowed, retry_ms = script(keys=[key], args=[self.rate, self.burst])
+                return bool(allowed), int(retry_ms) / 1000.0
+        except Exception as e:
+            self.logger.warning(f"Redis rate limiter unavailable, using local buckets: {e}")
+            self._script = None
+        return self._allow_local(key)
+
+class AdmissionController:
+    """
+    Global in-flight caps with priority for cheap requests.
+
+    Every admitted request holds a general slot; cold searches additionally
+    need one of a smaller number of expensive slots. When the pipeline is
+    saturated, cache hits keep being served while new cold searches are shed.
+    """
+    def __init__(self, max_in_flight: int, max_expensive: int):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_expensive = max(1, min(max_expensive, self.max_in_flight))
+        self._in_flight = 0
+        self._expensive = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._in_flight >= self.max_in_flight:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    def try_acquire_expensive(self) -> bool:
+        with self._lock:
+            if self._expensive >= self.max_expensive:
+                return False
+            self._expensive += 1
+            return True
+
+    def release_expensive(self):
+        with self._lock:
+            self._expensive = max(0, self._expensive - 1)
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After takes whole seconds."""
+    return str(max(1, math.ceil(seconds)))
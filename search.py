@@ -1,6 +1,7 @@
 
 import aiohttp
 import asyncio
+import yarl
 import pandas as pd
 from typing import List, Dict, Any, Optional
 import json
@@ -13,9 +14,22 @@ from settings import (
     SEARCH_ID,
     MAX_SEARCH_RESULTS,
     MAX_CONCURRENT_REQUESTS,
-    REQUEST_TIMEOUT
+    REQUEST_TIMEOUT,
+    MAX_PAGE_REDIRECTS,
+    LOCAL_INDEX_ENABLED,
+    LOCAL_INDEX_MIN_RESULTS,
+    LOCAL_INDEX_MIN_COVERAGE,
+    ENRICHMENT_DEFAULT,
+    ENRICHMENT_LAZY_RESULTS
 )
 from rag_model import SimplifiedRAG
+from local_index import get_local_index
+from blocklist import get_blocklist
+from document_analysis import get_document_analyzer, empty_features
+from ml_ranking import get_ranker
+from url_safety import is_fetchable_url, public_connector
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
 
 class OptimizedSearch:
     def __init__(self):
@@ -29,11 +43,20 @@ class OptimizedSearch:
             
         self.base_url = "https://www.googleapis.com/customsearch/v1"
         self.session = None
+        self.local_index = get_local_index() if LOCAL_INDEX_ENABLED else None
+        self.blocklist = get_blocklist()
+        self.analyzer = get_document_analyzer()
+        self.ranker = get_ranker()
+
+    @staticmethod
+    def _new_session() -> aiohttp.ClientSession:
+        # Page URLs come from third parties, so connections to internal addresses are refused
+        return aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+                                     connector=public_connector())
 
     async def _init_session(self):
         if self.session is None:
-            timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
-            self.session = aiohttp.ClientSession(timeout=timeout)
+            self.session = self._new_session()
 
     async def _fetch_search_results(self, query: str, start_index: int = 1) -> Dict:
         """Enhanced search results fetching with detailed error handling"""
@@ -51,7 +74,7 @@ class OptimizedSearch:
                 'fields': 'items(title,link,snippet)',  # Only get needed fields
             }
             
-            self.logger.info(f"Fetching results for query: {query}")
+            self.logger.info(f"Fetching results for query: {query}", extra={'category': 'search.request'})
             
             async with self.session.get(self.base_url, params=params) as response:
                 if response.status == 200:
@@ -77,8 +100,9 @@ class OptimizedSearch:
             self.logger.error(f"Unexpected error during search: {str(e)}")
             return {'items': []}
 
-    async def _process_search_item(self, item: Dict) -> Dict[str, Any]:
-        """Process a single search result with enhanced error handling"""
+    async def _process_search_item(self, item: Dict, query: str, fetch: bool = True,
+                                   session: Optional[aiohttp.ClientSession] = None) -> Dict[str, Any]:
+        """Process a single search result; without ``fetch`` only the API's title and snippet are used"""
         try:
             url = item.get('link', '')
             title = html.unescape(item.get('title', ''))
@@ -90,14 +114,19 @@ class OptimizedSearch:
                 return None
                 
             # Basic content fetch
-            content = await self._fetch_page_content(url)
+            content = await self._fetch_page_content(url, session) if fetch else None
+
+            # Parse the page once; filter, summarizer, ranker and index share the features
+            features = await self.analyzer.analyze(content) if content else empty_features()
             
-            # Generate summary if content exists
+            # Summarize the page text against the user's query if content exists
             rag_summary = None
             if content:
                 rag_summary = await self.rag_model.async_generate_response(
-                    query=title,
-                    context=snippet
+                    query=query,
+                    context=snippet,
+                    sentences=features['sentences'],
+                    url=url
                 )
             
             return {
@@ -105,6 +134,7 @@ class OptimizedSearch:
                 'link': url,
                 'snippet': snippet,
                 'html': content or '',
+                **features,
                 'rag_summary': rag_summary,
                 'ml_rank': 1.0  # Default ranking
             }
@@ -113,44 +143,127 @@ class OptimizedSearch:
             self.logger.error(f"Error processing search result: {str(e)}")
             return None
 
-    async def _fetch_page_content(self, url: str) -> Optional[str]:
-        """Fetch webpage content with timeout and error handling"""
+    async def _fetch_page_content(self, url: str, session: Optional[aiohttp.ClientSession] = None) -> Optional[str]:
+        """
+        Fetch webpage content with timeout and error handling.
+
+        Redirects are followed here rather than by aiohttp so that every hop
+        is checked against the blocklist and for internal addresses.
+        """
         try:
-            await self._init_session()
-            async with self.session.get(
-                url,
-                ssl=False,
-                timeout=aiohttp.ClientTimeout(total=10),
-                allow_redirects=True
-            ) as response:
-                if response.status == 200:
-                    return await response.text()
-                self.logger.warning(f"Failed to fetch content from {url}: Status {response.status}")
-                return None
+            if session is None:
+                await self._init_session()
+                session = self.session
+            for _ in range(MAX_PAGE_REDIRECTS + 1):
+                if not is_fetchable_url(url) or self.blocklist.is_blocked(url):
+                    self.logger.info(f"Skipping {url}: blocked or not a public address")
+                    return None
+                async with session.get(
+                    url,
+                    ssl=False,
+                    timeout=aiohttp.ClientTimeout(total=10),
+                    allow_redirects=False
+                ) as response:
+                    if response.status in REDIRECT_STATUSES and 'Location' in response.headers:
+                        url = str(response.url.join(yarl.URL(response.headers['Location'])))
+                        continue
+                    if response.status == 200:
+                        return await response.text()
+                    self.logger.warning(f"Failed to fetch content from {url}: Status {response.status}")
+                    return None
+            self.logger.warning(f"Too many redirects fetching {url}")
+            return None
         except Exception as e:
             self.logger.warning(f"Error fetching content from {url}: {str(e)}")
             return None
 
-    async def search(self, query: str) -> pd.DataFrame:
-        """Perform search with enhanced error handling and logging"""
+    def _search_local(self, query: str) -> Optional[pd.DataFrame]:
+        """Answer from the local index, or None when its recall is too low."""
+        try:
+            hits = [
+                hit for hit in self.local_index.search(query, limit=MAX_SEARCH_RESULTS)
+                if hit['coverage'] >= LOCAL_INDEX_MIN_COVERAGE and not self.blocklist.is_blocked(hit['link'])
+            ]
+        except Exception as e:
+            self.logger.error(f"Local index search failed: {str(e)}")
+            return None
+
+        if len(hits) < LOCAL_INDEX_MIN_RESULTS:
+            self.logger.info(f"Local index returned {len(hits)} good hit(s), falling back to the search API")
+            return None
+
+        top_score = hits[0]['score']
+        df = pd.DataFrame([{
+            'title': hit['title'],
+            'link': hit['link'],
+            'snippet': hit['snippet'],
+            'html': '',
+            'rag_summary': None,
+            'ml_rank': hit['score'] / top_score
+        } for hit in hits])
+        df['rank'] = range(1, len(df) + 1)
+        self.logger.info(f"Answered query from the local index with {len(df)} results", extra={'category': 'search.request'})
+        return df
+
+    def _fetch_limit(self, enrichment: str, results: int) -> int:
+        """How many of the first results get their page fetched under an enrichment mode."""
+        if enrichment == 'snippet':
+            return 0
+        if enrichment == 'lazy':
+            return min(ENRICHMENT_LAZY_RESULTS, results)
+        return results
+
+    async def enrich(self, item: Dict, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch and summarize one result on demand, e.g. when a user expands it.
+
+        Runs concurrently with searches on other threads, so it uses its own
+        session instead of the shared one that search() closes.
+        """
+        if self.blocklist.is_blocked(item.get('link', '')):
+            return None
+        async with self._new_session() as session:
+            return await self._process_search_item(item, query, session=session)
+
+    async def search(self, query: str, enrichment: str = ENRICHMENT_DEFAULT) -> pd.DataFrame:
+        """
+        Perform search with enhanced error handling and logging.
+
+        ``enrichment`` decides which result pages are downloaded: none
+        (``snippet``), the first ENRICHMENT_LAZY_RESULTS (``lazy``) or all
+        of them (``full``).
+        """
         try:
-            self.logger.info(f"Starting search for query: {query}")
+            self.logger.info(f"Starting search for query: {query} ({enrichment})", extra={'category': 'search.request'})
             
             # Validate query
             if not query.strip():
                 self.logger.warning("Empty query provided")
                 return pd.DataFrame()
             
+            # Documents we have already seen may answer the query without the API
+            if self.local_index is not None:
+                local_results = self._search_local(query)
+                if local_results is not None:
+                    return local_results
+
             # Fetch results
             response = await self._fetch_search_results(query)
             if not response or 'items' not in response:
                 self.logger.warning("No results returned from API")
                 return pd.DataFrame()
             
-            # Process results
+            # Drop blocked URLs before spending bandwidth on their pages
+            items = [item for item in response['items'] if not self.blocklist.is_blocked(item.get('link', ''))]
+            if len(items) < len(response['items']):
+                self.logger.info(f"Blocklist removed {len(response['items']) - len(items)} result(s)")
+
+            # Process results, downloading pages only as far as the enrichment mode asks
+            items = items[:MAX_SEARCH_RESULTS]
+            fetch_limit = self._fetch_limit(enrichment, len(items))
             tasks = []
-            for item in response['items'][:MAX_SEARCH_RESULTS]:
-                tasks.append(self._process_search_item(item))
+            for position, item in enumerate(items):
+                tasks.append(self._process_search_item(item, query, fetch=position < fetch_limit))
             
             # Gather results with concurrency limit
             semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
@@ -165,8 +278,19 @@ class OptimizedSearch:
             
             df = pd.DataFrame(valid_results)
             df['rank'] = range(1, len(df) + 1)
+
+            # Score against the query with corpus-wide statistics, off the event loop
+            loop = asyncio.get_running_loop()
+            df = await loop.run_in_executor(None, self.ranker.predict_ranking, df, query)
+
+            # Index every result in the background for future queries; unfetched ones on title and snippet
+            if self.local_index is not None:
+                self.local_index.submit([
+                    {key: result[key] for key in ('link', 'title', 'snippet', 'text')}
+                    for result in valid_results
+                ])
             
-            self.logger.info(f"Search completed successfully with {len(df)} results")
+            self.logger.info(f"Search completed successfully with {len(df)} results", extra={'category': 'search.request'})
             return df
             
         except Exception as e:
@@ -0,0 +1,359 @@
+import os
+import json
+import time
+import shutil
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.decomposition import TruncatedSVD
+from logging_config import get_module_logger
+from settings import (
+    SEMANTIC_INDEX_PATH,
+    SEMANTIC_INDEX_FEATURES,
+    SEMANTIC_INDEX_RELOAD_INTERVAL,
+    SEMANTIC_INDEX_MODE,
+    SEMANTIC_LSA_DIMENSIONS,
+    SEMANTIC_IVF_MIN_DOCS,
+    SEMANTIC_IVF_LISTS,
+    SEMANTIC_IVF_PROBES,
+    SEMANTIC_TOP_K
+)
+
+BUILD_CHUNK_DOCS = 2048  # Documents embedded and written per step while building
+SCORE_CHUNK_ROWS = 8192  # float16 rows widened to float32 per step while scoring
+KMEANS_SAMPLE_DOCS = 20000
+KMEANS_ITERATIONS = 10
+DOCUMENT_FIELDS = ('link', 'title', 'snippet')
+CSR_PARTS = ('data', 'indices', 'indptr')
+
+def document_text(doc: Dict[str, Any]) -> str:
+    return ' '.join(str(doc.get(key) or '') for key in ('title', 'snippet', 'rag_summary'))
+
+def _vectorizer(max_features: int = SEMANTIC_INDEX_FEATURES, vocabulary=None) -> TfidfVectorizer:
+    return TfidfVectorizer(stop_words='english', max_features=max_features, vocabulary=vocabulary, dtype=np.float32)
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def _dot(vectors: Union[np.ndarray, sp.csr_matrix], queries: np.ndarray) -> np.ndarray:
+    """vectors @ queries; float16 rows are widened a chunk at a time (NumPy has no float16 BLAS)."""
+    if sp.issparse(vectors) or vectors.dtype == np.float32:
+        return np.asarray(vectors @ queries)
+    return np.concatenate([
+        vectors[start:start + SCORE_CHUNK_ROWS].astype(np.float32) @ queries
+        for start in range(0, len(vectors), SCORE_CHUNK_ROWS)
+    ]) if len(vectors) else np.zeros((0,) + queries.shape[1:], dtype=np.float32)
+
+class DocumentTable:
+    """
+    Read-only documents stored as concatenated JSON rows in ``documents.bin``,
+    located by the byte offsets in ``documents.idx.npy``. Both files are
+    memory-mapped, so a row is decoded only when a search returns it.
+    """
+    def __init__(self, directory: str):
+        self.offsets = np.load(os.path.join(directory, 'documents.idx.npy'), mmap_mode='r')
+        self.data = np.memmap(os.path.join(directory, 'documents.bin'), dtype=np.uint8, mode='r')
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        row = self.data[self.offsets[i]:self.offsets[i + 1]].tobytes()
+        return dict(zip(DOCUMENT_FIELDS, json.loads(row)))
+
+    @staticmethod
+    def write(directory: str, rows: List[List[str]]):
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        with open(os.path.join(directory, 'documents.bin'), 'wb') as f:
+            for i, row in enumerate(rows):
+                offsets[i + 1] = offsets[i] + f.write(json.dumps(row).encode('utf-8'))
+        np.save(os.path.join(directory, 'documents.idx.npy'), offsets)
+
+def _top_hits(documents: Sequence[Dict[str, Any]], ids: np.ndarray, scores: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
+    if not scores.size:
+        return []
+    k = min(top_k, scores.size)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return [{**documents[ids[i]], 'score': float(scores[i])} for i in top if scores[i] > 0]
+
+def train_centroids(vectors: np.ndarray, n_lists: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means (cosine) centroids of unit vectors."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = ~sums.any(axis=1)
+        # Re-seed empty lists with random documents
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids.astype(np.float32)
+
+class SemanticIndex:
+    """
+    Server-side vector index over the stored documents.
+
+    ``build`` writes a generation directory holding one unit vector per
+    document, the documents as a ``DocumentTable``, the IDF weights in
+    ``idf.npy`` and the TF-IDF vocabulary in ``meta.json``. The ``CURRENT``
+    pointer is then swapped atomically. There are two modes:
+
+    - ``tfidf`` stores the float32 TF-IDF vectors themselves as a sparse CSR
+      matrix (``vectors.data.npy``, ``vectors.indices.npy`` and
+      ``vectors.indptr.npy``), so only the non-zero terms take space;
+    - ``lsa`` reduces them with TruncatedSVD to ``SEMANTIC_LSA_DIMENSIONS``
+      dense float16 vectors in ``vectors.npy``, keeping the projection in
+      ``components.npy``.
+
+    Indexes with at least ``SEMANTIC_IVF_MIN_DOCS`` documents also get an
+    IVF layer: spherical k-means centroids in ``centroids.npy``, with the
+    documents stored contiguously per list (``offsets.npy``). A query then
+    scans only the ``probes`` lists closest to it. More probes give higher
+    recall at higher latency, and probing every list is exact search.
+
+    Workers memory-map the vectors, the document table and the IDF weights,
+    so the page cache holds a single copy for all of them; only the
+    vocabulary, at most ``SEMANTIC_INDEX_FEATURES`` terms, is parsed per
+    worker. Each worker checks ``CURRENT`` at most every
+    ``reload_interval`` seconds and picks up a newly built generation.
+    """
+    def __init__(self, path: str = SEMANTIC_INDEX_PATH, reload_interval: float = SEMANTIC_INDEX_RELOAD_INTERVAL):
+        self.logger = get_module_logger('semantic_index')
+        self.path = path
+        self.reload_interval = reload_interval
+
+        # Everything loaded from one generation, swapped in one assignment
+        self._state: Optional[Dict[str, Any]] = None
+        self._checked = 0.0
+        self._reload_lock = threading.Lock()
+        self._maybe_reload(force=True)
+
+    def __len__(self) -> int:
+        return len(self._state['documents']) if self._state else 0
+
+    @property
+    def ready(self) -> bool:
+        self._maybe_reload()
+        return self._state is not None
+
+    @property
+    def n_lists(self) -> int:
+        """IVF lists in the loaded index; 0 when it is searched exhaustively."""
+        state = self._state
+        return 0 if state is None or state['centroids'] is None else len(state['centroids'])
+
+    def _current_generation(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path, 'CURRENT')) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _maybe_reload(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked < self.reload_interval:
+            return
+        if not self._reload_lock.acquire(blocking=force):
+            return  # another thread is already checking
+        try:
+            self._checked = now
+            generation = self._current_generation()
+            if generation is None or (self._state and self._state['generation'] == generation):
+                return
+            directory = os.path.join(self.path, generation)
+            with open(os.path.join(directory, 'meta.json')) as f:
+                meta = json.load(f)
+
+            def optional(name, mmap_mode=None):
+                path = os.path.join(directory, name)
+                return np.load(path, mmap_mode=mmap_mode) if os.path.exists(path) else None
+
+            # Generations written before the document table kept documents, IDF and dense vectors inline
+            vectors = optional('vectors.npy', mmap_mode='r')
+            if vectors is None:
+                vectors = sp.csr_matrix(
+                    tuple(np.load(os.path.join(directory, f'vectors.{part}.npy'), mmap_mode='r') for part in CSR_PARTS),
+                    shape=(meta['size'], len(meta['vocabulary']))
+                )
+            if 'documents' in meta:
+                documents = [dict(zip(DOCUMENT_FIELDS, doc)) for doc in meta['documents']]
+            else:
+                documents = DocumentTable(directory)
+            idf = optional('idf.npy', mmap_mode='r')
+            vectorizer = _vectorizer(vocabulary=meta['vocabulary'])
+            vectorizer.idf_ = np.asarray(meta['idf'] if idf is None else idf, dtype=np.float32)
+            self._state = {
+                'generation': generation,
+                'mode': meta.get('mode', 'tfidf'),
+                'vectors': vectors,
+                'documents': documents,
+                'vectorizer': vectorizer,
+                'components': optional('components.npy'),
+                'centroids': optional('centroids.npy'),
+                'offsets': optional('offsets.npy')
+            }
+            self.logger.info(f"Loaded {self._state['mode']} semantic index {generation} "
+                             f"with {len(self)} documents and {self.n_lists} IVF lists")
+        except Exception as e:
+            self.logger.error(f"Semantic index loading error: {e}")
+        finally:
+            self._reload_lock.release()
+
+    @staticmethod
+    def _embedder(vectorizer: TfidfVectorizer, components: Optional[np.ndarray]) -> Callable[[List[str]], np.ndarray]:
+        """Texts -> float32 unit vectors in the index's space."""
+        def embed(texts: List[str]) -> np.ndarray:
+            tfidf = vectorizer.transform(texts).astype(np.float32)
+            if components is None:
+                return tfidf.toarray()
+            return _normalize(np.asarray(tfidf @ components.T, dtype=np.float32))
+        return embed
+
+    def transform(self, texts: List[str]) -> np.ndarray:
+        """Dense L2-normalized vectors in the index's space."""
+        if not self.ready:
+            raise RuntimeError("Semantic index is not built")
+        state = self._state
+        return self._embedder(state['vectorizer'], state['components'])(texts)
+
+    def search(self, query: str, top_k: int = SEMANTIC_TOP_K, probes: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Top ``top_k`` documents by cosine similarity to the query, best first.
+
+        ``probes`` IVF lists are scanned (default SEMANTIC_IVF_PROBES); an
+        index without IVF lists is always searched exhaustively.
+        """
+        return self.search_many([query], top_k, probes)[0]
+
+    def search_many(self, queries: List[str], top_k: int = SEMANTIC_TOP_K,
+                    probes: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """``search`` for several queries, embedded together; exhaustive search is one matrix product."""
+        if not queries or not self.ready:
+            return [[] for _ in queries]
+        state = self._state
+        documents, vectors, centroids, offsets = state['documents'], state['vectors'], state['centroids'], state['offsets']
+        embedded = self._embedder(state['vectorizer'], state['components'])(queries)
+        if not documents:
+            return [[] for _ in queries]
+
+        probes = max(SEMANTIC_IVF_PROBES if probes is None else probes, 1)
+        if centroids is None or probes >= len(centroids):
+            ids = np.arange(vectors.shape[0])
+            scores = _dot(vectors, embedded.T)
+            return [_top_hits(documents, ids, scores[:, j], top_k) for j in range(len(queries))]
+
+        hits = []
+        for query_vector, centroid_scores in zip(embedded, embedded @ centroids.T):
+            lists = np.argpartition(-centroid_scores, probes - 1)[:probes]
+            ids = np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in lists])
+            scores = np.concatenate([_dot(vectors[offsets[i]:offsets[i + 1]], query_vector) for i in lists])
+            hits.append(_top_hits(documents, ids, scores, top_k))
+        return hits
+
+    @staticmethod
+    def build(documents: Iterable[Dict[str, Any]], path: str = SEMANTIC_INDEX_PATH,
+              max_features: int = SEMANTIC_INDEX_FEATURES, mode: str = SEMANTIC_INDEX_MODE,
+              dimensions: int = SEMANTIC_LSA_DIMENSIONS, ivf_min_docs: int = SEMANTIC_IVF_MIN_DOCS,
+              n_lists: int = SEMANTIC_IVF_LISTS) -> int:
+        """Write a new generation from documents with link, title, snippet and rag_summary; returns its size."""
+        kept, texts = [], []
+        for doc in documents:
+            text = document_text(doc)
+            if doc.get('link') and text.strip():
+                kept.append([doc['link'], doc.get('title') or '', doc.get('snippet') or ''])
+                texts.append(text)
+        if not texts:
+            return 0
+
+        vectorizer = _vectorizer(max_features)
+        tfidf = vectorizer.fit_transform(texts)
+
+        components = None
+        dimensions = min(dimensions, tfidf.shape[0] - 1, tfidf.shape[1] - 1)
+        if mode == 'lsa' and dimensions >= 2:
+            components = TruncatedSVD(dimensions, random_state=0).fit(tfidf).components_.astype(np.float32)
+        embed = SemanticIndex._embedder(vectorizer, components)
+
+        # IVF: cluster a sample, then store each list's documents contiguously
+        order, centroids, offsets = np.arange(len(texts)), None, None
+        if len(texts) >= ivf_min_docs:
+            lists = n_lists or int(np.sqrt(len(texts)))
+            sample = np.random.default_rng(0).choice(len(texts), min(len(texts), KMEANS_SAMPLE_DOCS), replace=False)
+            centroids = train_centroids(embed([texts[i] for i in sample]), lists)
+            assignments = np.concatenate([
+                np.argmax(embed(texts[start:start + BUILD_CHUNK_DOCS]) @ centroids.T, axis=1)
+                for start in range(0, len(texts), BUILD_CHUNK_DOCS)
+            ])
+            order = np.argsort(assignments, kind='stable')
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=lists))])
+
+        generation = f"gen-{time.time_ns()}"
+        target = os.path.join(path, generation)
+        os.makedirs(target, exist_ok=True)
+        if components is None:
+            # TF-IDF rows are already unit length; keep them sparse, in list order
+            rows = tfidf[order]
+            for part in CSR_PARTS:
+                np.save(os.path.join(target, f'vectors.{part}.npy'), getattr(rows, part))
+        else:
+            vectors = np.lib.format.open_memmap(
+                os.path.join(target, 'vectors.npy'), mode='w+', dtype=np.float16, shape=(len(texts), components.shape[0])
+            )
+            for start in range(0, len(texts), BUILD_CHUNK_DOCS):
+                chunk = order[start:start + BUILD_CHUNK_DOCS]
+                vectors[start:start + len(chunk)] = embed([texts[i] for i in chunk]).astype(np.float16)
+            vectors.flush()
+            del vectors
+
+        for name, array in (('components.npy', components), ('centroids.npy', centroids), ('offsets.npy', offsets),
+                            ('idf.npy', vectorizer.idf_.astype(np.float32))):
+            if array is not None:
+                np.save(os.path.join(target, name), array)
+        DocumentTable.write(target, [kept[i] for i in order])
+        with open(os.path.join(target, 'meta.json'), 'w') as f:
+            json.dump({
+                'mode': 'lsa' if components is not None else 'tfidf',
+                'size': len(texts),
+                'vocabulary': {term: int(i) for term, i in vectorizer.vocabulary_.items()}
+            }, f)
+
+        pointer = os.path.join(path, 'CURRENT.tmp')
+        with open(pointer, 'w') as f:
+            f.write(generation)
+        os.replace(pointer, os.path.join(path, 'CURRENT'))
+
+        # Workers still mapping an old generation keep reading it until they reload
+        for name in os.listdir(path):
+            if name.startswith('gen-') and name != generation:
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+        return len(texts)
+
+_semantic_index: Optional[SemanticIndex] = None
+_semantic_index_lock = threading.Lock()
+
+def get_semantic_index() -> SemanticIndex:
+    """Process-wide semantic index, mapped on first use."""
+    global _semantic_index
+    with _semantic_index_lock:
+        if _semantic_index is None:
+            _semantic_index = SemanticIndex()
+        return _semantic_index
+
+if __name__ == '__main__':
+    import sys
+    import asyncio
+    from storage import create_storage
+
+    if sys.argv[1:] != ['build']:
+        sys.exit("usage: python semantic_index.py build")
+    db = create_storage()
+    try:
+        documents = [doc for batch in db.iter_documents() for doc in batch]
+    finally:
+        asyncio.run(db.close())
+    print(f"Indexed {SemanticIndex.build(documents)} document(s) into {SEMANTIC_INDEX_PATH} ({SEMANTIC_INDEX_MODE})")
@@ -1,9 +1,12 @@
 import numpy as np
+from sklearn.base import clone
 from sklearn.feature_extraction.text import TfidfVectorizer
 import asyncio
 import concurrent.futures
-from typing import List, Union
+from typing import Any, Dict, List, Optional, Union
 from logging_config import get_module_logger
+from semantic_index import get_semantic_index
+from settings import SEMANTIC_TOP_K, SEMANTIC_SEARCH_WORKERS
 
 class SemanticSearch:
     """Lightweight semantic search using TF-IDF instead of transformers"""
@@ -18,32 +21,58 @@ class SemanticSearch:
                 dtype=np.float32
             )
             
-            self.tfidf_matrix = None
-            self.document_index = None
+            self.index = get_semantic_index()
+            # Shared by every request; closed with the app
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=SEMANTIC_SEARCH_WORKERS, thread_name_prefix='semantic-search'
+            )
             self.logger.info("Lightweight SemanticSearch initialized")
         except Exception as e:
             self.logger.error(f"Error initializing SemanticSearch: {e}")
             raise
 
-    def precompute_index(self, documents: List[str]):
+    @property
+    def index_ready(self) -> bool:
+        return self.index.ready
+
+    def search_index(self, query: str, top_k: int = SEMANTIC_TOP_K, probes: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Top stored documents for the query from the server-side index"""
         try:
-            self.tfidf_matrix = self.tfidf_vectorizer.fit_transform(documents)
-            self.document_index = documents
+            return self.index.search(query, top_k, probes)
         except Exception as e:
-            self.logger.error(f"Error precomputing index: {e}")
-            raise
+            self.logger.error(f"Error searching index: {e}")
+            return []
+
+    async def async_search_index(self, query: str, top_k: int = SEMANTIC_TOP_K,
+                                 probes: Optional[int] = None) -> List[Dict[str, Any]]:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, self.search_index, query, top_k, probes)
+
+    def search_index_many(self, queries: List[str], top_k: int = SEMANTIC_TOP_K,
+                          probes: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """Top stored documents for each query, searched together"""
+        try:
+            return self.index.search_many(queries, top_k, probes)
+        except Exception as e:
+            self.logger.error(f"Error searching index: {e}")
+            return [[] for _ in queries]
+
+    async def async_search_index_many(self, queries: List[str], top_k: int = SEMANTIC_TOP_K,
+                                      probes: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, self.search_index_many, queries, top_k, probes)
 
     def compute_similarity(self, query: str, documents: List[str]) -> np.ndarray:
         """Compute TF-IDF based similarity scores"""
         try:
-            if not self.tfidf_vectorizer.vocabulary_:
-                self.tfidf_vectorizer.fit(documents)
-            
-            query_vector = self.tfidf_vectorizer.transform([query])
-            doc_vectors = self.tfidf_vectorizer.transform(documents)
-            
-            # Compute cosine similarity
-            similarity = (query_vector @ doc_vectors.T).toarray()[0]
+            # Uploaded documents are compared in the index's space (corpus-wide IDF) when
+            # there is one, otherwise against a vectorizer fitted to this request alone
+            if self.index.ready:
+                vectors = self.index.transform([query] + documents)
+                return vectors[1:] @ vectors[0]
+
+            vectors = clone(self.tfidf_vectorizer).fit_transform([query] + documents)
+            similarity = (vectors[1:] @ vectors[0].T).toarray().ravel()
             return similarity
         except Exception as e:
             self.logger.error(f"Error computing similarity: {e}")
@@ -60,14 +89,43 @@ class SemanticSearch:
     async def async_semantic_search(self, query: str, documents: List[str], top_k: int = 5) -> np.ndarray:
         try:
             loop = asyncio.get_event_loop()
-            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
-                return await loop.run_in_executor(
-                    pool,
-                    self.batch_semantic_search,
-                    query,
-                    documents,
-                    top_k
-                )
+            return await loop.run_in_executor(self._executor, self.batch_semantic_search, query, documents, top_k)
         except Exception as e:
             self.logger.error(f"Error in async search: {e}")
-            return np.zeros(len(documents))
\ No newline at end of file
+            return np.zeros(len(documents))
+
+    def similarity_matrix(self, queries: List[str], documents: List[str]) -> np.ndarray:
+        """(queries x documents) cosine similarities from one matrix product"""
+        if self.index.ready:
+            return self.index.transform(queries) @ self.index.transform(documents).T
+        vectors = clone(self.tfidf_vectorizer).fit_transform(queries + documents)
+        return (vectors[:len(queries)] @ vectors[len(queries):].T).toarray()
+
+    def multi_semantic_search(self, queries: List[str], documents: List[str],
+                              top_k: int = SEMANTIC_TOP_K) -> List[List[Dict[str, Any]]]:
+        """Top ``top_k`` documents for each query as ``{"index", "score"}``, best first"""
+        try:
+            if not queries or not documents:
+                return [[] for _ in queries]
+            similarities = self.similarity_matrix(queries, documents)
+            k = min(top_k, len(documents))
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(similarities, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top, top_scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+            return [
+                [{"index": int(i), "score": float(score)} for i, score in zip(row, scores) if score > 0]
+                for row, scores in zip(top, top_scores)
+            ]
+        except Exception as e:
+            self.logger.error(f"Error in multi-query search: {e}")
+            return [[] for _ in queries]
+
+    async def async_multi_semantic_search(self, queries: List[str], documents: List[str],
+                                          top_k: int = SEMANTIC_TOP_K) -> List[List[Dict[str, Any]]]:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, self.multi_semantic_search, queries, documents, top_k)
+
+    def close(self):
+        """Stop the worker threads."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -27,6 +27,7 @@ REDIS_TIMEOUT = 2
 MAX_SEARCH_RESULTS = 10
 MAX_CONCURRENT_REQUESTS = 5
 REQUEST_TIMEOUT = 5
+MAX_PAGE_REDIRECTS = 5  # Redirects followed per page fetch, each hop checked again
 CACHE_EXPIRY = 1800  # 30 minutes
 MAX_CACHE_ENTRIES = 100
 MAX_CACHE_SIZE = 50000  # ~50KB per entry
@@ -39,9 +40,9 @@ THREADS = 2
 # Add to settings.py
 
 # Relevance Settings
-RELEVANCE_BOOST_FACTOR = 2.0  # Multiplier for relevant results
-CLICK_COUNT_WEIGHT = 0.5  # Weight for click count in ranking
-ML_RANK_WEIGHT = 0.3  # Weight for ML ranking in final score
+RELEVANCE_BOOST_FACTOR = 2.0  # Rank score added for results marked relevant
+CLICK_COUNT_WEIGHT = 0.5  # Rank score added per share of the query's top click count
+ML_RANK_WEIGHT = 0.3  # Weight for ML ranking in the default model, used until one is trained
 
 # Time-based Settings
 TIME_DECAY_FACTOR = 0.85  # Factor for time decay in ranking
@@ -49,4 +50,124 @@ MAX_RESULT_AGE_DAYS = 365  # Maximum age of results to consider
 REFRESH_THRESHOLD_HOURS = 24  # Threshold to refresh cached results
 
 # Cache Settings
-CACHE_TIME_FILTERS = ['day', 'month', 'year']  # Available time filters
\ No newline at end of file
+CACHE_TIME_FILTERS = ['day', 'month', 'year']  # Available time filters
+
+# Rendered result fragment cache (per worker)
+FRAGMENT_CACHE_ENABLED = os.getenv('FRAGMENT_CACHE_ENABLED', 'true').lower() == 'true'
+FRAGMENT_CACHE_MAX_PAGES = 256  # Rendered result lists kept per worker
+FRAGMENT_CACHE_MAX_RESULTS = 2048  # Rendered result cards kept per worker
+
+# Logging Settings
+LOG_JSON = os.getenv('LOG_JSON', 'true').lower() == 'true'  # Structured JSON log lines
+LOG_QUEUE_SIZE = 10000  # Records buffered for the background writer before dropping
+LOG_MAX_MESSAGE_CHARS = 2000  # Longer log messages are truncated
+LOG_SAMPLE_RATES = {  # Fraction of INFO/DEBUG records kept per category
+    'search.payload': 0.01,  # Raw and formatted result dumps (DEBUG)
+    'search.request': 0.1,  # Per-search progress lines: started, fetched, completed
+    'search.cache': 0.05,  # Result cache hits
+}
+
+# Startup Settings
+WARM_UP_ON_START = os.getenv('WARM_UP_ON_START', 'true').lower() == 'true'  # Create components in the background at boot
+SHUTDOWN_DRAIN_TIMEOUT = 25  # Seconds to wait for in-flight requests on SIGTERM (gunicorn --timeout is 30)
+
+# Admission Control Settings
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_PER_MINUTE = int(os.getenv('RATE_LIMIT_PER_MINUTE', 30))  # Sustained requests per client
+RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', 10))  # Requests a client may send at once
+RATE_LIMITED_ENDPOINTS = ['search_results', 'perform_semantic_search', 'perform_batch_semantic_search', 'enrich_result']
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 1))  # Proxies appending to X-Forwarded-For; 0 uses the socket address
+# A gthread worker runs at most --threads requests at once (render.yaml: --threads 2), so caps above that never
+# trigger. Cold searches get one slot fewer than the thread count: when they pile up the extra ones are shed and
+# a thread stays free for cache hits.
+WORKER_THREADS = int(os.getenv('WORKER_THREADS', 2))  # Must match gunicorn --threads
+MAX_IN_FLIGHT_REQUESTS = int(os.getenv('MAX_IN_FLIGHT_REQUESTS', WORKER_THREADS))  # Per worker, all limited endpoints
+MAX_IN_FLIGHT_COLD_SEARCHES = int(os.getenv('MAX_IN_FLIGHT_COLD_SEARCHES', max(1, WORKER_THREADS - 1)))  # Per worker, uncached searches
+
+# Click Write-behind Settings
+CLICK_BUFFER_ENABLED = os.getenv('CLICK_BUFFER_ENABLED', 'true').lower() == 'true'
+CLICK_BUFFER_MAX_PENDING = 200  # Distinct (query, link) pairs that trigger a flush
+CLICK_BUFFER_FLUSH_INTERVAL = 5.0  # Seconds between background flushes
+CLICK_BUFFER_SPILL_PATH = os.getenv('CLICK_BUFFER_SPILL_PATH', 'data/click_buffer.jsonl')  # Unflushed clicks at shutdown
+MAX_CLICK_BATCH_EVENTS = 500  # Events accepted per /mark-relevant/batch request
+
+# Storage Backend Settings
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'supabase')  # 'supabase', 'postgres' or 'sqlite'
+DATABASE_URL = os.getenv('DATABASE_URL')  # Direct Postgres DSN for the 'postgres' backend
+PG_POOL_MIN_SIZE = 1
+PG_POOL_MAX_SIZE = 5
+PG_STATEMENT_CACHE_SIZE = int(os.getenv('PG_STATEMENT_CACHE_SIZE', 100))  # Set to 0 behind pgbouncer in transaction mode
+PG_COMMAND_TIMEOUT = 5  # Seconds
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'data/horizon.db')  # Database file for the 'sqlite' backend
+DB_RESULT_LIMIT = 20  # Stored results fetched per query (top-N by relevance, clicks, rank)
+MIGRATION_BATCH_SIZE = 1000  # Legacy results rows copied per round trip by `python storage.py migrate`
+
+# Result Persistence Settings
+RESULT_PERSIST_ENABLED = os.getenv('RESULT_PERSIST_ENABLED', 'true').lower() == 'true'  # Store every fetched result set
+RESULT_PERSIST_QUEUE_SIZE = 100  # Result sets waiting for the background writer before new ones are dropped
+STORED_RESULTS_MIN_ROWS = MAX_SEARCH_RESULTS  # Stored results within the time filter that answer a search without Google
+
+# Local Index Settings
+LOCAL_INDEX_ENABLED = os.getenv('LOCAL_INDEX_ENABLED', 'true').lower() == 'true'  # Answer from seen documents before Google
+LOCAL_INDEX_PATH = os.getenv('LOCAL_INDEX_PATH', 'data/local_index')  # Seed from stored documents: `python local_index.py backfill`
+LOCAL_INDEX_MERGE_DOCS = 200  # New or replaced documents held in memory before a merge to disk
+LOCAL_INDEX_MAX_TEXT_CHARS = 50000  # Page text indexed per document
+LOCAL_INDEX_MIN_RESULTS = 5  # Local hits needed to skip the Google API
+LOCAL_INDEX_MIN_COVERAGE = 0.75  # Fraction of query terms a local hit must contain to count
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Blocklist Settings
+BLOCKLIST_PATH = os.getenv('BLOCKLIST_PATH', 'blacklist.txt')  # Domains and URL prefixes never fetched or shown
+BLOCKLIST_RELOAD_INTERVAL = 30  # Seconds between checks for an edited blocklist file
+
+# Document Analysis Settings
+DOCUMENT_ANALYSIS_WORKERS = int(os.getenv('DOCUMENT_ANALYSIS_WORKERS', 2))  # Parser processes; 0 parses on threads
+DOCUMENT_MAX_HTML_CHARS = 2_000_000  # Longer pages are truncated before parsing
+DOCUMENT_MAX_TEXT_CHARS = 100_000  # Clean text kept per page
+DOCUMENT_MAX_SENTENCES = 200  # Sentences kept per page for summarization
+
+# Query Normalization Settings
+QUERY_KEY_IGNORE_STOPWORDS = os.getenv('QUERY_KEY_IGNORE_STOPWORDS', 'false').lower() == 'true'  # "the matrix" and "matrix" share a key
+
+# Enrichment Settings
+ENRICHMENT_MODES = ('snippet', 'lazy', 'full')  # Page fetches: none, the first few results, or every result
+ENRICHMENT_DEFAULT = os.getenv('ENRICHMENT_DEFAULT', 'full')  # Used when a request does not set ?enrichment=
+ENRICHMENT_LAZY_RESULTS = 3  # Results fetched up front in lazy mode; the rest on expansion
+
+# Summarization Settings
+RAG_SUMMARY_SENTENCES = 2  # Query-relevant sentences per summary
+RAG_SUMMARY_MAX_CHARS = 400
+RAG_SUMMARY_CACHE_SIZE = int(os.getenv('RAG_SUMMARY_CACHE_SIZE', 2048))  # Summaries kept per worker
+
+# Deduplication Settings
+DEDUP_SIMHASH_MAX_DISTANCE = 3  # Differing fingerprint bits still treated as the same page
+DEDUP_MIN_WORDS = 50  # Pages with less text get no content fingerprint
+
+# Ranking Settings
+RANKER_STATS_PATH = os.getenv('RANKER_STATS_PATH', 'data/ranker_stats.npz')  # Corpus document frequencies
+RANKER_HASH_BITS = 20  # Terms are hashed into 2**bits buckets; changing it discards saved statistics
+RANKER_SAVE_EVERY_DOCS = 100  # Newly counted documents between saves
+
+# Learning-to-rank Settings
+LTR_MODEL_DIR = os.getenv('LTR_MODEL_DIR', 'data/ltr')  # Versioned model artifacts and the CURRENT pointer
+LTR_MAX_TRAINING_ROWS = 100_000  # Most recent stored results read by `python ltr.py train`
+LTR_TRAINING_EPOCHS = 500
+LTR_L2 = 1e-3
+LTR_VALIDATION_FRACTION = 0.2  # Share of queries held out to report validation AUC
+
+# Semantic Index Settings
+SEMANTIC_INDEX_PATH = os.getenv('SEMANTIC_INDEX_PATH', 'data/semantic_index')  # Built by `python semantic_index.py build`
+SEMANTIC_INDEX_FEATURES = 1000  # Vocabulary size, i.e. vector dimensions
+SEMANTIC_INDEX_RELOAD_INTERVAL = 30  # Seconds between checks for a newly built index
+SEMANTIC_INDEX_MODE = os.getenv('SEMANTIC_INDEX_MODE', 'tfidf')  # 'tfidf' (sparse float32 TF-IDF rows, CSR) or 'lsa' (dense float16 SVD embeddings)
+SEMANTIC_LSA_DIMENSIONS = 128  # LSA embedding size, stored as float16
+SEMANTIC_IVF_MIN_DOCS = 5000  # Smaller indexes are always searched exhaustively
+SEMANTIC_IVF_LISTS = 0  # IVF clusters; 0 uses sqrt(documents)
+SEMANTIC_IVF_PROBES = 8  # Clusters scanned per query: more is slower with higher recall
+SEMANTIC_TOP_K = 10  # Index results returned when a request does not set top_k
+SEMANTIC_MAX_TOP_K = 100
+SEMANTIC_SEARCH_WORKERS = 2  # Threads shared by all semantic search requests
+SEMANTIC_MAX_BATCH_QUERIES = 100  # Queries per /semantic-search/batch request
+SEMANTIC_MAX_DOCUMENTS = 1000  # Uploaded documents per semantic search request
+SEMANTIC_MAX_DOCUMENT_CHARS = 1000000  # Total uploaded document text per semantic search request
@@ -0,0 +1,321 @@
+# sqlite_storage.py
+
+import os
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple, Iterator
+import pandas as pd
+from settings import SQLITE_PATH, DB_RESULT_LIMIT, MIGRATION_BATCH_SIZE, LTR_MAX_TRAINING_ROWS
+from storage import RESULT_COLUMNS, DOCUMENT_COLUMNS, TRAINING_COLUMNS, PERSISTED_RESULT_FIELDS, time_filter_cutoff
+from logging_config import get_module_logger
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    query TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    link TEXT NOT NULL,
+    title TEXT NOT NULL,
+    snippet TEXT,
+    created TEXT NOT NULL,
+    relevance INTEGER DEFAULT 0,
+    ml_rank REAL DEFAULT 0.0,
+    rag_summary TEXT,
+    click_count INTEGER DEFAULT 0,
+    last_clicked TEXT,
+    simhash TEXT,  -- content fingerprint, see dedup.simhash
+    UNIQUE(query, link)  -- doubles as the (query, link) index
+);
+CREATE INDEX IF NOT EXISTS idx_results_query_created ON results (query, created);
+CREATE INDEX IF NOT EXISTS idx_results_query_order
+    ON results (query, relevance DESC, click_count DESC, rank, link);
+"""
+
+MARK_RELEVANT_SQL = """
+INSERT INTO results (query, link, title, snippet, ml_rank, rag_summary, rank,
+                     relevance, click_count, last_clicked, created)
+VALUES (:query, :link, COALESCE(:title, ''), COALESCE(:snippet, ''), COALESCE(:ml_rank, 0.0),
+        COALESCE(:rag_summary, ''), COALESCE(:rank, 1), 1, :clicks, :now, :now)
+ON CONFLICT (query, link) DO UPDATE SET
+    relevance = 1,
+    click_count = click_count + excluded.click_count,
+    last_clicked = excluded.last_clicked,
+    title = COALESCE(NULLIF(excluded.title, ''), results.title),
+    snippet = COALESCE(NULLIF(excluded.snippet, ''), results.snippet),
+    ml_rank = excluded.ml_rank,
+    rag_summary = COALESCE(NULLIF(excluded.rag_summary, ''), results.rag_summary)
+"""
+
+UPSERT_RESULT_SQL = """
+INSERT INTO results (query, rank, link, title, snippet, created, relevance, ml_rank,
+                     rag_summary, click_count, last_clicked)
+VALUES (:query, :rank, :link, :title, :snippet, :now, :relevance, :ml_rank,
+        :rag_summary, :click_count, :last_clicked)
+ON CONFLICT (query, link) DO UPDATE SET
+    rank = excluded.rank,
+    title = COALESCE(NULLIF(excluded.title, ''), results.title),
+    snippet = COALESCE(NULLIF(excluded.snippet, ''), results.snippet),
+    relevance = excluded.relevance,
+    ml_rank = excluded.ml_rank,
+    rag_summary = COALESCE(NULLIF(excluded.rag_summary, ''), results.rag_summary),
+    click_count = excluded.click_count,
+    last_clicked = excluded.last_clicked
+"""
+
+UPSERT_RESULTS_BULK_SQL = """
+INSERT INTO results (query, link, title, snippet, ml_rank, rag_summary, rank, simhash, created)
+VALUES (:query, :link, COALESCE(:title, ''), COALESCE(:snippet, ''), COALESCE(:ml_rank, 0.0),
+        COALESCE(:rag_summary, ''), COALESCE(:rank, 1), :simhash, :now)
+ON CONFLICT (query, link) DO UPDATE SET
+    rank = excluded.rank,
+    title = COALESCE(NULLIF(excluded.title, ''), results.title),
+    snippet = COALESCE(NULLIF(excluded.snippet, ''), results.snippet),
+    ml_rank = excluded.ml_rank,
+    rag_summary = COALESCE(NULLIF(excluded.rag_summary, ''), results.rag_summary),
+    simhash = COALESCE(excluded.simhash, simhash)
+"""
+
+QUERY_RESULTS_SQL = f"""
+SELECT {", ".join(RESULT_COLUMNS)} FROM results
+WHERE query = :query AND (:cutoff IS NULL OR created >= :cutoff)
+  AND (:relevance IS NULL
+       OR relevance < :relevance
+       OR (relevance = :relevance AND (click_count < :clicks
+           OR (click_count = :clicks AND (rank > :rank
+               OR (rank = :rank AND link > :link))))))
+ORDER BY relevance DESC, click_count DESC, rank, link
+LIMIT :limit
+"""
+
+# The flat table repeats a page per query; keep one row per link
+DOCUMENTS_BATCH_SQL = """
+SELECT link, MAX(title) AS title, MAX(snippet) AS snippet, MAX(rag_summary) AS rag_summary
+FROM results
+WHERE link > ?
+GROUP BY link
+ORDER BY link
+LIMIT ?
+"""
+
+TRAINING_RESULTS_SQL = f"""
+SELECT {", ".join(TRAINING_COLUMNS)} FROM results
+WHERE query IN (SELECT query FROM results WHERE click_count > 0 OR relevance)
+ORDER BY created DESC
+LIMIT ?
+"""
+
+SELECT_ONE_SQL = "SELECT * FROM results WHERE query = ? AND link = ?"
+
+class SQLiteStorage:
+    """
+    Embedded storage with the same interface as OptimizedDBStorage.
+
+    The database runs in WAL mode and the single connection is only ever used
+    from one dedicated thread, so reads never contend with the event loop and
+    writes are serialized without extra locking.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.logger = get_module_logger("storage")
+        self.path = path or SQLITE_PATH
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-storage')
+        self._conn: Optional[sqlite3.Connection] = None
+        self._run(self._connect)
+        self.logger.info(f"Opened SQLite storage at {self.path}")
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(results)")}
+        if 'simhash' not in columns:  # databases created before fingerprints
+            self._conn.execute("ALTER TABLE results ADD COLUMN simhash TEXT")
+
+    def _run(self, fn, *args):
+        """Run fn on the storage thread and wait for it."""
+        return self._executor.submit(fn, *args).result()
+
+    async def _call(self, fn, *args):
+        """Run fn on the storage thread without blocking the event loop."""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.utcnow().isoformat()
+
+    @staticmethod
+    def _to_dict(row: Optional[sqlite3.Row]) -> Optional[Dict]:
+        if row is None:
+            return None
+        data = dict(row)
+        data['relevance'] = bool(data.get('relevance'))
+        return data
+
+    def health_check(self) -> bool:
+        """Cheap round trip used by the readiness probe."""
+        try:
+            return self._run(lambda: self._conn.execute("SELECT 1").fetchone()[0]) == 1
+        except Exception as e:
+            self.logger.error(f"Health check error: {e}")
+            return False
+
+    def _mark_relevant(self, events: List[Dict[str, Any]]) -> List[Dict]:
+        now = self._now()
+        fields = ("query", "link", "title", "snippet", "ml_rank", "rag_summary", "rank")
+        params = [dict({field: event.get(field) for field in fields},
+                       clicks=event.get("clicks", 1), now=now) for event in events]
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(MARK_RELEVANT_SQL, params)
+        return params
+
+    def _update_relevance(self, query: str, link: str, result_data: Dict[str, Any]) -> Optional[Dict]:
+        self._mark_relevant([dict(result_data, query=query, link=link, clicks=1)])
+        return self._to_dict(self._conn.execute(SELECT_ONE_SQL, (query, link)).fetchone())
+
+    async def update_relevance(self, query: str, link: str, result_data: Dict[str, Any]) -> Optional[Dict]:
+        """Mark a result relevant and increment its click count atomically."""
+        try:
+            return await self._call(self._update_relevance, query, link, result_data)
+        except Exception as e:
+            self.logger.error(f"Update relevance error: {e}")
+            return None
+
+    def bulk_mark_relevant(self, events: List[Dict[str, Any]]) -> int:
+        """Apply coalesced click events in one transaction; raises on failure."""
+        if not events:
+            return 0
+        try:
+            return len(self._run(self._mark_relevant, events))
+        except Exception as e:
+            self.logger.error(f"Bulk relevance update error: {e}")
+            raise
+
+    def _upsert_results(self, rows: List[Dict[str, Any]]) -> int:
+        now = self._now()
+        params = [dict({field: row.get(field) for field in PERSISTED_RESULT_FIELDS}, now=now) for row in rows]
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(UPSERT_RESULTS_BULK_SQL, params)
+        return len(params)
+
+    def bulk_upsert_results(self, rows: List[Dict[str, Any]]) -> int:
+        """Upsert one fetched result set in one transaction, keeping click data; raises on failure."""
+        if not rows:
+            return 0
+        try:
+            return self._run(self._upsert_results, rows)
+        except Exception as e:
+            self.logger.error(f"Bulk result upsert error: {e}")
+            raise
+
+    def _query_results(self, query: str, time_filter: Optional[str], limit: int,
+                       after: Optional[Tuple]) -> pd.DataFrame:
+        cutoff = time_filter_cutoff(time_filter)
+        relevance, clicks, rank, link = after if after else (None, None, None, None)
+        rows = self._conn.execute(QUERY_RESULTS_SQL, {
+            'query': query,
+            # `created` is stored as naive UTC ISO text, so compare against the same form
+            'cutoff': cutoff.replace(tzinfo=None).isoformat() if cutoff else None,
+            'relevance': None if relevance is None else int(bool(relevance)),
+            'clicks': clicks,
+            'rank': rank,
+            'link': link,
+            'limit': limit
+        }).fetchall()
+        return pd.DataFrame([self._to_dict(row) for row in rows]) if rows else pd.DataFrame()
+
+    def query_results(self, query: str, time_filter: str = None, limit: int = DB_RESULT_LIMIT,
+                      after: Optional[Tuple] = None) -> pd.DataFrame:
+        """Top `limit` results for a query, optionally after a keyset cursor."""
+        try:
+            return self._run(self._query_results, query, time_filter, limit, after)
+        except Exception as e:
+            self.logger.error(f"Query error: {e}")
+            return pd.DataFrame()
+
+    async def async_query_results(self, query: str, time_filter: str = None, limit: int = DB_RESULT_LIMIT,
+                                  after: Optional[Tuple] = None) -> pd.DataFrame:
+        """Query results without blocking the event loop."""
+        try:
+            return await self._call(self._query_results, query, time_filter, limit, after)
+        except Exception as e:
+            self.logger.error(f"Query error: {e}")
+            return pd.DataFrame()
+
+    def _documents_batch(self, after: str, batch_size: int) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self._conn.execute(DOCUMENTS_BATCH_SQL, (after, batch_size)).fetchall()]
+
+    def iter_documents(self, batch_size: int = MIGRATION_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+        """Every stored document (DOCUMENT_COLUMNS), in link-ordered batches of `batch_size`."""
+        after = ''
+        while True:
+            try:
+                rows = self._run(self._documents_batch, after, batch_size)
+            except Exception as e:
+                self.logger.error(f"Document scan error: {e}")
+                raise
+            if not rows:
+                return
+            after = rows[-1]['link']
+            yield [{column: row.get(column) for column in DOCUMENT_COLUMNS} for row in rows]
+
+    def _training_results(self, limit: int) -> pd.DataFrame:
+        rows = self._conn.execute(TRAINING_RESULTS_SQL, (limit,)).fetchall()
+        return pd.DataFrame([self._to_dict(row) for row in rows]) if rows else pd.DataFrame()
+
+    def training_results(self, limit: int = LTR_MAX_TRAINING_ROWS) -> pd.DataFrame:
+        """Most recent `limit` stored results of queries with at least one click, for `python ltr.py train`."""
+        try:
+            return self._run(self._training_results, limit)
+        except Exception as e:
+            self.logger.error(f"Training results error: {e}")
+            return pd.DataFrame()
+
+    def _insert_or_update_result(self, params: Dict[str, Any]) -> Optional[Dict]:
+        self._conn.execute(UPSERT_RESULT_SQL, params)
+        return self._to_dict(self._conn.execute(SELECT_ONE_SQL, (params['query'], params['link'])).fetchone())
+
+    def insert_or_update_result(self, values: Dict[str, Any]) -> Optional[Dict]:
+        """Insert or update a result."""
+        try:
+            required_fields = ["query", "rank", "link", "title"]
+            if not all(field in values for field in required_fields):
+                raise ValueError("Missing required fields")
+
+            params = {
+                "query": values["query"],
+                "rank": values["rank"],
+                "link": values["link"],
+                "title": values["title"],
+                "snippet": values.get("snippet", ""),
+                "now": self._now(),
+                "relevance": int(bool(values.get("relevance", False))),
+                "ml_rank": values.get("ml_rank", 0.0),
+                "rag_summary": values.get("rag_summary", ""),
+                "click_count": values.get("click_count", 0),
+                "last_clicked": values.get("last_clicked")
+            }
+            return self._run(self._insert_or_update_result, params)
+
+        except Exception as e:
+            self.logger.error(f"Insert/Update error: {e}")
+            return None
+
+    async def close(self):
+        """Close the connection and stop the storage thread."""
+        try:
+            if self._conn is not None:
+                await self._call(self._conn.close)
+                self._conn = None
+        except Exception as e:
+            self.logger.error(f"Close error: {e}")
+        finally:
+            self._executor.shutdown(wait=True)
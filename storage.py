@@ -1,13 +1,252 @@
 # storage.py
 
 import asyncio
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, List, Tuple, Iterator
 from supabase import create_client, Client
 import pandas as pd
-from settings import SUPABASE_URL, SUPABASE_KEY
+from settings import (
+    SUPABASE_URL,
+    SUPABASE_KEY,
+    STORAGE_BACKEND,
+    DB_RESULT_LIMIT,
+    MIGRATION_BATCH_SIZE,
+    LTR_MAX_TRAINING_ROWS
+)
 from logging_config import get_module_logger
 
+# Page data is stored once per URL in `documents`; `query_document` holds only
+# the per-query ranking and click state. Both are keyed by md5 hashes that any
+# writer can compute, so upserts never need a lookup round trip first.
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS documents (
+    url_hash TEXT PRIMARY KEY,  -- md5(link)
+    link TEXT NOT NULL,
+    title TEXT NOT NULL,
+    snippet TEXT,
+    rag_summary TEXT,
+    simhash TEXT,  -- content fingerprint, see dedup.simhash
+    created TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW())
+);
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS simhash TEXT;
+CREATE TABLE IF NOT EXISTS queries (
+    query_hash TEXT PRIMARY KEY,  -- md5(query)
+    query TEXT NOT NULL UNIQUE,
+    created TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW())
+);
+CREATE TABLE IF NOT EXISTS query_document (
+    query_hash TEXT NOT NULL REFERENCES queries ON DELETE CASCADE,
+    url_hash TEXT NOT NULL REFERENCES documents ON DELETE CASCADE,
+    rank INTEGER NOT NULL,
+    ml_rank REAL DEFAULT 0.0,
+    relevance BOOLEAN DEFAULT FALSE,
+    click_count INTEGER DEFAULT 0,
+    created TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()),
+    last_clicked TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (query_hash, url_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_query_document_order
+    ON query_document (query_hash, relevance DESC, click_count DESC, rank);
+CREATE OR REPLACE VIEW query_document_view AS
+    SELECT q.query, d.link, d.title, d.snippet, d.rag_summary, qd.ml_rank, qd.rank,
+           qd.relevance, qd.click_count, qd.created, qd.last_clicked, d.simhash
+    FROM query_document qd
+    JOIN queries q ON q.query_hash = qd.query_hash
+    JOIN documents d ON d.url_hash = qd.url_hash;
+"""
+
+# Bulk click upsert used by the write-behind buffer. Events are already
+# coalesced per (query, link); the counter is bumped in place so concurrent
+# flushes never lose an increment. Empty page fields from the client never
+# overwrite stored ones, since a document is shared by every query.
+MARK_RELEVANT_BULK_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION mark_results_relevant_bulk(p_events JSONB) RETURNS INTEGER AS $$
+    WITH e AS (
+        SELECT DISTINCT ON (md5(query), md5(link)) *
+        FROM jsonb_to_recordset(p_events) AS e(
+            query TEXT, link TEXT, title TEXT, snippet TEXT, ml_rank REAL,
+            rag_summary TEXT, rank INTEGER, clicks INTEGER
+        )
+    ), q AS (
+        INSERT INTO queries (query_hash, query)
+        SELECT DISTINCT md5(e.query), e.query FROM e
+        ON CONFLICT (query_hash) DO NOTHING
+    ), d AS (
+        INSERT INTO documents (url_hash, link, title, snippet, rag_summary)
+        SELECT DISTINCT ON (md5(e.link)) md5(e.link), e.link, COALESCE(e.title, ''),
+               COALESCE(e.snippet, ''), COALESCE(e.rag_summary, '')
+        FROM e
+        ORDER BY md5(e.link), length(COALESCE(e.snippet, '')) DESC
+        ON CONFLICT (url_hash) DO UPDATE SET
+            title = COALESCE(NULLIF(EXCLUDED.title, ''), documents.title),
+            snippet = COALESCE(NULLIF(EXCLUDED.snippet, ''), documents.snippet),
+            rag_summary = COALESCE(NULLIF(EXCLUDED.rag_summary, ''), documents.rag_summary)
+    ), upserted AS (
+        INSERT INTO query_document (query_hash, url_hash, rank, ml_rank, relevance,
+                                    click_count, last_clicked, created)
+        SELECT md5(e.query), md5(e.link), COALESCE(e.rank, 1), COALESCE(e.ml_rank, 0.0), TRUE,
+               COALESCE(e.clicks, 1), TIMEZONE('utc'::text, NOW()), TIMEZONE('utc'::text, NOW())
+        FROM e
+        ON CONFLICT (query_hash, url_hash) DO UPDATE SET
+            relevance = TRUE,
+            click_count = query_document.click_count + EXCLUDED.click_count,
+            last_clicked = EXCLUDED.last_clicked,
+            ml_rank = EXCLUDED.ml_rank
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM upserted;
+$$ LANGUAGE sql;
+"""
+
+# One round trip per unbuffered click; returns the updated row. The legacy
+# version returned rows of the old results table, so it is dropped first.
+MARK_RELEVANT_FUNCTION_SQL = """
+DO $$ BEGIN
+    IF EXISTS (SELECT 1 FROM pg_proc WHERE proname = 'mark_result_relevant'
+               AND prorettype <> 'query_document_view'::regtype) THEN
+        DROP FUNCTION mark_result_relevant(TEXT, TEXT, TEXT, TEXT, REAL, TEXT, INTEGER);
+    END IF;
+END $$;
+CREATE OR REPLACE FUNCTION mark_result_relevant(
+    p_query TEXT,
+    p_link TEXT,
+    p_title TEXT,
+    p_snippet TEXT,
+    p_ml_rank REAL,
+    p_rag_summary TEXT,
+    p_rank INTEGER
+) RETURNS SETOF query_document_view AS $$
+    SELECT mark_results_relevant_bulk(jsonb_build_array(jsonb_build_object(
+        'query', p_query, 'link', p_link, 'title', p_title, 'snippet', p_snippet,
+        'ml_rank', p_ml_rank, 'rag_summary', p_rag_summary, 'rank', p_rank, 'clicks', 1
+    )));
+    SELECT * FROM query_document_view WHERE query = p_query AND link = p_link;
+$$ LANGUAGE sql;
+"""
+
+# Background persistence of fetched result sets. Click state (relevance,
+# click_count, last_clicked) and first-seen timestamps are never
+# overwritten, so re-fetching a query cannot undo its click history.
+UPSERT_RESULTS_BULK_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION upsert_results_bulk(p_rows JSONB) RETURNS INTEGER AS $$
+    WITH r AS (
+        SELECT DISTINCT ON (md5(query), md5(link)) *
+        FROM jsonb_to_recordset(p_rows) AS r(
+            query TEXT, link TEXT, title TEXT, snippet TEXT, ml_rank REAL,
+            rag_summary TEXT, rank INTEGER, simhash TEXT
+        )
+    ), q AS (
+        INSERT INTO queries (query_hash, query)
+        SELECT DISTINCT md5(r.query), r.query FROM r
+        ON CONFLICT (query_hash) DO NOTHING
+    ), d AS (
+        INSERT INTO documents (url_hash, link, title, snippet, rag_summary, simhash)
+        SELECT DISTINCT ON (md5(r.link)) md5(r.link), r.link, COALESCE(r.title, ''),
+               COALESCE(r.snippet, ''), COALESCE(r.rag_summary, ''), r.simhash
+        FROM r
+        ORDER BY md5(r.link), length(COALESCE(r.snippet, '')) DESC
+        ON CONFLICT (url_hash) DO UPDATE SET
+            title = COALESCE(NULLIF(EXCLUDED.title, ''), documents.title),
+            snippet = COALESCE(NULLIF(EXCLUDED.snippet, ''), documents.snippet),
+            rag_summary = COALESCE(NULLIF(EXCLUDED.rag_summary, ''), documents.rag_summary),
+            simhash = COALESCE(EXCLUDED.simhash, documents.simhash)
+    ), upserted AS (
+        INSERT INTO query_document (query_hash, url_hash, rank, ml_rank, created)
+        SELECT md5(r.query), md5(r.link), COALESCE(r.rank, 1), COALESCE(r.ml_rank, 0.0),
+               TIMEZONE('utc'::text, NOW())
+        FROM r
+        ON CONFLICT (query_hash, url_hash) DO UPDATE SET
+            rank = EXCLUDED.rank,
+            ml_rank = EXCLUDED.ml_rank
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM upserted;
+$$ LANGUAGE sql;
+"""
+
+# Full upsert of one row including its click state (insert_or_update_result)
+UPSERT_RESULT_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION upsert_result(p_row JSONB) RETURNS SETOF query_document_view AS $$
+    SELECT upsert_results_bulk(jsonb_build_array(p_row));
+    UPDATE query_document SET
+        relevance = COALESCE((p_row->>'relevance')::BOOLEAN, FALSE),
+        click_count = COALESCE((p_row->>'click_count')::INTEGER, 0),
+        last_clicked = (p_row->>'last_clicked')::TIMESTAMP WITH TIME ZONE
+    WHERE query_hash = md5(p_row->>'query') AND url_hash = md5(p_row->>'link');
+    SELECT * FROM query_document_view WHERE query = p_row->>'query' AND link = p_row->>'link';
+$$ LANGUAGE sql;
+"""
+
+# In dependency order
+STORAGE_FUNCTIONS_SQL = (
+    MARK_RELEVANT_BULK_FUNCTION_SQL,
+    MARK_RELEVANT_FUNCTION_SQL,
+    UPSERT_RESULTS_BULK_FUNCTION_SQL,
+    UPSERT_RESULT_FUNCTION_SQL
+)
+
+# Copies one id-ordered batch of the pre-normalization `results` table and
+# returns the last id copied (NULL when done). Re-running a batch is
+# harmless: clicks are merged with GREATEST rather than added.
+MIGRATE_RESULTS_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION migrate_results_batch(p_after_id BIGINT, p_limit INTEGER) RETURNS BIGINT AS $$
+    WITH batch AS (
+        SELECT * FROM results WHERE id > p_after_id ORDER BY id LIMIT p_limit
+    ), q AS (
+        INSERT INTO queries (query_hash, query)
+        SELECT DISTINCT md5(b.query), b.query FROM batch b
+        ON CONFLICT (query_hash) DO NOTHING
+    ), d AS (
+        INSERT INTO documents (url_hash, link, title, snippet, rag_summary, created)
+        SELECT DISTINCT ON (md5(b.link)) md5(b.link), b.link, b.title, b.snippet, b.rag_summary, b.created
+        FROM batch b
+        ORDER BY md5(b.link), b.created DESC
+        ON CONFLICT (url_hash) DO NOTHING
+    ), qd AS (
+        INSERT INTO query_document (query_hash, url_hash, rank, ml_rank, relevance,
+                                    click_count, created, last_clicked)
+        SELECT md5(b.query), md5(b.link), b.rank, b.ml_rank, b.relevance,
+               b.click_count, b.created, b.last_clicked
+        FROM batch b
+        ON CONFLICT (query_hash, url_hash) DO UPDATE SET
+            relevance = query_document.relevance OR EXCLUDED.relevance,
+            click_count = GREATEST(query_document.click_count, EXCLUDED.click_count),
+            last_clicked = GREATEST(query_document.last_clicked, EXCLUDED.last_clicked),
+            created = LEAST(query_document.created, EXCLUDED.created)
+    )
+    SELECT MAX(id) FROM batch;
+$$ LANGUAGE sql;
+"""
+
+# Fields written by bulk_upsert_results
+PERSISTED_RESULT_FIELDS = ("query", "link", "title", "snippet", "ml_rank", "rag_summary", "rank", "simhash")
+
+TIME_FILTER_DAYS = {'day': 1, 'month': 30, 'year': 365}
+
+# Columns the search pipeline reads back; id, query and timestamps stay in the DB
+RESULT_COLUMNS = ['link', 'title', 'snippet', 'rag_summary', 'ml_rank', 'rank', 'relevance', 'click_count', 'simhash']
+
+# Columns of each stored document read by the semantic index builder
+DOCUMENT_COLUMNS = ['link', 'title', 'snippet', 'rag_summary']
+
+# Columns read by the learning-to-rank trainer (ltr.py)
+TRAINING_COLUMNS = ['query', 'link', 'title', 'snippet', 'ml_rank', 'rank', 'relevance', 'click_count']
+
+# query_results order; link breaks ties so keyset pages never skip or repeat rows
+KEYSET_COLUMNS = ('relevance', 'click_count', 'rank', 'link')
+
+def next_cursor(results: pd.DataFrame, limit: int) -> Optional[Tuple]:
+    """Keyset cursor for the page after `results`, or None on the last page."""
+    if results is None or len(results) < limit:
+        return None
+    last = results.iloc[-1]
+    return (bool(last['relevance']), int(last['click_count']), int(last['rank']), str(last['link']))
+
+def time_filter_cutoff(time_filter: Optional[str]) -> Optional[datetime]:
+    """Oldest `created` timestamp (timezone-aware UTC) a time filter admits, or None for no filter."""
+    days = TIME_FILTER_DAYS.get(time_filter or '')
+    return datetime.now(timezone.utc) - timedelta(days=days) if days else None
+
 class OptimizedDBStorage:
     def __init__(self):
         self.logger = get_module_logger("storage")
@@ -15,123 +254,158 @@ class OptimizedDBStorage:
         self._ensure_table_exists()
 
     def _ensure_table_exists(self):
-        """Ensure the results table exists with proper schema."""
+        """Ensure the normalized tables, view and functions exist."""
         try:
-            # Check if table exists by attempting to select
-            response = self.supabase.table("results").select("*").limit(1).execute()
-            self.logger.info("Results table exists")
+            # Check the schema is current by selecting every column through the view
+            response = self.supabase.table("query_document_view").select(",".join(RESULT_COLUMNS)).limit(1).execute()
+            self.logger.info("Results schema exists")
             
         except Exception as e:
-            self.logger.error(f"Table check error: {e}")
-            # Table might not exist, try to create it using REST API
+            self.logger.error(f"Schema check error: {e}")
+            # Schema might not exist, try to create it using REST API
             try:
-                create_table_sql = """
-                CREATE TABLE IF NOT EXISTS results (
-                    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
-                    query TEXT NOT NULL,
-                    rank INTEGER NOT NULL,
-                    link TEXT NOT NULL,
-                    title TEXT NOT NULL,
-                    snippet TEXT,
-                    created TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()),
-                    relevance BOOLEAN DEFAULT FALSE,
-                    ml_rank REAL DEFAULT 0.0,
-                    rag_summary TEXT,
-                    click_count INTEGER DEFAULT 0,
-                    last_clicked TIMESTAMP WITH TIME ZONE,
-                    UNIQUE(query, link)
-                );
-                """
                 # Use RPC call instead of raw query
-                self.supabase.rpc('exec_sql', {'sql': create_table_sql}).execute()
-                self.logger.info("Created results table")
+                self.supabase.rpc('exec_sql', {'sql': SCHEMA_SQL}).execute()
+                for sql in STORAGE_FUNCTIONS_SQL:
+                    self.supabase.rpc('exec_sql', {'sql': sql}).execute()
+                self.logger.info("Created results schema; run `python storage.py migrate` to copy legacy results")
             except Exception as create_error:
-                self.logger.error(f"Table creation error: {create_error}")
+                self.logger.error(f"Schema creation error: {create_error}")
                 raise
 
-    async def update_relevance(self, query: str, link: str, result_data: Dict[str, Any]) -> Optional[Dict]:
-        """Update relevance and click metrics for a search result."""
+    def health_check(self) -> bool:
+        """Cheap round trip used by the readiness probe."""
         try:
-            now = datetime.utcnow().isoformat()
-            
-            # First check if the record exists
-            existing = self.supabase.table("results")\
-                .select("*")\
-                .eq("query", query)\
-                .eq("link", link)\
-                .execute()
+            self.supabase.table("query_document_view").select("link").limit(1).execute()
+            return True
+        except Exception as e:
+            self.logger.error(f"Health check error: {e}")
+            return False
 
-            if existing and existing.data:
-                # Update existing record
-                update_data = {
-                    "relevance": True,
-                    "last_clicked": now,
-                    "click_count": existing.data[0].get('click_count', 0) + 1,
-                    "title": result_data.get('title'),
-                    "snippet": result_data.get('snippet'),
-                    "ml_rank": result_data.get('ml_rank'),
-                    "rag_summary": result_data.get('rag_summary')
-                }
-                
-                response = self.supabase.table("results")\
-                    .update(update_data)\
-                    .eq("query", query)\
-                    .eq("link", link)\
-                    .execute()
-                
-                if response and response.data:
-                    return response.data[0]
-            else:
-                # Insert new record
-                insert_data = {
-                    "query": query,
-                    "link": link,
-                    "relevance": True,
-                    "click_count": 1,
-                    "last_clicked": now,
-                    "rank": result_data.get("rank", 1),
-                    "title": result_data.get("title", ""),
-                    "snippet": result_data.get("snippet", ""),
-                    "ml_rank": result_data.get("ml_rank", 0.0),
-                    "rag_summary": result_data.get("rag_summary", ""),
-                    "created": now
-                }
-                
-                response = self.supabase.table("results")\
-                    .insert(insert_data)\
-                    .execute()
-                
+    def _create_relevance_function(self, sql: str = MARK_RELEVANT_FUNCTION_SQL) -> bool:
+        """Install a relevance function on databases created before it existed."""
+        try:
+            self.supabase.rpc('exec_sql', {'sql': sql}).execute()
+            self.logger.info("Created relevance function")
+            return True
+        except Exception as e:
+            self.logger.error(f"Function creation error: {e}")
+            return False
+
+    async def update_relevance(self, query: str, link: str, result_data: Dict[str, Any]) -> Optional[Dict]:
+        """Mark a result relevant and increment its click count in one atomic round trip."""
+        params = {
+            "p_query": query,
+            "p_link": link,
+            "p_title": result_data.get("title", ""),
+            "p_snippet": result_data.get("snippet", ""),
+            "p_ml_rank": result_data.get("ml_rank", 0.0),
+            "p_rag_summary": result_data.get("rag_summary", ""),
+            "p_rank": result_data.get("rank", 1)
+        }
+
+        for attempt in range(2):
+            try:
+                response = self.supabase.rpc('mark_result_relevant', params).execute()
                 if response and response.data:
                     return response.data[0]
+                return None
 
-            return None
+            except Exception as e:
+                if attempt == 0 and 'mark_result_relevant' in str(e) and self._create_relevance_function():
+                    continue
+                self.logger.error(f"Update relevance error: {e}")
+                return None
 
-        except Exception as e:
-            self.logger.error(f"Update relevance error: {e}")
-            return None
+    def bulk_mark_relevant(self, events: List[Dict[str, Any]]) -> int:
+        """
+        Apply coalesced click events in one round trip.
+
+        Each event carries query, link, result fields and ``clicks``, the number
+        of clicks to add. Raises on failure so the caller can retry the batch.
+        """
+        if not events:
+            return 0
 
-    def query_results(self, query: str, time_filter: str = None) -> pd.DataFrame:
-        """Query results with time filtering."""
+        fields = ("query", "link", "title", "snippet", "ml_rank", "rag_summary", "rank", "clicks")
+        payload = [{field: event.get(field) for field in fields} for event in events]
+
+        for attempt in range(2):
+            try:
+                response = self.supabase.rpc('mark_results_relevant_bulk', {'p_events': payload}).execute()
+                return int(response.data or 0)
+            except Exception as e:
+                if attempt == 0 and 'mark_results_relevant_bulk' in str(e) \
+                        and self._create_relevance_function(MARK_RELEVANT_BULK_FUNCTION_SQL):
+                    continue
+                self.logger.error(f"Bulk relevance update error: {e}")
+                raise
+
+    def bulk_upsert_results(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Upsert one fetched result set in a single round trip.
+
+        Rows carry PERSISTED_RESULT_FIELDS; existing click data is kept.
+        Raises on failure so the caller can decide whether to retry.
+        """
+        if not rows:
+            return 0
+
+        payload = [{field: row.get(field) for field in PERSISTED_RESULT_FIELDS} for row in rows]
+
+        for attempt in range(2):
+            try:
+                response = self.supabase.rpc('upsert_results_bulk', {'p_rows': payload}).execute()
+                return int(response.data or 0)
+            except Exception as e:
+                if attempt == 0 and 'upsert_results_bulk' in str(e) \
+                        and self._create_relevance_function(UPSERT_RESULTS_BULK_FUNCTION_SQL):
+                    continue
+                self.logger.error(f"Bulk result upsert error: {e}")
+                raise
+
+    @staticmethod
+    def _quote(value: Any) -> str:
+        """Quote a value for a PostgREST logic-tree filter."""
+        text = str(value).replace('\\', '\\\\').replace('"', '\\"')
+        return f'"{text}"'
+
+    def query_results(self, query: str, time_filter: str = None, limit: int = DB_RESULT_LIMIT,
+                      after: Optional[Tuple] = None) -> pd.DataFrame:
+        """
+        Top `limit` results for a query, optionally after a keyset cursor.
+
+        Reads one join (query_document_view) and fetches only RESULT_COLUMNS;
+        the ordering and limit run in the database, so the payload stays
+        constant as history grows.
+        """
         try:
-            base_query = self.supabase.table("results")\
-                .select("*")\
+            base_query = self.supabase.table("query_document_view")\
+                .select(",".join(RESULT_COLUMNS))\
                 .eq("query", query)
 
-            if time_filter:
-                now = datetime.utcnow()
-                if time_filter == 'day':
-                    cutoff = now - timedelta(days=1)
-                elif time_filter == 'month':
-                    cutoff = now - timedelta(days=30)
-                elif time_filter == 'year':
-                    cutoff = now - timedelta(days=365)
-                
+            cutoff = time_filter_cutoff(time_filter)
+            if cutoff:
                 base_query = base_query.gte('created', cutoff.isoformat())
 
+            if after:
+                relevance, clicks, rank, link = after
+                relevance = str(bool(relevance)).lower()
+                # Set the `or` param directly; older postgrest clients lack or_()
+                base_query.params = base_query.params.add("or", (
+                    f"(relevance.lt.{relevance},"
+                    f"and(relevance.eq.{relevance},click_count.lt.{int(clicks)}),"
+                    f"and(relevance.eq.{relevance},click_count.eq.{int(clicks)},rank.gt.{int(rank)}),"
+                    f"and(relevance.eq.{relevance},click_count.eq.{int(clicks)},rank.eq.{int(rank)},"
+                    f"link.gt.{self._quote(link)}))"
+                ))
+
             response = base_query\
                 .order('relevance', desc=True)\
                 .order('click_count', desc=True)\
                 .order('rank')\
+                .order('link')\
+                .limit(limit)\
                 .execute()
             
             if response and response.data:
@@ -142,6 +416,49 @@ class OptimizedDBStorage:
             self.logger.error(f"Query error: {e}")
             return pd.DataFrame()
 
+    async def async_query_results(self, query: str, time_filter: str = None, limit: int = DB_RESULT_LIMIT,
+                                  after: Optional[Tuple] = None) -> pd.DataFrame:
+        """Run query_results on a worker thread so the event loop is not blocked."""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.query_results, query, time_filter, limit, after)
+
+    def iter_documents(self, batch_size: int = MIGRATION_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+        """Every stored document (DOCUMENT_COLUMNS), in url_hash-ordered batches of `batch_size`."""
+        after = ''
+        while True:
+            try:
+                response = self.supabase.table("documents")\
+                    .select(",".join(['url_hash'] + DOCUMENT_COLUMNS))\
+                    .gt("url_hash", after)\
+                    .order("url_hash")\
+                    .limit(batch_size)\
+                    .execute()
+            except Exception as e:
+                self.logger.error(f"Document scan error: {e}")
+                raise
+            rows = response.data or []
+            if not rows:
+                return
+            after = rows[-1]['url_hash']
+            yield [{column: row.get(column) for column in DOCUMENT_COLUMNS} for row in rows]
+
+    def training_results(self, limit: int = LTR_MAX_TRAINING_ROWS) -> pd.DataFrame:
+        """Most recent `limit` stored results of queries with at least one click, for `python ltr.py train`."""
+        try:
+            response = self.supabase.table("query_document_view")\
+                .select(",".join(TRAINING_COLUMNS))\
+                .order('created', desc=True)\
+                .limit(limit)\
+                .execute()
+            results = pd.DataFrame(response.data) if response and response.data else pd.DataFrame()
+            if results.empty:
+                return results
+            clicked = results.loc[(results['click_count'] > 0) | results['relevance'], 'query']
+            return results[results['query'].isin(set(clicked))]
+        except Exception as e:
+            self.logger.error(f"Training results error: {e}")
+            return pd.DataFrame()
+
     def insert_or_update_result(self, values: Dict[str, Any]) -> Optional[Dict]:
         """Insert or update a result."""
         try:
@@ -149,23 +466,24 @@ class OptimizedDBStorage:
             if not all(field in values for field in required_fields):
                 raise ValueError("Missing required fields")
 
+            last_clicked = values.get("last_clicked")
+            if isinstance(last_clicked, datetime):
+                last_clicked = last_clicked.isoformat()
+
             row_data = {
                 "query": values["query"],
                 "rank": values["rank"],
                 "link": values["link"],
                 "title": values["title"],
                 "snippet": values.get("snippet", ""),
-                "created": datetime.utcnow().isoformat(),
                 "relevance": values.get("relevance", False),
                 "ml_rank": values.get("ml_rank", 0.0),
                 "rag_summary": values.get("rag_summary", ""),
                 "click_count": values.get("click_count", 0),
-                "last_clicked": values.get("last_clicked")
+                "last_clicked": last_clicked
             }
 
-            response = self.supabase.table("results")\
-                .upsert(row_data)\
-                .execute()
+            response = self.supabase.rpc('upsert_result', {'p_row': row_data}).execute()
             
             if response and response.data:
                 return response.data[0]
@@ -175,10 +493,59 @@ class OptimizedDBStorage:
             self.logger.error(f"Insert/Update error: {e}")
             return None
 
+    def migrate_legacy_results(self, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+        """
+        Copy the pre-normalization `results` table into the new schema.
+
+        Rows move in id-ordered batches of `batch_size`, one round trip each,
+        so the migration never holds long locks and can simply be re-run
+        after an interruption. Returns the number of batches copied.
+        """
+        try:
+            self.supabase.rpc('exec_sql', {'sql': MIGRATE_RESULTS_FUNCTION_SQL}).execute()
+        except Exception as e:
+            # Fails when there is no legacy results table to read from
+            self.logger.info(f"Nothing to migrate: {e}")
+            return 0
+
+        last_id, batches = 0, 0
+        while True:
+            response = self.supabase.rpc('migrate_results_batch',
+                                         {'p_after_id': last_id, 'p_limit': batch_size}).execute()
+            if response.data is None:
+                break
+            last_id, batches = int(response.data), batches + 1
+            self.logger.info(f"Migrated legacy results up to id {last_id}")
+        return batches
+
     async def close(self):
         """Cleanup resources."""
         try:
-            # Supabase client doesn't require explicit closing
-            pass
+            # Release the pooled HTTP connections behind the PostgREST client
+            postgrest = getattr(self.supabase, '_postgrest', None)
+            if postgrest is not None:
+                postgrest.session.close()
         except Exception as e:
-            self.logger.error(f"Close error: {e}")
\ No newline at end of file
+            self.logger.error(f"Close error: {e}")
+
+def create_storage():
+    """Storage backend selected by STORAGE_BACKEND; the app and command-line tools all use this."""
+    if STORAGE_BACKEND == 'sqlite':
+        from sqlite_storage import SQLiteStorage
+        return SQLiteStorage()
+    if STORAGE_BACKEND == 'postgres':
+        from pg_storage import AsyncPGStorage
+        return AsyncPGStorage()
+    return OptimizedDBStorage()
+
+if __name__ == '__main__':
+    import sys
+
+    if sys.argv[1:] != ['migrate']:
+        sys.exit("usage: python storage.py migrate")
+    db = create_storage()
+    if hasattr(db, 'migrate_legacy_results'):
+        print(f"Migrated {db.migrate_legacy_results()} batch(es) of legacy results")
+    else:
+        print(f"The {STORAGE_BACKEND} backend has no legacy results to migrate")
+    asyncio.run(db.close())
@@ -0,0 +1,207 @@
+import os
+import pandas as pd
+import pytest
+
+# Importing app must not warm up real database and Redis clients
+os.environ.setdefault("WARM_UP_ON_START", "false")
+
+from app import OptimizedSearchApp
+from lifecycle import get_lifecycle
+
+class FakeCache:
+    redis_client = None
+
+    def __init__(self):
+        self.data, self.deleted = {}, []
+
+    async def async_get_with_version(self, key):
+        return self.data.get(key), None
+
+    async def async_get(self, key):
+        return self.data.get(key)
+
+    async def async_put(self, key, value):
+        self.data[key] = value
+
+    async def async_delete(self, key):
+        self.data.pop(key, None)
+
+    def delete_many(self, keys):
+        self.deleted.extend(keys)
+
+    def close(self):
+        pass
+
+class FakeStorage:
+    def __init__(self):
+        self.queried, self.marked, self.upserted = [], [], []
+        self.stored = pd.DataFrame()
+
+    async def async_query_results(self, query, time_filter=None):
+        self.queried.append(query)
+        return self.stored
+
+    def bulk_mark_relevant(self, events):
+        self.marked.append(list(events))
+
+    def bulk_upsert_results(self, rows):
+        self.upserted.extend(rows)
+        return len(rows)
+
+    def close(self):
+        pass
+
+class FakeSearchEngine:
+    def __init__(self):
+        self.queries, self.enriched = [], []
+
+    async def search(self, query, enrichment='full'):
+        self.queries.append(query)
+        return pd.DataFrame([{"title": "C++ reference", "link": "https://cpp", "snippet": "language", "ml_rank": 1.0}])
+
+    async def enrich(self, item, query):
+        self.enriched.append(item["link"])
+        return dict(item, rag_summary="Summary of the page")
+
+    async def _close_session(self):
+        pass
+
+@pytest.fixture(scope="module", autouse=True)
+def shut_down_app():
+    # Close everything while pytest's output streams are still open, not at interpreter exit
+    yield
+    get_lifecycle().shutdown()
+
+@pytest.fixture
+def search_app():
+    search_app = OptimizedSearchApp()
+    fakes = {"adaptive_cache": FakeCache(), "db_storage": FakeStorage(), "search_engine": FakeSearchEngine()}
+    for name, fake in fakes.items():
+        search_app.components.register(name, lambda fake=fake: fake)
+    search_app.click_buffer = None
+    search_app.result_persister = None
+    search_app.rate_limiter = None
+    search_app.fragment_cache = None
+    return search_app
+
+def test_search_uses_normalized_keys_but_searches_the_typed_query(search_app):
+    response = search_app.app.test_client().get("/search", query_string={"query": "C++  Reference"})
+    assert response.status_code == 200
+    assert search_app.search_engine.queries == ["C++  Reference"]
+    assert search_app.db_storage.queried == ["c++ reference"]
+    assert "c++ reference" in search_app.adaptive_cache.data
+
+def test_click_flush_is_not_retried_when_only_invalidation_fails(search_app):
+    from write_behind import ClickBuffer
+    from components import ComponentUnavailable
+
+    def redis_down(keys):
+        raise ComponentUnavailable("adaptive_cache unavailable")
+
+    search_app.adaptive_cache.delete_many = redis_down
+    buffer = ClickBuffer(search_app._flush_clicks, flush_interval=60, spill_path=None)
+    buffer.add("dr strange", "https://a", {"title": "A"})
+    assert buffer.flush() == 1
+    assert len(buffer) == 0 and buffer.flush() == 0
+    assert len(search_app.db_storage.marked) == 1
+    buffer.close()
+
+def test_unbuffered_click_batch_is_written_once(search_app):
+    events = [
+        {"query": "Dr Strange", "link": "https://a", "title": "A"},
+        {"query": "dr  strange", "link": "https://a", "title": "A"},
+        {"query": "dr strange", "link": "https://b", "title": "B"},
+        {"query": "dr strange"},
+    ]
+    response = search_app.app.test_client().post("/mark-relevant/batch", json={"events": events})
+    assert response.get_json()["data"] == {"accepted": 3, "rejected": 1}
+    assert len(search_app.db_storage.marked) == 1
+    clicks = {event["link"]: event["clicks"] for event in search_app.db_storage.marked[0]}
+    assert clicks == {"https://a": 2, "https://b": 1}
+
+def test_client_key_ignores_spoofed_forwarded_hops(search_app):
+    with search_app.app.test_request_context(
+        "/search", headers={"X-Forwarded-For": "6.6.6.6, 203.0.113.7"}, environ_base={"REMOTE_ADDR": "10.0.0.1"}
+    ):
+        assert search_app._client_key() == "ip:203.0.113.7"
+    with search_app.app.test_request_context("/search", environ_base={"REMOTE_ADDR": "10.0.0.1"}):
+        assert search_app._client_key() == "ip:10.0.0.1"
+
+def test_enrich_only_fetches_links_the_server_returned(search_app):
+    search_app.db_storage.stored = pd.DataFrame([{"link": "https://stored", "title": "Stored", "snippet": "s",
+                                                  "rank": 1, "ml_rank": 0.5, "rag_summary": ""}])
+    client = search_app.app.test_client()
+    response = client.post("/enrich", json={"query": "dr strange", "link": "http://169.254.169.254/latest/meta-data/"})
+    assert response.status_code == 404
+    assert search_app.search_engine.enriched == []
+
+    response = client.post("/enrich", json={"query": "Dr Strange", "link": "https://stored"})
+    assert response.status_code == 200
+    assert search_app.search_engine.enriched == ["https://stored"]
+    assert search_app.db_storage.upserted[0]["rag_summary"] == "Summary of the page"
+    assert search_app.db_storage.upserted[0]["query"] == "dr strange"
+
+def test_enriched_summary_is_written_back_to_the_cache(search_app):
+    cache = search_app.adaptive_cache
+    cache.data["dr strange|lazy"] = [{"rank": 1, "link": "https://a", "title": "A", "snippet": "s",
+                                      "ml_rank": 0.5, "rag_summary": None}]
+    client = search_app.app.test_client()
+    for _ in range(2):
+        response = client.post("/enrich", json={"query": "dr strange", "link": "https://a", "enrichment": "lazy"})
+        assert response.get_json()["data"]["rag_summary"] == "Summary of the page"
+
+    assert search_app.search_engine.enriched == ["https://a"]  # the second expansion is served from the cache
+    assert cache.data["dr strange|lazy"][0]["rag_summary"] == "Summary of the page"
+    assert search_app.db_storage.upserted[0]["rag_summary"] == "Summary of the page"
+
+def test_a_full_stored_result_set_skips_the_search_pipeline(search_app):
+    rows = [{"link": f"https://{i}", "title": f"Stored {i}", "snippet": "s", "rank": i + 1, "ml_rank": 0.5,
+             "rag_summary": "", "relevance": False, "click_count": 0, "simhash": None} for i in range(10)]
+    search_app.db_storage.stored = pd.DataFrame(rows)
+    client = search_app.app.test_client()
+
+    response = client.get("/search", query_string={"query": "dr strange"})
+    assert response.status_code == 200 and b"Stored 9" in response.data
+    assert search_app.search_engine.queries == []
+    assert len(search_app.adaptive_cache.data["dr strange"]) == 10
+
+    # Too few stored rows still go to the search engine
+    search_app.db_storage.stored = pd.DataFrame(rows[:3])
+    client.get("/search", query_string={"query": "the matrix"})
+    assert search_app.search_engine.queries == ["the matrix"]
+
+def test_cache_hits_are_served_while_cold_search_slots_are_full(search_app):
+    search_app.adaptive_cache.data["dr strange"] = [{"rank": 1, "link": "https://a", "title": "Cached A",
+                                                     "snippet": "s", "ml_rank": 0.5, "rag_summary": None}]
+    admission = search_app.admission
+    while admission.try_acquire_expensive():
+        pass
+    try:
+        client = search_app.app.test_client()
+        assert client.get("/search", query_string={"query": "dr strange"}).status_code == 200
+        assert client.get("/search", query_string={"query": "the matrix"}).status_code == 503
+    finally:
+        for _ in range(admission.max_expensive):
+            admission.release_expensive()
+
+def test_batch_semantic_search_is_admission_controlled_and_capped(search_app, monkeypatch):
+    import app as app_module
+    client = search_app.app.test_client()
+    admission = search_app.admission
+    while admission.try_acquire():
+        pass
+    try:
+        response = client.post("/semantic-search/batch", json={"queries": ["q"], "documents": ["d"]})
+        assert response.status_code == 503
+    finally:
+        for _ in range(admission.max_in_flight):
+            admission.release()
+
+    monkeypatch.setattr(app_module, "SEMANTIC_MAX_DOCUMENTS", 2)
+    monkeypatch.setattr(app_module, "SEMANTIC_MAX_DOCUMENT_CHARS", 10)
+    response = client.post("/semantic-search/batch", json={"queries": ["q"], "documents": ["a", "b", "c"]})
+    assert response.status_code == 400
+    response = client.post("/semantic-search/batch", json={"queries": ["q"], "documents": ["a" * 11]})
+    assert response.status_code == 413
+    response = client.post("/semantic-search", json={"query": "q", "documents": ["a" * 11]})
+    assert response.status_code == 413
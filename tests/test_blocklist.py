@@ -0,0 +1,36 @@
+import os
+import tempfile
+from blocklist import Blocklist
+
+def write_blocklist(path, *entries):
+    with open(path, "w") as f:
+        f.write("\n".join(entries))
+
+def test_domain_suffixes_and_url_prefixes():
+    path = os.path.join(tempfile.mkdtemp(), "blocklist.txt")
+    write_blocklist(path, "# trackers", "doubleclick.net", "facebook.com/tr", "https://Example.org/ads/")
+    blocklist = Blocklist(path)
+
+    assert blocklist.is_blocked("https://doubleclick.net/x")
+    assert blocklist.is_blocked("https://ads.g.doubleclick.net:443/pixel")
+    assert not blocklist.is_blocked("https://notdoubleclick.net/")
+
+    assert blocklist.is_blocked("https://www.facebook.com/tr?id=1")
+    assert blocklist.is_blocked("https://facebook.com/tr/")
+    assert not blocklist.is_blocked("https://facebook.com/travel")
+    assert not blocklist.is_blocked("https://facebook.com/")
+
+    assert blocklist.is_blocked("http://example.org/ads/banner.js")
+    assert not blocklist.is_blocked("http://example.org/about")
+    assert not blocklist.is_blocked("not a url")
+
+def test_hot_reload_on_file_change():
+    path = os.path.join(tempfile.mkdtemp(), "blocklist.txt")
+    write_blocklist(path, "a.com")
+    blocklist = Blocklist(path, reload_interval=0)
+    assert blocklist.is_blocked("https://a.com")
+
+    write_blocklist(path, "b.com")
+    os.utime(path, (0, os.stat(path).st_mtime + 5))
+    assert not blocklist.is_blocked("https://a.com")
+    assert blocklist.is_blocked("https://sub.b.com/page")
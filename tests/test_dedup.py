@@ -0,0 +1,45 @@
+import random
+import pandas as pd
+from dedup import canonicalize_url, simhash, hamming_distance, SimHashIndex, collapse_duplicates
+
+WORDS = [f"word{i}" for i in range(500)]
+
+def page_text(seed, length=2000):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+def test_canonicalize_url_collapses_variants():
+    canonical = canonicalize_url("https://example.com/docs?a=1&b=2")
+    assert canonicalize_url("http://www.Example.com:80/docs/?b=2&a=1&utm_source=x#top") == canonical
+    assert canonicalize_url("https://example.com/docs/index.html?a=1&b=2&gclid=abc") == canonical
+    assert canonicalize_url("https://example.com/docs?a=2&b=2") != canonical
+    assert canonicalize_url("https://example.com:8443/docs?a=1&b=2") != canonical
+
+def test_simhash_is_close_for_near_duplicates():
+    text = page_text(1)
+    edited = text.replace("word7 ", "word8 ", 1) + " updated footer"
+    a, b, other = simhash(text), simhash(edited), simhash(page_text(2))
+
+    assert hamming_distance(int(a, 16), int(b, 16)) <= 3
+    assert hamming_distance(int(a, 16), int(other, 16)) > 10
+    assert simhash("too short to fingerprint") is None
+
+def test_index_finds_fingerprints_within_distance():
+    index = SimHashIndex(max_distance=3)
+    index.add(0xF0F0F0F0F0F0F0F0, "a")
+
+    assert index.find(0xF0F0F0F0F0F0F0F0 ^ 0b10000000000000000000000000000000011) == "a"
+    assert index.find(0xF0F0F0F0F0F0F0F0 ^ 0b1111) is None
+
+def test_collapse_keeps_first_of_each_duplicate():
+    text = page_text(3)
+    results = pd.DataFrame([
+        {"link": "https://a.com/post", "simhash": simhash(text)},
+        {"link": "http://www.a.com/post/?utm_medium=rss", "simhash": None},
+        {"link": "https://mirror.net/a-post", "simhash": simhash(text + " mirrored")},
+        {"link": "https://b.com/", "simhash": simhash(page_text(4))},
+        {"link": "https://c.com/", "simhash": None}
+    ])
+
+    collapsed = collapse_duplicates(results)
+    assert list(collapsed["link"]) == ["https://a.com/post", "https://b.com/", "https://c.com/"]
@@ -0,0 +1,25 @@
+import asyncio
+from document_analysis import DocumentAnalyzer, analyze_html
+
+PAGE = """<?xml version="1.0" encoding="utf-8"?>
+<html><head><title>Ignored</title><meta property="article:published_time" content="2024-05-01T10:00:00Z"></head>
+<body><!-- comment --><p>The first sentence has words.</p><p>A second one follows here!</p>
+<a href="/a">one</a> <a href="/b">two</a> <a>no href</a><script>var hidden = 1;</script></body></html>"""
+
+def test_analyze_html_extracts_every_feature_in_one_pass():
+    features = analyze_html(PAGE)
+    assert "hidden" not in features["text"] and "Ignored" not in features["text"]
+    assert features["text"].startswith("The first sentence has words. A second one follows here!")
+    assert features["link_count"] == 2
+    assert features["published_date"] == "2024-05-01T10:00:00Z" and features["has_date"]
+    assert features["sentences"][:2] == ["The first sentence has words.", "A second one follows here!"]
+    assert analyze_html("")["word_count"] == 0
+
+def test_process_pool_matches_inline_analysis():
+    analyzer = DocumentAnalyzer(max_workers=1)
+    try:
+        records = asyncio.run(analyzer.analyze_many([PAGE, ""]))
+    finally:
+        analyzer.close()
+    assert records[0] == analyze_html(PAGE)
+    assert records[1]["text"] == ""
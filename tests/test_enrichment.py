@@ -0,0 +1,77 @@
+import asyncio
+import search
+from search import OptimizedSearch
+
+ITEMS = [{"link": f"https://example.com/{i}", "title": f"Result {i}", "snippet": f"snippet {i}"} for i in range(6)]
+PAGE = "<html><body><p>The python asyncio library runs coroutines on an event loop.</p></body></html>"
+
+def make_engine(monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_KEY", "key")
+    monkeypatch.setattr(search, "SEARCH_ID", "id")
+    monkeypatch.setattr(search, "LOCAL_INDEX_ENABLED", False)
+    engine = OptimizedSearch()
+    engine.analyzer.max_workers = 0  # parse on threads
+    fetched = []
+
+    async def fake_results(query, start_index=1):
+        return {"items": ITEMS}
+
+    async def fake_page(url, session=None):
+        fetched.append(url)
+        return PAGE
+
+    engine._fetch_search_results = fake_results
+    engine._fetch_page_content = fake_page
+    return engine, fetched
+
+def test_enrichment_modes_bound_page_fetches(monkeypatch):
+    engine, fetched = make_engine(monkeypatch)
+    monkeypatch.setattr(search, "ENRICHMENT_LAZY_RESULTS", 2)
+
+    results = asyncio.run(engine.search("python asyncio", "snippet"))
+    assert len(results) == 6 and fetched == []
+    assert results["rag_summary"].isna().all()
+
+    results = asyncio.run(engine.search("python asyncio", "lazy"))
+    assert fetched == ["https://example.com/0", "https://example.com/1"]
+    assert results["rag_summary"].notna().sum() == 2
+
+    fetched.clear()
+    asyncio.run(engine.search("python asyncio", "full"))
+    assert len(fetched) == 6
+
+def test_enrich_summarizes_one_result_on_demand(monkeypatch):
+    engine, fetched = make_engine(monkeypatch)
+    result = asyncio.run(engine.enrich(ITEMS[3], "asyncio"))
+    assert fetched == ["https://example.com/3"]
+    assert "asyncio" in result["rag_summary"]
+
+def test_enrich_does_not_touch_the_shared_session(monkeypatch):
+    engine, fetched = make_engine(monkeypatch)
+    sessions = []
+
+    async def fake_page(url, session=None):
+        sessions.append(session)
+        return PAGE
+
+    engine._fetch_page_content = fake_page
+    engine.session = shared = object()  # a search() in flight on another thread
+    asyncio.run(engine.enrich(ITEMS[0], "asyncio"))
+    assert engine.session is shared
+    assert sessions[0] is not None and sessions[0] is not shared
+
+def test_every_result_is_indexed_including_unfetched_ones(monkeypatch):
+    engine, fetched = make_engine(monkeypatch)
+    submitted = []
+
+    class FakeIndex:
+        def search(self, query, limit=10):
+            return []
+
+        def submit(self, docs):
+            submitted.extend(docs)
+
+    engine.local_index = FakeIndex()
+    asyncio.run(engine.search("python asyncio", "snippet"))
+    assert fetched == []
+    assert [doc["link"] for doc in submitted] == [item["link"] for item in ITEMS]
@@ -0,0 +1,51 @@
+import os
+from flask import Flask
+from fragment_cache import ResultFragmentCache
+
+TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+def make_result(link, rank, **fields):
+    result = {"rank": rank, "title": f"Title {link}", "link": link, "snippet": "Snippet",
+              "ml_rank": 0.5, "rag_summary": None, "click_count": 0, "relevance": False, "simhash": None}
+    result.update(fields)
+    return result
+
+def render(cache, *args):
+    with Flask(__name__, template_folder=TEMPLATES).app_context():
+        return cache.render_results(*args)
+
+def test_cards_are_shared_across_queries_and_ranks():
+    cache = ResultFragmentCache(max_pages=10, max_results=10)
+    html = render(cache, "search:matrix", "v1", None, [make_result("https://a", 1), make_result("https://b", 2)])
+    assert "https://a" in html and "https://b" in html
+    assert len(cache.cards) == 2
+
+    # Same documents at other ranks, with click counts that the card does not show
+    render(cache, "search:the matrix film", "v1", "day",
+           [make_result("https://b", 1, click_count=7), make_result("https://a", 2, relevance=True)])
+    assert len(cache.pages) == 2
+    assert len(cache.cards) == 2
+
+    # A change to a rendered field is a new card
+    render(cache, "search:matrix", "v2", None, [make_result("https://a", 1, rag_summary="Summary")])
+    assert len(cache.cards) == 3
+
+def test_version_bump_rerenders_the_page():
+    cache = ResultFragmentCache(max_pages=10, max_results=10)
+    first = render(cache, "search:q", "v1", None, [make_result("https://a", 1)])
+    assert render(cache, "search:q", "v1", None, [make_result("https://a", 1, title="Changed")]) == first
+
+    bumped = render(cache, "search:q", "v2", None, [make_result("https://a", 1, title="Changed")])
+    assert "Changed" in bumped and bumped != first
+
+    # Entries without a version fall back to the template
+    assert render(cache, "search:q", None, None, [make_result("https://a", 1)]) is None
+
+def test_pages_and_cards_are_evicted():
+    cache = ResultFragmentCache(max_pages=2, max_results=3)
+    for i in range(5):
+        render(cache, f"search:q{i}", "v1", None, [make_result(f"https://{i}", 1)])
+    assert len(cache.pages) == 2
+    assert len(cache.cards) == 3
+    assert cache.pages.get(("search:q0", "v1", "")) is None
+    assert cache.pages.get(("search:q4", "v1", "")) is not None
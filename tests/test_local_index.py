@@ -0,0 +1,109 @@
+import os
+import sys
+import asyncio
+import tempfile
+import threading
+import subprocess
+import numpy as np
+from local_index import LocalIndex
+
+DOCS = [
+    {"link": "https://a", "title": "Python asyncio tutorial", "snippet": "Event loops and coroutines",
+     "html": "<html><body><p>asyncio runs coroutines on an event loop</p><script>x()</script></body></html>"},
+    {"link": "https://b", "title": "Gardening basics", "snippet": "Tomatoes and soil", "text": "water tomatoes daily"},
+    {"link": "https://c", "title": "Python packaging", "snippet": "Wheels and sdists", "text": "python python python"},
+]
+
+def test_bm25_ranking_and_coverage():
+    index = LocalIndex(tempfile.mkdtemp(), merge_docs=100)
+    assert index.add_documents(DOCS) == 3
+    assert index.add_documents(DOCS[:1]) == 0  # unchanged documents are skipped
+
+    hits = index.search("python event loop")
+    assert [hit["link"] for hit in hits] == ["https://a", "https://c"]
+    assert hits[0]["coverage"] == 1.0
+    assert hits[1]["coverage"] == 1 / 3
+    assert index.search("tomatoes")[0]["link"] == "https://b"
+    assert index.search("") == []
+    index.close()
+
+def test_persisted_index_is_memory_mapped_and_replaces_changed_docs():
+    path = tempfile.mkdtemp()
+    index = LocalIndex(path, merge_docs=2)
+    index.add_documents(DOCS)  # crosses merge_docs, so it is written to disk
+    index.add_documents([{"link": "https://b", "title": "Gardening basics", "text": "compost and mulch"}])
+    index.close()
+
+    reloaded = LocalIndex(path)
+    assert isinstance(reloaded._gaps, np.memmap)
+    assert len(reloaded) == 3
+    assert reloaded.search("tomatoes") == []
+    assert reloaded.search("compost")[0]["link"] == "https://b"
+    assert reloaded.search("coroutines")[0]["link"] == "https://a"
+    reloaded.close()
+
+def test_merges_from_two_workers_keep_both_workers_documents():
+    path = tempfile.mkdtemp()
+    first, second = LocalIndex(path, merge_docs=100), LocalIndex(path, merge_docs=100)
+    first.add_documents(DOCS[:2])
+    second.add_documents([DOCS[2], {"link": "https://b", "title": "Gardening basics", "text": "compost and mulch"}])
+    first.close()
+    second.close()  # rebased onto the generation the first worker wrote
+
+    reloaded = LocalIndex(path)
+    assert len(reloaded) == 3
+    assert reloaded.search("coroutines")[0]["link"] == "https://a"
+    assert reloaded.search("wheels")[0]["link"] == "https://c"
+    assert reloaded.search("compost")[0]["link"] == "https://b"
+    assert reloaded.search("tomatoes") == []
+    reloaded.close()
+
+def test_search_is_not_blocked_by_a_merge():
+    index = LocalIndex(tempfile.mkdtemp(), merge_docs=100)
+    index.add_documents(DOCS)
+    writing, release = threading.Event(), threading.Event()
+    write_generation = index._write_generation
+
+    def slow_write(*args):
+        writing.set()
+        release.wait(5)
+        return write_generation(*args)
+
+    index._write_generation = slow_write
+    merge = threading.Thread(target=index._merge_and_save)
+    merge.start()
+    assert writing.wait(5)
+    assert index.search("tomatoes")[0]["link"] == "https://b"  # served while the merge is writing
+    release.set()
+    merge.join(5)
+    assert index.search("tomatoes")[0]["link"] == "https://b"
+    index.close()
+
+def test_results_without_page_text_never_replace_indexed_pages():
+    index = LocalIndex(tempfile.mkdtemp(), merge_docs=100)
+    index.add_documents(DOCS[:1])
+    assert index.add_documents([{"link": "https://a", "title": "Python asyncio tutorial", "snippet": "Short snippet"},
+                                {"link": "https://d", "title": "Rust ownership", "snippet": "Borrowing rules",
+                                 "rag_summary": "lifetimes explained"}]) == 1
+    assert index.search("coroutines")[0]["link"] == "https://a"
+    assert index.search("lifetimes")[0]["link"] == "https://d"
+    index.close()
+
+def test_backfill_indexes_stored_documents():
+    from sqlite_storage import SQLiteStorage
+
+    directory = tempfile.mkdtemp()
+    db_path, index_path = os.path.join(directory, "horizon.db"), os.path.join(directory, "index")
+    db = SQLiteStorage(db_path)
+    db.bulk_upsert_results([{"query": "q", "link": "https://a", "title": "Gardening basics",
+                             "snippet": "Tomatoes and soil", "rag_summary": "compost and mulch", "rank": 1}])
+    asyncio.run(db.close())
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, STORAGE_BACKEND="sqlite", SQLITE_PATH=db_path, LOCAL_INDEX_PATH=index_path)
+    subprocess.run([sys.executable, "local_index.py", "backfill"], cwd=root, env=env, check=True,
+                   capture_output=True, timeout=120)
+
+    index = LocalIndex(index_path)
+    assert index.search("compost")[0]["link"] == "https://a"
+    index.close()
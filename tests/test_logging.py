@@ -0,0 +1,39 @@
+import random
+import logging
+from logging_config import SamplingFilter
+from settings import LOG_SAMPLE_RATES
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+def test_hot_path_info_logs_are_sampled():
+    handler = ListHandler()
+    handler.addFilter(SamplingFilter(LOG_SAMPLE_RATES))
+    logger = logging.getLogger('search.sampling-test')
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    random.seed(0)
+
+    try:
+        for _ in range(1000):
+            logger.info("Starting search for query: q", extra={'category': 'search.request'})
+            logger.info("Cache hit for query: q", extra={'category': 'search.cache'})
+        requests = sum(r.category == 'search.request' for r in handler.records)
+        cache_hits = sum(r.category == 'search.cache' for r in handler.records)
+        assert 0 < requests < 200
+        assert 0 < cache_hits < 100
+
+        # Uncategorized records and warnings are kept
+        handler.records.clear()
+        for _ in range(100):
+            logger.info("Initialized")
+            logger.warning("Search capacity is exhausted", extra={'category': 'search.request'})
+        assert len(handler.records) == 200
+    finally:
+        logger.removeHandler(handler)
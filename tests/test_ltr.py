@@ -0,0 +1,59 @@
+import random
+import tempfile
+import pandas as pd
+import pytest
+from ltr import RankingModel, ranking_features, train
+
+def click_log(n_queries=200, seed=0):
+    """Results whose title matches the query get clicked far more often."""
+    rng = random.Random(seed)
+    rows = []
+    for q in range(n_queries):
+        query = f"topic{q} guide"
+        for rank in range(1, 9):
+            on_topic = rng.random() < 0.5
+            clicked = rng.random() < (0.7 if on_topic else 0.05)
+            rows.append({
+                "query": query,
+                "link": f"https://{q}/{rank}",
+                "title": f"topic{q} guide" if on_topic else "unrelated page",
+                "snippet": "",
+                "ml_rank": rng.random(),
+                "rank": rank,
+                "relevance": clicked,
+                "click_count": int(clicked)
+            })
+    return pd.DataFrame(rows)
+
+def test_features_are_bounded():
+    results = click_log(n_queries=1)
+    features = ranking_features(results, "topic0 guide")
+    assert features.shape == (8, 4)
+    assert features.min() >= 0 and features.max() <= 1
+    assert features[:, 0].max() == 1.0  # ml_rank is scaled per query
+
+def test_trained_model_beats_default_and_round_trips():
+    model = train(click_log())
+    assert model.metrics["validation_rows"] > 0
+    assert model.metrics["validation_auc"] > 0.8 > model.metrics["default_validation_auc"]
+
+    directory = tempfile.mkdtemp()
+    model.save(directory)
+    loaded = RankingModel.load(directory)
+    assert loaded.version == model.version
+    results = click_log(n_queries=1, seed=1)
+    assert (loaded.score(results, "topic0 guide") == model.score(results, "topic0 guide")).all()
+
+def test_recorded_clicks_outrank_model_scores():
+    results = pd.DataFrame([
+        {"link": "https://a", "title": "exact query", "ml_rank": 1.0, "rank": 1, "relevance": False, "click_count": 0},
+        {"link": "https://b", "title": "other", "ml_rank": 0.1, "rank": 5, "relevance": True, "click_count": 3},
+    ])
+    scores = RankingModel.default().score(results, "exact query")
+    assert scores[1] > scores[0]
+
+def test_training_needs_both_classes():
+    log = click_log(n_queries=5)
+    log["click_count"], log["relevance"] = 0, False
+    with pytest.raises(ValueError):
+        train(log)
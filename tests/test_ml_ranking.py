@@ -0,0 +1,60 @@
+import os
+import tempfile
+import pandas as pd
+from ml_ranking import SimplifiedMLRanker
+
+CORPUS = [
+    {"link": f"https://corpus/{i}", "title": "Python news", "snippet": "python release notes", "text": "python " * 20}
+    for i in range(50)
+]
+
+RESULTS = pd.DataFrame([
+    {"link": "https://a", "title": "Python asyncio", "snippet": "event loop basics", "text": "asyncio event loop tasks"},
+    {"link": "https://b", "title": "Python news", "snippet": "python python python", "text": ""},
+    {"link": "https://c", "title": "Gardening", "snippet": "tomatoes and soil", "text": "water daily"},
+])
+
+def make_ranker(path=None, **kwargs):
+    return SimplifiedMLRanker(path or os.path.join(tempfile.mkdtemp(), "stats.npz"), hash_bits=12, **kwargs)
+
+def test_query_aware_scores_use_corpus_idf():
+    ranker = make_ranker()
+    assert ranker.update(CORPUS) == 50
+    assert ranker.update(CORPUS[:5]) == 0  # each link is counted once
+
+    ranked = ranker.predict_ranking(RESULTS.copy(), "python asyncio")
+    scores = dict(zip(ranked["link"], ranked["ml_rank"]))
+    # "python" is in almost every document, so the rare "asyncio" decides
+    assert scores["https://a"] == 1.0
+    assert 0 < scores["https://b"] < 0.5
+    assert scores["https://c"] == 0.0
+
+    assert list(ranker.predict_ranking(RESULTS.copy(), "")["ml_rank"]) == [1.0, 1.0, 1.0]
+
+def test_statistics_persist_and_reload():
+    path = os.path.join(tempfile.mkdtemp(), "stats.npz")
+    ranker = make_ranker(path, save_every=1000)
+    ranker.update(CORPUS)
+    assert not os.path.exists(path)
+    ranker.close()
+
+    reloaded = make_ranker(path)
+    assert reloaded._n_docs == 50
+    assert reloaded.update(CORPUS) == 0
+    rarest = reloaded.get_feature_importance(RESULTS)
+    assert "tomatoes" in rarest and "python" not in rarest
+
+def test_rank_batch_matches_per_query_scores():
+    ranker = make_ranker()
+    ranker.update(CORPUS)
+    candidates = RESULTS.to_dict("records")
+    groups = [("python asyncio", candidates), ("gardening tomatoes", candidates), ("anything", [])]
+
+    ranked = ranker.rank_batch(groups, k=2)
+    assert [position for position, _ in ranked[0]] == [0, 1]
+    assert [position for position, _ in ranked[1]][0] == 2
+    assert len(ranked[1]) == 2 and ranked[2] == []
+
+    single = ranker.predict_ranking(RESULTS.copy(), "python asyncio")["ml_rank"].tolist()
+    for position, score in ranked[0]:
+        assert abs(score - single[position]) < 1e-6
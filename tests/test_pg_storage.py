@@ -0,0 +1,140 @@
+import os
+import time
+import asyncio
+import pytest
+from storage import RESULT_COLUMNS, next_cursor
+
+# Runs against a local Postgres, e.g.
+#   TEST_DATABASE_URL=postgresql://postgres@localhost/horizon_test pytest tests/test_pg_storage.py
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+@pytest.fixture
+def storage():
+    from pg_storage import AsyncPGStorage
+    db = AsyncPGStorage(TEST_DATABASE_URL)
+    db._run(db.pool.execute("TRUNCATE query_document, documents, queries"))
+    yield db
+    asyncio.run(db.close())
+
+def test_update_relevance_counts_every_click(storage):
+    async def click_many():
+        return await asyncio.gather(*[
+            storage.update_relevance("dr strange", "https://a", {"title": "A", "rank": 2})
+            for _ in range(20)
+        ])
+
+    rows = asyncio.run(click_many())
+    assert all(row is not None for row in rows)
+
+    results = storage.query_results("dr strange")
+    assert len(results) == 1
+    assert results.iloc[0]["click_count"] == 20
+    assert bool(results.iloc[0]["relevance"])
+
+def test_query_results_order_and_time_filter(storage):
+    storage.insert_or_update_result({"query": "q", "rank": 2, "link": "https://b", "title": "B"})
+    storage.insert_or_update_result({"query": "q", "rank": 1, "link": "https://a", "title": "A"})
+    storage.bulk_mark_relevant([{"query": "q", "link": "https://b", "title": "B", "clicks": 3}])
+
+    results = asyncio.run(storage.async_query_results("q", "day"))
+    assert list(results["link"]) == ["https://b", "https://a"]
+    assert list(results["click_count"]) == [3, 0]
+    assert storage.health_check()
+
+def test_time_filter_cutoff_ignores_local_timezone(storage, monkeypatch):
+    storage.insert_or_update_result({"query": "q", "rank": 1, "link": "https://a", "title": "A"})
+    storage._run(storage.pool.execute("UPDATE query_document SET created = now() - interval '20 hours'"))
+
+    monkeypatch.setenv("TZ", "Etc/GMT+12")  # local time is UTC-12
+    time.tzset()
+    try:
+        results = storage.query_results("q", "day")
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    assert list(results["link"]) == ["https://a"]
+
+def test_keyset_pagination_covers_every_row_once(storage):
+    for i in range(6):
+        storage.insert_or_update_result({"query": "q", "rank": i % 3, "link": f"https://{i}", "title": str(i)})
+    storage.bulk_mark_relevant([{"query": "q", "link": "https://5", "title": "5", "clicks": 2}])
+
+    seen, cursor = [], None
+    while True:
+        page = storage.query_results("q", limit=3, after=cursor)
+        if page.empty:
+            break
+        seen.extend(page["link"])
+        cursor = next_cursor(page, 3)
+        if cursor is None:
+            break
+
+    assert seen[0] == "https://5"
+    assert sorted(seen) == sorted(f"https://{i}" for i in range(6))
+    assert set(storage.query_results("q").columns) == set(RESULT_COLUMNS)
+
+def test_bulk_upsert_results_keeps_click_data(storage):
+    storage.bulk_mark_relevant([{"query": "q", "link": "https://a", "title": "A", "clicks": 4}])
+    written = storage.bulk_upsert_results([
+        {"query": "q", "link": "https://a", "title": "A (fresh)", "rank": 2, "ml_rank": 0.5},
+        {"query": "q", "link": "https://b", "title": "B", "rank": 1}
+    ])
+    assert written == 2
+
+    results = storage.query_results("q").set_index("link")
+    assert results.loc["https://a", "title"] == "A (fresh)"
+    assert results.loc["https://a", "click_count"] == 4
+    assert bool(results.loc["https://a", "relevance"])
+    assert results.loc["https://b", "click_count"] == 0
+
+def test_documents_are_stored_once_across_queries(storage):
+    storage.bulk_upsert_results([
+        {"query": "q1", "link": "https://a", "title": "A", "snippet": "page text", "rank": 1,
+         "simhash": "00ff00ff00ff00ff"},
+        {"query": "q2", "link": "https://a", "title": "A", "rank": 3}
+    ])
+    storage.bulk_mark_relevant([{"query": "q2", "link": "https://a", "title": "A", "snippet": "", "clicks": 1}])
+
+    assert storage._run(storage.pool.fetchval("SELECT COUNT(*) FROM documents")) == 1
+    q1, q2 = storage.query_results("q1"), storage.query_results("q2")
+    assert q1.iloc[0]["snippet"] == q2.iloc[0]["snippet"] == "page text"
+    assert q1.iloc[0]["simhash"] == q2.iloc[0]["simhash"] == "00ff00ff00ff00ff"
+    assert (q1.iloc[0]["rank"], q1.iloc[0]["click_count"]) == (1, 0)
+    assert (q2.iloc[0]["rank"], q2.iloc[0]["click_count"]) == (3, 1)
+
+def test_migrate_legacy_results_in_batches(storage):
+    storage._run(storage.pool.execute("""
+        DROP TABLE IF EXISTS results;
+        CREATE TABLE results (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            query TEXT NOT NULL, rank INTEGER NOT NULL, link TEXT NOT NULL, title TEXT NOT NULL,
+            snippet TEXT, created TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            relevance BOOLEAN DEFAULT FALSE, ml_rank REAL DEFAULT 0.0, rag_summary TEXT,
+            click_count INTEGER DEFAULT 0, last_clicked TIMESTAMP WITH TIME ZONE,
+            UNIQUE(query, link)
+        );
+        INSERT INTO results (query, rank, link, title, relevance, click_count) VALUES
+            ('q', 1, 'https://a', 'A', TRUE, 4), ('q', 2, 'https://b', 'B', FALSE, 0),
+            ('other', 1, 'https://a', 'A', FALSE, 0);
+    """))
+    try:
+        assert storage.migrate_legacy_results(batch_size=2) == 2
+        assert storage.migrate_legacy_results(batch_size=2) == 2  # re-running is harmless
+
+        results = storage.query_results("q")
+        assert list(results["link"]) == ["https://a", "https://b"]
+        assert list(results["click_count"]) == [4, 0]
+        assert len(storage.query_results("other")) == 1
+        assert storage._run(storage.pool.fetchval("SELECT COUNT(*) FROM documents")) == 2
+    finally:
+        storage._run(storage.pool.execute("DROP TABLE results"))
+
+def test_iter_documents_covers_every_document(storage):
+    storage.bulk_upsert_results([
+        {"query": f"q{i % 2}", "link": f"https://{i % 3}", "title": str(i % 3), "rank": 1} for i in range(6)
+    ])
+    batches = list(storage.iter_documents(batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert sorted(doc["link"] for batch in batches for doc in batch) == ["https://0", "https://1", "https://2"]
@@ -0,0 +1,25 @@
+from query_normalization import normalize_query, query_key
+
+def test_query_variants_share_one_key():
+    variants = ["Dr Strange", "dr  strange", "dr strange ", "Dr. Strange!", "ＤＲ　ＳＴＲＡＮＧＥ"]
+    assert {normalize_query(variant) for variant in variants} == {"dr strange"}
+    assert normalize_query("Straße") == "strasse"
+
+def test_meaningful_punctuation_is_kept():
+    assert normalize_query("C++ vs C#") == "c++ vs c#"
+    assert normalize_query("Node.js -- e-mail, O'Reilly") == "node.js e-mail o'reilly"
+    assert normalize_query("???") == "???"
+
+def test_stopword_insensitive_keys_are_optional():
+    assert query_key("The Matrix") == "the matrix"
+    assert query_key("The Matrix", ignore_stopwords=True) == "matrix"
+    assert query_key("the who", ignore_stopwords=True) == "the who"
+
+def test_app_import_does_not_load_sklearn():
+    import os
+    import sys
+    import subprocess
+    code = "import sys, app; sys.exit('sklearn' in sys.modules)"
+    env = dict(os.environ, WARM_UP_ON_START="false", QUERY_KEY_IGNORE_STOPWORDS="false")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert subprocess.run([sys.executable, "-c", code], cwd=root, env=env, capture_output=True).returncode == 0
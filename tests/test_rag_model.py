@@ -0,0 +1,34 @@
+import asyncio
+import rag_model
+from rag_model import SimplifiedRAG, summarize, query_terms
+
+SENTENCES = [
+    "Welcome to our cooking blog about many things.",
+    "Python is popular for data analysis and scripting.",
+    "The asyncio library runs coroutines on an event loop in Python.",
+    "Subscribe to the newsletter for more posts.",
+]
+
+def test_summary_picks_query_sentences_in_page_order():
+    assert query_terms("The Python  asyncio guide") == ("asyncio", "guide", "python")
+    # "asyncio" is rarer on the page than "python", so its sentence ranks first
+    assert summarize("python asyncio", SENTENCES, max_sentences=1) == SENTENCES[2]
+    assert summarize("python asyncio", SENTENCES) == f"{SENTENCES[1]} {SENTENCES[2]}"
+    assert summarize("gardening", SENTENCES) == ""
+
+def test_summaries_are_cached_by_url_content_and_query_terms(monkeypatch):
+    rag = SimplifiedRAG()
+    calls = []
+    original = rag_model.summarize
+    monkeypatch.setattr(rag_model, "summarize", lambda *args: calls.append(args) or original(*args))
+
+    async def run():
+        first = await rag.async_generate_response("python asyncio", "snippet", SENTENCES, url="https://a")
+        again = await rag.async_generate_response("asyncio python", "snippet", SENTENCES, url="https://a")
+        changed = await rag.async_generate_response("python asyncio", "snippet", SENTENCES[1:], url="https://a")
+        missing = await rag.async_generate_response("gardening", "A short snippet", SENTENCES, url="https://a")
+        return first, again, changed, missing
+
+    first, again, changed, missing = asyncio.run(run())
+    assert first == again == changed and len(calls) == 3
+    assert missing == "A short snippet..."
@@ -0,0 +1,57 @@
+from rate_limit import TokenBucketLimiter, AdmissionController, retry_after_header
+
+def test_local_token_bucket():
+    """Without Redis the limiter falls back to in-process buckets."""
+    limiter = TokenBucketLimiter(rate_per_minute=60, burst=3)
+
+    results = [limiter.allow("ip:1.2.3.4") for _ in range(4)]
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert 0 < results[-1][1] <= 1.0
+
+    # Buckets are per client
+    assert limiter.allow("ip:5.6.7.8")[0]
+
+def test_redis_failure_falls_back():
+    def broken_redis():
+        raise ConnectionError("redis down")
+
+    limiter = TokenBucketLimiter(rate_per_minute=60, burst=1, redis_provider=broken_redis)
+    assert limiter.allow("key:abc")[0]
+    assert not limiter.allow("key:abc")[0]
+
+def test_admission_priority():
+    admission = AdmissionController(max_in_flight=3, max_expensive=1)
+
+    assert admission.try_acquire() and admission.try_acquire_expensive()
+    # A second cold search is shed while cheap requests are still admitted
+    assert not admission.try_acquire_expensive()
+    assert admission.try_acquire() and admission.try_acquire()
+    assert not admission.try_acquire()
+
+    admission.release_expensive()
+    assert admission.try_acquire_expensive()
+
+def test_retry_after_header():
+    assert retry_after_header(0.2) == "1"
+    assert retry_after_header(2.5) == "3"
+
+def test_default_caps_keep_a_thread_for_cache_hits():
+    import os
+    import re
+    from settings import WORKER_THREADS, MAX_IN_FLIGHT_REQUESTS, MAX_IN_FLIGHT_COLD_SEARCHES
+
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "render.yaml")) as f:
+        threads = int(re.search(r"--threads (\d+)", f.read()).group(1))
+    assert WORKER_THREADS == MAX_IN_FLIGHT_REQUESTS == threads
+    assert 1 <= MAX_IN_FLIGHT_COLD_SEARCHES < threads
+
+    # Cold searches fill their slots and the next one is shed...
+    admission = AdmissionController(MAX_IN_FLIGHT_REQUESTS, MAX_IN_FLIGHT_COLD_SEARCHES)
+    for _ in range(MAX_IN_FLIGHT_COLD_SEARCHES):
+        assert admission.try_acquire() and admission.try_acquire_expensive()
+    assert admission.try_acquire()
+    assert not admission.try_acquire_expensive()
+    admission.release()
+
+    # ...while a cache hit, which needs only a general slot, is still admitted
+    assert admission.try_acquire()
@@ -0,0 +1,107 @@
+import os
+import json
+import tempfile
+import numpy as np
+import scipy.sparse as sp
+from semantic_index import DocumentTable, SemanticIndex
+from semantic_search import SemanticSearch
+
+DOCS = [
+    {"link": "https://a", "title": "Python asyncio tutorial", "snippet": "event loops and coroutines"},
+    {"link": "https://b", "title": "Growing tomatoes", "snippet": "soil, water and sunlight for tomatoes"},
+    {"link": "https://c", "title": "Python packaging", "snippet": "wheels, sdists and python tooling",
+     "rag_summary": "How to publish a python package"},
+    {"link": "https://d", "title": "", "snippet": ""},
+]
+
+def test_build_and_search_memory_mapped_index():
+    path = tempfile.mkdtemp()
+    assert SemanticIndex.build(DOCS, path) == 3  # documents without text are skipped
+
+    index = SemanticIndex(path)
+    assert index.ready and len(index) == 3
+    vectors = index._state['vectors']
+    assert sp.issparse(vectors) and vectors.dtype == np.float32
+    assert not vectors.data.flags.owndata and not vectors.data.flags.writeable  # mapped read-only, not copied
+    assert isinstance(index._state['documents'], DocumentTable)
+
+    hits = index.search("python coroutines", top_k=2)
+    assert [hit["link"] for hit in hits] == ["https://a", "https://c"]
+    assert hits[0]["score"] > hits[1]["score"] > 0
+    assert index.search("tomatoes")[0]["title"] == "Growing tomatoes"
+    assert index.search("quantum chromodynamics") == []
+
+def test_generations_with_inline_documents_still_load():
+    path = tempfile.mkdtemp()
+    SemanticIndex.build(DOCS, path)
+    with open(os.path.join(path, "CURRENT")) as f:
+        directory = os.path.join(path, f.read().strip())
+    table = DocumentTable(directory)
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+    dense = SemanticIndex(path)._state['vectors'].toarray()
+
+    # The earlier layout: dense vectors.npy, with documents and IDF in meta.json
+    np.save(os.path.join(directory, "vectors.npy"), dense)
+    meta["idf"] = np.load(os.path.join(directory, "idf.npy")).tolist()
+    meta["documents"] = [[table[i][field] for field in ("link", "title", "snippet")] for i in range(len(table))]
+    for name in ("idf.npy", "documents.bin", "documents.idx.npy"):
+        os.remove(os.path.join(directory, name))
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    index = SemanticIndex(path)
+    assert len(index) == 3
+    assert [hit["link"] for hit in index.search("python coroutines", top_k=2)] == ["https://a", "https://c"]
+
+def test_workers_pick_up_a_rebuilt_index():
+    path = tempfile.mkdtemp()
+    assert not SemanticIndex(path).ready
+
+    SemanticIndex.build(DOCS[:1], path)
+    index = SemanticIndex(path, reload_interval=0)
+    assert len(index) == 1
+
+    SemanticIndex.build(DOCS, path)
+    assert index.ready and len(index) == 3
+    assert len([name for name in os.listdir(path) if name.startswith("gen-")]) == 1
+
+def test_lsa_index_with_ivf_lists_matches_exact_search():
+    topics = [["python", "asyncio", "coroutines"], ["tomatoes", "soil", "garden"], ["stocks", "bonds", "market"]]
+    docs = [
+        {"link": f"https://{t}/{i}", "title": " ".join(words), "snippet": f"{words[i % 3]} notes {i}"}
+        for t, words in enumerate(topics) for i in range(40)
+    ]
+    path = tempfile.mkdtemp()
+    SemanticIndex.build(docs, path, mode="lsa", dimensions=8, ivf_min_docs=100, n_lists=6)
+
+    index = SemanticIndex(path)
+    assert index._state["vectors"].dtype == np.float16 and index._state["vectors"].shape == (120, 8)
+    assert index.n_lists == 6 and index._state["offsets"][-1] == 120
+
+    exact = index.search("garden soil", top_k=5, probes=6)
+    assert all(hit["link"].startswith("https://1/") for hit in exact)
+    approximate = index.search("garden soil", top_k=5, probes=2)
+    assert {hit["link"] for hit in approximate} <= {f"https://1/{i}" for i in range(40)}
+    assert len(approximate) == 5
+
+def test_search_many_matches_single_queries():
+    path = tempfile.mkdtemp()
+    SemanticIndex.build(DOCS, path)
+    index = SemanticIndex(path)
+    queries = ["python coroutines", "tomatoes", "quantum chromodynamics"]
+    assert index.search_many(queries, top_k=2) == [index.search(query, top_k=2) for query in queries]
+
+def test_multi_query_search_over_uploaded_documents():
+    search = SemanticSearch()
+    search.index = SemanticIndex(tempfile.mkdtemp())  # no index built: fit on the request
+    try:
+        documents = ["python asyncio event loop", "tomato soil and water", "python packaging wheels"]
+        results = search.multi_semantic_search(["python wheels", "tomato", "quantum"], documents, top_k=2)
+        assert [hit["index"] for hit in results[0]] == [2, 0]
+        assert [hit["index"] for hit in results[1]] == [1]
+        assert results[2] == []
+        single = search.batch_semantic_search("python wheels", documents)
+        assert results[0][1]["score"] > 0 and single.argmax() == 2
+    finally:
+        search.close()
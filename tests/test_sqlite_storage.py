@@ -0,0 +1,107 @@
+import os
+import asyncio
+import tempfile
+import pytest
+from sqlite_storage import SQLiteStorage
+from storage import RESULT_COLUMNS, next_cursor
+
+@pytest.fixture
+def storage():
+    db = SQLiteStorage(os.path.join(tempfile.mkdtemp(), "horizon.db"))
+    yield db
+    asyncio.run(db.close())
+
+def test_schema_uses_wal_and_indexes(storage):
+    assert storage._run(lambda: storage._conn.execute("PRAGMA journal_mode").fetchone()[0]) == "wal"
+    indexes = storage._run(lambda: [row[1] for row in storage._conn.execute("PRAGMA index_list(results)")])
+    assert "idx_results_query_created" in indexes
+    assert storage.health_check()
+
+def test_update_relevance_counts_every_click(storage):
+    async def click_many():
+        return await asyncio.gather(*[
+            storage.update_relevance("dr strange", "https://a", {"title": "A", "rank": 2})
+            for _ in range(20)
+        ])
+
+    rows = asyncio.run(click_many())
+    assert rows[-1]["relevance"] is True
+
+    results = storage.query_results("dr strange")
+    assert len(results) == 1
+    assert results.iloc[0]["click_count"] == 20
+
+def test_query_results_order_and_time_filter(storage):
+    storage.insert_or_update_result({"query": "q", "rank": 2, "link": "https://b", "title": "B"})
+    storage.insert_or_update_result({"query": "q", "rank": 1, "link": "https://a", "title": "A"})
+    storage.bulk_mark_relevant([{"query": "q", "link": "https://b", "title": "B", "clicks": 3}])
+
+    results = asyncio.run(storage.async_query_results("q", "day"))
+    assert list(results["link"]) == ["https://b", "https://a"]
+    assert list(results["click_count"]) == [3, 0]
+
+    storage._run(lambda: storage._conn.execute("UPDATE results SET created = '2000-01-01T00:00:00'"))
+    assert storage.query_results("q", "year").empty
+    assert len(storage.query_results("q")) == 2
+
+def test_keyset_pagination_covers_every_row_once(storage):
+    for i in range(6):
+        storage.insert_or_update_result({"query": "q", "rank": i % 3, "link": f"https://{i}", "title": str(i)})
+    storage.bulk_mark_relevant([{"query": "q", "link": "https://5", "title": "5", "clicks": 2}])
+
+    seen, cursor = [], None
+    while True:
+        page = storage.query_results("q", limit=3, after=cursor)
+        if page.empty:
+            break
+        seen.extend(page["link"])
+        cursor = next_cursor(page, 3)
+        if cursor is None:
+            break
+
+    assert seen[0] == "https://5"
+    assert sorted(seen) == sorted(f"https://{i}" for i in range(6))
+    assert set(storage.query_results("q").columns) == set(RESULT_COLUMNS)
+
+def test_bulk_upsert_results_keeps_click_data(storage):
+    storage.bulk_mark_relevant([{"query": "q", "link": "https://a", "title": "A", "clicks": 4}])
+    written = storage.bulk_upsert_results([
+        {"query": "q", "link": "https://a", "title": "A (fresh)", "rank": 2, "ml_rank": 0.5},
+        {"query": "q", "link": "https://b", "title": "B", "rank": 1}
+    ])
+    assert written == 2
+
+    results = storage.query_results("q").set_index("link")
+    assert results.loc["https://a", "title"] == "A (fresh)"
+    assert results.loc["https://a", "click_count"] == 4
+    assert bool(results.loc["https://a", "relevance"])
+    assert results.loc["https://b", "click_count"] == 0
+
+def test_training_results_only_cover_clicked_queries(storage):
+    storage.bulk_upsert_results([
+        {"query": "clicked", "link": "https://a", "title": "A", "rank": 1},
+        {"query": "clicked", "link": "https://b", "title": "B", "rank": 2},
+        {"query": "ignored", "link": "https://a", "title": "A", "rank": 1}
+    ])
+    storage.bulk_mark_relevant([{"query": "clicked", "link": "https://b", "title": "B", "clicks": 1}])
+
+    rows = storage.training_results()
+    assert set(rows["query"]) == {"clicked"}
+    assert sorted(rows["link"]) == ["https://a", "https://b"]
+
+def test_iter_documents_yields_each_link_once(storage):
+    storage.bulk_upsert_results([
+        {"query": f"q{i % 2}", "link": f"https://{i % 3}", "title": str(i % 3), "rank": 1} for i in range(6)
+    ])
+    batches = list(storage.iter_documents(batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert [doc["link"] for batch in batches for doc in batch] == ["https://0", "https://1", "https://2"]
+
+def test_click_with_empty_fields_keeps_stored_text(storage):
+    storage.bulk_upsert_results([{"query": "q", "link": "https://a", "title": "A", "snippet": "page text",
+                                  "rag_summary": "summary", "rank": 1}])
+    storage.bulk_mark_relevant([{"query": "q", "link": "https://a", "title": "", "snippet": "", "clicks": 1}])
+    storage.insert_or_update_result({"query": "q", "link": "https://a", "title": "", "rank": 1})
+
+    row = storage.query_results("q").iloc[0]
+    assert (row["title"], row["snippet"], row["rag_summary"]) == ("A", "page text", "summary")
@@ -0,0 +1,32 @@
+import asyncio
+import aiohttp
+import pytest
+from url_safety import is_public_address, is_fetchable_url, PublicAddressResolver, public_connector
+
+def test_internal_addresses_are_not_public():
+    for address in ("127.0.0.1", "10.1.2.3", "192.168.0.1", "169.254.169.254", "::1", "fe80::1", "::ffff:10.0.0.1", "0.0.0.0"):
+        assert not is_public_address(address), address
+    assert is_public_address("93.184.216.34")
+    assert is_public_address("2606:4700::1111")
+
+def test_fetchable_urls():
+    assert is_fetchable_url("https://example.com/page")
+    assert not is_fetchable_url("http://169.254.169.254/latest/meta-data/")
+    assert not is_fetchable_url("http://[::1]:8080/")
+    assert not is_fetchable_url("file:///etc/passwd")
+    assert not is_fetchable_url("gopher://example.com/")
+
+def test_hostnames_resolving_to_internal_addresses_are_refused():
+    async def connect():
+        resolver = PublicAddressResolver()
+        try:
+            with pytest.raises(OSError):
+                await resolver.resolve("localhost", 80)
+        finally:
+            await resolver.close()
+
+        async with aiohttp.ClientSession(connector=public_connector()) as session:
+            with pytest.raises(aiohttp.ClientError):
+                await session.get("http://localhost:9/")
+
+    asyncio.run(connect())
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import threading
+import time
+from write_behind import ClickBuffer, ResultPersister
+
+def test_clicks_are_coalesced():
+    flushed = []
+    buffer = ClickBuffer(flushed.append, max_pending=100, flush_interval=60, spill_path=None)
+
+    buffer.add("q", "https://a", {"title": "A"})
+    buffer.add("q", "https://a", {"title": "A (updated)"})
+    buffer.add("q", "https://b", {"title": "B"})
+    assert len(buffer) == 2
+
+    assert buffer.flush() == 2
+    events = {event["link"]: event for event in flushed[0]}
+    assert events["https://a"]["clicks"] == 2
+    assert events["https://a"]["title"] == "A (updated)"
+    assert events["https://b"]["clicks"] == 1
+    buffer.close()
+
+def test_failed_flush_keeps_events_and_spills_on_close():
+    spill_path = os.path.join(tempfile.mkdtemp(), "clicks.jsonl")
+
+    def failing_flush(events):
+        raise ConnectionError("database down")
+
+    buffer = ClickBuffer(failing_flush, flush_interval=60, spill_path=spill_path)
+    buffer.add("q", "https://a", {"title": "A"})
+    assert buffer.flush() == 0
+    buffer.add("q", "https://a", {"title": "A"})
+    buffer.close()
+    assert os.path.exists(spill_path)
+
+    # The next process replays the spilled clicks
+    flushed = []
+    recovered = ClickBuffer(flushed.append, flush_interval=60, spill_path=spill_path)
+    assert not os.path.exists(spill_path)
+    recovered.close()
+    assert flushed[0][0]["clicks"] == 2
+
+def test_result_persister_writes_sets_and_drops_when_full():
+    written, release = [], threading.Event()
+
+    def slow_persist(rows):
+        release.wait(5)
+        written.append(rows)
+
+    persister = ResultPersister(slow_persist, max_queued=1)
+    results = [{"link": "https://a", "title": "A", "rank": 1}, {"link": "#", "title": "Untitled"}]
+    assert persister.submit("q1", results)
+    time.sleep(0.1)  # the worker is now blocked on q1
+    assert persister.submit("q2", results)
+    assert not persister.submit("q3", results)
+    assert persister.dropped == 1
+
+    release.set()
+    persister.close()
+    assert [rows[0]["query"] for rows in written] == ["q1", "q2"]
+    assert all(len(rows) == 1 for rows in written)
+
+def test_recovered_clicks_are_flushed_without_new_clicks():
+    spill_path = os.path.join(tempfile.mkdtemp(), "clicks.jsonl")
+    with open(spill_path, "w") as f:
+        f.write('{"query": "q", "link": "https://a", "title": "A", "clicks": 3}\n')
+
+    flushed = []
+    recovered = ClickBuffer(flushed.append, flush_interval=0.05, spill_path=spill_path)
+    deadline = time.monotonic() + 5
+    while not flushed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert flushed and flushed[0][0]["clicks"] == 3
+    recovered.close()
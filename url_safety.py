@@ -0,0 +1,59 @@
+import socket
+import ipaddress
+from typing import Any, Dict, List
+from urllib.parse import urlsplit
+import aiohttp
+from aiohttp.abc import AbstractResolver
+
+def is_public_address(address: str) -> bool:
+    """True for globally routable IP addresses; private, loopback, link-local and reserved ranges are not."""
+    try:
+        ip = ipaddress.ip_address(address.split('%', 1)[0])
+    except ValueError:
+        return False
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+def is_fetchable_url(url: str) -> bool:
+    """
+    Whether the server may download `url`: http(s) only, and a host that is
+    not an internal IP literal. Hostnames are checked when they are resolved,
+    by PublicAddressResolver.
+    """
+    try:
+        parts = urlsplit(url)
+        host = parts.hostname
+    except ValueError:
+        return False
+    if parts.scheme not in ('http', 'https') or not host:
+        return False
+    try:
+        ipaddress.ip_address(host.split('%', 1)[0])
+    except ValueError:
+        return True
+    return is_public_address(host)
+
+class PublicAddressResolver(AbstractResolver):
+    """
+    DNS resolver that refuses hostnames resolving to non-public addresses.
+
+    Checking at connect time covers every redirect hop and hostnames that
+    resolve to an internal address only on a later lookup.
+    """
+    def __init__(self):
+        self._resolver = aiohttp.DefaultResolver()
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET) -> List[Dict[str, Any]]:
+        hosts = await self._resolver.resolve(host, port, family)
+        blocked = [entry['host'] for entry in hosts if not is_public_address(entry['host'])]
+        if blocked:
+            raise OSError(f"Refusing to connect to {host}: non-public address {blocked[0]}")
+        return hosts
+
+    async def close(self) -> None:
+        await self._resolver.close()
+
+def public_connector() -> aiohttp.TCPConnector:
+    """Connector for sessions that download pages chosen by third parties."""
+    return aiohttp.TCPConnector(resolver=PublicAddressResolver())
@@ -0,0 +1,209 @@
+import os
+import json
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from logging_config import get_module_logger
+from settings import (
+    CLICK_BUFFER_MAX_PENDING,
+    CLICK_BUFFER_FLUSH_INTERVAL,
+    CLICK_BUFFER_SPILL_PATH,
+    RESULT_PERSIST_QUEUE_SIZE
+)
+
+class ClickBuffer:
+    """
+    Write-behind buffer for relevance clicks.
+
+    Clicks on the same (query, link) are coalesced into one event carrying a
+    click count and the latest result data. A background thread hands the
+    pending events to ``flush_fn`` in bulk when ``max_pending`` distinct keys
+    are waiting or every ``flush_interval`` seconds. Events whose flush fails
+    are kept for the next attempt; on close they are spilled to disk if the
+    final flush fails and replayed by the flusher on the next start.
+    """
+    def __init__(self, flush_fn: Callable[[List[Dict[str, Any]]], Any],
+                 max_pending: int = CLICK_BUFFER_MAX_PENDING,
+                 flush_interval: float = CLICK_BUFFER_FLUSH_INTERVAL,
+                 spill_path: Optional[str] = CLICK_BUFFER_SPILL_PATH):
+        self.logger = get_module_logger('write_behind')
+        self.flush_fn = flush_fn
+        self.max_pending = max(1, max_pending)
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+
+        self._pending: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._load_spill()
+        if self._pending:
+            # Recovered clicks are flushed on the first interval, not on the next add()
+            self._ensure_started()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _merge(self, event: Dict[str, Any]):
+        """Coalesce one event into the pending set (caller holds the lock)."""
+        key = (event['query'], event['link'])
+        existing = self._pending.get(key)
+        if existing:
+            clicks = existing['clicks'] + event.get('clicks', 1)
+            existing.update(event)
+            existing['clicks'] = clicks
+        else:
+            self._pending[key] = dict(event, clicks=event.get('clicks', 1))
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='click-buffer', daemon=True)
+            self._thread.start()
+
+    def add(self, query: str, link: str, result_data: Dict[str, Any]) -> int:
+        """Buffer one click; returns the number of distinct keys pending."""
+        if self._stopped.is_set():
+            raise RuntimeError("Click buffer is closed")
+
+        with self._lock:
+            self._merge(dict(result_data, query=query, link=link, clicks=1))
+            pending = len(self._pending)
+            self._ensure_started()
+
+        if pending >= self.max_pending:
+            self._wake.set()
+        return pending
+
+    def flush(self) -> int:
+        """Write all pending events now; returns the number of events written."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                events = list(self._pending.values())
+                self._pending = {}
+
+            try:
+                self.flush_fn(events)
+                self.logger.info(f"Flushed {len(events)} coalesced click event(s)")
+                return len(events)
+            except Exception as e:
+                self.logger.error(f"Click flush failed, keeping {len(events)} event(s): {e}")
+                with self._lock:
+                    for event in events:
+                        self._merge(event)
+                return 0
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        """Stop the flusher and write everything that is still pending."""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+        if self._pending:
+            self._spill()
+
+    def _spill(self):
+        if not self.spill_path:
+            self.logger.error(f"Dropping {len(self._pending)} unflushed click event(s)")
+            return
+        try:
+            os.makedirs(os.path.dirname(self.spill_path) or '.', exist_ok=True)
+            with open(self.spill_path, 'a') as f:
+                for event in self._pending.values():
+                    f.write(json.dumps(event) + '\n')
+            self.logger.warning(f"Spilled {len(self._pending)} click event(s) to {self.spill_path}")
+            self._pending = {}
+        except Exception as e:
+            self.logger.error(f"Click spill error: {e}")
+
+    def _load_spill(self):
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        try:
+            with open(self.spill_path) as f:
+                for line in f:
+                    if line.strip():
+                        self._merge(json.loads(line))
+            os.remove(self.spill_path)
+            self.logger.info(f"Recovered {len(self._pending)} spilled click event(s)")
+        except Exception as e:
+            self.logger.error(f"Click spill recovery error: {e}")
+
+class ResultPersister:
+    """
+    Background persistence of fetched result sets.
+
+    ``submit`` never blocks the request: each result set goes into a bounded
+    queue and one worker thread writes it with a single ``persist_fn`` call.
+    When the queue is full the set is dropped and counted instead; it is
+    still cached, and the next cold search for the query submits it again.
+    """
+    def __init__(self, persist_fn: Callable[[List[Dict[str, Any]]], Any],
+                 max_queued: int = RESULT_PERSIST_QUEUE_SIZE):
+        self.logger = get_module_logger('write_behind')
+        self.persist_fn = persist_fn
+        self.dropped = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_queued))
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, query: str, results: List[Dict[str, Any]]) -> bool:
+        """Queue one result set for persistence; returns False if it was dropped."""
+        rows = [dict(result, query=query) for result in results
+                if result.get('link') and result['link'] != '#' and result.get('title')]
+        if not rows:
+            return False
+
+        with self._lock:
+            if self._closed:
+                return False
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='result-persister', daemon=True)
+                self._thread.start()
+
+        try:
+            self._queue.put_nowait(rows)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            self.logger.warning(f"Persistence queue full, dropped result set for '{query}' ({self.dropped} total)")
+            return False
+
+    def _run(self):
+        while True:
+            rows = self._queue.get()
+            if rows is None:
+                return
+            try:
+                written = self.persist_fn(rows)
+                self.logger.info(f"Persisted {written if written is not None else len(rows)} result(s) "
+                                 f"for '{rows[0]['query']}'")
+            except Exception as e:
+                self.logger.error(f"Result persistence failed for '{rows[0]['query']}': {e}")
+
+    def close(self, timeout: float = 10.0):
+        """Write the queued result sets, then stop the worker."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            self.logger.error("Persistence queue did not drain before shutdown")
+            return
+        thread.join(timeout=timeout)